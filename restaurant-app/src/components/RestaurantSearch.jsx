@@ -57,19 +57,22 @@ const RestaurantSearch = () => {
   // 檢查爬蟲結果
   const checkReviewResults = async (keyword) => {
     try {
-      const response = await fetch(`http://localhost:5000/api/reviews/${encodeURIComponent(keyword)}`);
+      // 分析結果附帶評分統計，平均與評論數不需要下載全部評論計算
+      let stats = null;
+      const analysisResponse = await fetch(`http://localhost:5000/api/reviews/${encodeURIComponent(keyword)}_analysis`);
+      if (analysisResponse.ok) {
+        const analysisData = await analysisResponse.json(); // 解析 JSON 資料
+        console.log(analysisData); // 打印解析後的資料
+        setAnalysisData(analysisData); // 更新狀態
+        stats = analysisData.rating_stats || null;
+      }
+
+      // 有統計時只取要顯示的幾則評論；較早分析的餐廳沒有統計，仍下載全部評論計算
+      const reviewsUrl = `http://localhost:5000/api/reviews/${encodeURIComponent(keyword)}`;
+      const response = await fetch(stats ? `${reviewsUrl}?limit=5` : reviewsUrl);
       if (response.ok) {
         const data = await response.json();
-        
-        // 檢查分析檔案是否存在
-        const analysisResponse = await fetch(`http://localhost:5000/api/reviews/${encodeURIComponent(keyword)}_analysis`);
-        if (analysisResponse.ok) {
-          const analysisData = await analysisResponse.json(); // 解析 JSON 資料
-          console.log(analysisData); // 打印解析後的資料
-          setAnalysisData(analysisData); // 更新狀態
-        }
-        
-        return data;
+        return { reviews: stats ? data.reviews : data, stats };
       }
       return null;
     } catch (error) {
@@ -104,11 +107,15 @@ const RestaurantSearch = () => {
                 clearInterval(statusCheckInterval);
                 const results = await checkReviewResults(name);
                 if (results) {
-                  setReviewData(results);
+                  setReviewData(results.reviews);
                   setSearchResult({
                     name: name,
-                    rating: calculateAverageRating(results),
-                    reviewCount: results.length,
+                    rating: results.stats
+                      ? (results.stats.mean || 0).toFixed(1)
+                      : calculateAverageRating(results.reviews),
+                    reviewCount: results.stats
+                      ? results.stats.count + results.stats.unrated
+                      : results.reviews.length,
                     updatedTime: new Date().toLocaleString(),
                     source: "Google Maps"
                   });
@@ -223,6 +230,12 @@ const RestaurantSearch = () => {
                 已收集 {scrapingStatus.total_reviews} 則評論
               </p>
             )}
+            {scrapingStatus?.partial?.qa && (
+              <p className="text-gray-400">
+                已整理出 {scrapingStatus.partial.qa.counts.positives} 項優點、
+                {scrapingStatus.partial.qa.counts.negatives} 項缺點
+              </p>
+            )}
           </div>
         </div>
       )}
@@ -272,6 +285,11 @@ const RestaurantSearch = () => {
                 <p className="text-gray-300 leading-relaxed">
                   {analysisData.summary}
                 </p>
+                {analysisData.degradations && (
+                  <p className="mt-2 text-gray-500 text-sm">
+                    因分析時間限制，本次結果經過簡化（{analysisData.degradations.map((d) => d.detail).join('；')}）
+                  </p>
+                )}
                 <button
                   onClick={() => setShowAnalysis(!showAnalysis)}
                   className="mt-4 flex items-center gap-2 text-gray-400 hover:text-white transition-colors duration-200"
@@ -0,0 +1,144 @@
+"""
+QA 答案的近似重複分群。
+
+analyze_reviews_with_qa_lora 原本只用完全相同的字串去重，「服務很好」、
+「服務很好！」、「店員服務很好」這類幾乎相同的片段會全部送進 Gemini。
+這裡以字元 n-gram 的 MinHash + LSH 找出與既有群代表相似的候選，再用實際的
+Jaccard 相似度確認後加入該群，每群保留一個代表文字與出現次數。
+"""
+import re
+import zlib
+from collections import Counter, defaultdict
+
+import numpy as np
+
+NGRAM = 2
+NUM_PERM = 64
+BANDS = 16  # 每個 band 有 NUM_PERM // BANDS 列
+SIMILARITY_THRESHOLD = 0.5
+# 較短的一方（正規化後）不超過此字數時改用較高的門檻，「牛肉麵」與「紅燒牛肉麵」不合併
+SHORT_PHRASE_LEN = 4
+SHORT_PHRASE_THRESHOLD = 0.7
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_rng = np.random.RandomState(42)
+_PERM_A = _rng.randint(1, 1 << 31, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, 1 << 31, size=NUM_PERM, dtype=np.uint64)
+
+_IGNORED = re.compile(r"[\s\W_]+")
+# 比較最後一個字時忽略的結尾語助詞
+_TRAILING_PARTICLES = "喔哦啊呀耶啦唷呢吧欸嗎"
+
+
+def normalize(text):
+    """去掉空白與標點並轉小寫，用於比較相似度"""
+    return _IGNORED.sub("", text).lower()
+
+
+def shingles(text, n=NGRAM):
+    """字元 n-gram 集合，太短的文字直接以整段當作一個 shingle"""
+    if len(text) <= n:
+        return {text} if text else set()
+    return {text[i : i + n] for i in range(len(text) - n + 1)}
+
+
+def minhash_signature(shingle_set):
+    """以向量化的方式計算一個 shingle 集合的 MinHash 簽章"""
+    hashes = np.fromiter(
+        (zlib.crc32(s.encode("utf-8")) for s in shingle_set),
+        dtype=np.uint64,
+        count=len(shingle_set),
+    )
+    permuted = (np.outer(hashes, _PERM_A) + _PERM_B) % _MERSENNE_PRIME & _MAX_HASH
+    return permuted.min(axis=0)
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def final_char(key):
+    """去掉結尾語助詞後的最後一個字，例如「紅燒牛肉麵喔」為「麵」"""
+    stripped = key.rstrip(_TRAILING_PARTICLES)
+    return (stripped or key)[-1:]
+
+
+def cluster_phrases(phrases, threshold=SIMILARITY_THRESHOLD):
+    """
+    將近似重複的片段分群。
+
+    依出現次數由多到少處理，每個片段只和現有群的代表比較（不做遞移合併，
+    避免 A≈B、B≈C 把不相似的 A、C 串在一起）；最後一個字（去掉語助詞）不同時不合併，
+    「紅燒牛肉麵」與「紅燒牛肉飯」這類只差一個字的不同菜名會分開；短片段使用較高的門檻。
+    :param phrases: 片段列表，可以重複，重複次數會計入 count
+    :return: [{"text": 代表文字, "count": 出現次數, "members": [原始片段...]}, ...]，
+             依第一次出現的順序排列
+    """
+    counts = Counter(phrases)
+    unique = list(counts)
+    keys = [normalize(p) for p in unique]
+    shingle_sets = [shingles(k) for k in keys]
+
+    # 正規化後相同的片段直接合併
+    members_by_key = defaultdict(list)
+    for i, key in enumerate(keys):
+        members_by_key[key].append(i)
+    key_counts = {key: sum(counts[unique[i]] for i in members) for key, members in members_by_key.items()}
+    order = sorted(
+        members_by_key,
+        key=lambda key: (-key_counts[key], len(key), members_by_key[key][0]),
+    )
+
+    # LSH：只有和某個代表在同一個 band 雜湊值相同時才計算 Jaccard
+    rows = NUM_PERM // BANDS
+    buckets = defaultdict(list)
+    clusters = []  # [(代表的 index, [成員 index...]), ...]
+    for key in order:
+        first = members_by_key[key][0]
+        band_keys = []
+        best = None
+        if shingle_sets[first]:
+            signature = minhash_signature(shingle_sets[first])
+            band_keys = [
+                (band, signature[band * rows : (band + 1) * rows].tobytes()) for band in range(BANDS)
+            ]
+            candidates = {c for band_key in band_keys for c in buckets.get(band_key, ())}
+            best_similarity = threshold
+            for c in sorted(candidates):
+                rep = clusters[c][0]
+                if final_char(keys[rep]) != final_char(key):
+                    continue
+                similarity = jaccard(shingle_sets[rep], shingle_sets[first])
+                if min(len(keys[rep]), len(key)) <= SHORT_PHRASE_LEN and similarity < SHORT_PHRASE_THRESHOLD:
+                    continue
+                if similarity >= best_similarity:
+                    best, best_similarity = c, similarity
+        if best is not None:
+            clusters[best][1].extend(members_by_key[key])
+            continue
+        for band_key in band_keys:
+            buckets[band_key].append(len(clusters))
+        clusters.append((first, list(members_by_key[key])))
+
+    results = []
+    for _, members in sorted(clusters, key=lambda cluster: min(cluster[1])):
+        members = sorted(members)
+        # 代表文字：出現最多次者，次數相同時取較短的
+        best = min(members, key=lambda i: (-counts[unique[i]], len(unique[i]), i))
+        results.append(
+            {
+                "text": unique[best],
+                "count": sum(counts[unique[i]] for i in members),
+                "members": [unique[i] for i in members],
+            }
+        )
+    return results
+
+
+def estimate_tokens(text):
+    """粗估 LLM token 數：中日韓文字一字一個 token，其餘約四個字元一個 token"""
+    cjk = len(re.findall(r"[㐀-鿿　-〿＀-￯]", text))
+    return cjk + (len(text) - cjk + 3) // 4
@@ -1,27 +1,44 @@
+import hashlib
+import hmac
+import itertools
 import json
 import logging
 import os
-import threading
+import queue
 import time
 from datetime import datetime, timezone
-from math import radians, sin, cos, sqrt, atan2
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request, send_file, stream_with_context
 from flask_cors import CORS
 from google.cloud import aiplatform, firestore
 from google.oauth2 import service_account
-from peft import PeftConfig, PeftModel
 from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
-from transformers import AutoModelForQuestionAnswering, AutoTokenizer, pipeline
 from vertexai.preview.generative_models import GenerativeModel
 from webdriver_manager.chrome import ChromeDriverManager
-import requests
 from dotenv import load_dotenv
+from answer_clustering import cluster_phrases, estimate_tokens
+from deadline import JobDeadline
+from geo_cache import PLACES_MAX_RADIUS, NearbySearchCache
+from http_client import HttpClient
+import metrics
+from job_queue import HIGH_PRIORITY, JobQueue
+from job_store import DurableJobQueue, JobStore, SharedStatus
+from places_api import DEFAULT_BASE_URL as PLACES_DEFAULT_BASE_URL, PlacesClient
+from prefetch import CLICK_COUNTERS, Prefetcher
+from profiling import DEFAULT_INTERVAL_MS, PROFILE_MODES, JobProfiler, ProfileRequest
+from spatial_index import RestaurantIndex, sort_by_distance
+from qa_model import QA_BACKENDS, load_qa_backend
+from qa_prefilter import PrefilterStats, content_length, expand_answers, plan_questions, select_questions
+from qa_workers import LocalQAClient, QAWorkerPool
+from rate_governor import RateGovernor
+from rating_stats import merge_ratings, public_stats
+from review_parser import parse_reviews_html
 load_dotenv()
 
 # 設定logging
@@ -34,28 +51,161 @@ logging.basicConfig(
 PROJECT_ID = "data-model-lecture"
 GOOGLE_MAPS_API_KEY = os.getenv('VITE_GOOGLE_MAPS_API_KEY', 'YOUR_GOOGLE_MAPS_API_KEY')
 GOOGLE_APPLICATION_CREDENTIALS = os.getenv('GOOGLE_APPLICATION_CREDENTIALS', 'YOUR_GOOGLE_APPLICATION_CREDENTIALS')
+# QA 推論 worker 進程數，0 表示在 Flask 進程內直接執行
+QA_WORKERS = int(os.getenv('QA_WORKERS', '0'))
+# QA 推論後端：torch（transformers pipeline）或 onnx（需先執行 qa_onnx_export.py）；
+# WHAT2EAT_FAKE_SERVICES=1 時可設為 fake，以 FAKE_QA_LATENCY_MS 模擬每則評論的推論時間
+QA_BACKEND = os.getenv('QA_BACKEND', 'torch')
+# 是否在 QA 前先略過沒有可抽取內容的評論 / 問題
+QA_PREFILTER = os.getenv('QA_PREFILTER', '1') == '1'
+# QA 引擎的視窗設定：每個視窗最大長度、相鄰視窗重疊 token 數、每則評論最多視窗數
+QA_MAX_SEQ_LEN = int(os.getenv('QA_MAX_SEQ_LEN', '384'))
+QA_DOC_STRIDE = int(os.getenv('QA_DOC_STRIDE', '128'))
+QA_MAX_WINDOWS = int(os.getenv('QA_MAX_WINDOWS', '4'))
+# 附近餐廳圖塊快取：是否啟用、每個圖塊的有效秒數、最多保留的圖塊數
+NEARBY_CACHE = os.getenv('NEARBY_CACHE', '1') == '1'
+NEARBY_CACHE_TTL = int(os.getenv('NEARBY_CACHE_TTL', '1800'))
+NEARBY_CACHE_MAX_TILES = int(os.getenv('NEARBY_CACHE_MAX_TILES', '2000'))
+# Places API 位址，測試時可指向 stub_places_server.py
+PLACES_API_BASE_URL = os.getenv('PLACES_API_BASE_URL', PLACES_DEFAULT_BASE_URL)
+# 對外 HTTP 連線設定：每個 host 最多連線數、讀取 timeout 秒數、重試次數
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '20'))
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', '10'))
+HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', '3'))
+# 爬蟲 / 分析工作佇列：同時執行的工作數（每個工作一個瀏覽器）、低優先工作的排隊上限
+SCRAPE_WORKERS = int(os.getenv('SCRAPE_WORKERS', '2'))
+SCRAPE_QUEUE_CAPACITY = int(os.getenv('SCRAPE_QUEUE_CAPACITY', '16'))
+# 同時開啟的瀏覽器數上限；實際上限由速率控制器依成功率與頁面就緒時間在 1 到此值之間調整
+SCRAPE_SESSION_LIMIT = int(os.getenv('SCRAPE_SESSION_LIMIT', str(max(1, SCRAPE_WORKERS))))
+# 健康時相鄰兩次開啟瀏覽器的最短間隔（秒），退避時加倍
+SCRAPE_START_INTERVAL = float(os.getenv('SCRAPE_START_INTERVAL', '1'))
+# Google Maps 頁面就緒超過此秒數視為被限速，降低瀏覽器上限
+SCRAPE_PAGE_READY_TARGET = float(os.getenv('SCRAPE_PAGE_READY_TARGET', '8'))
+# 每個爬取 / 分析工作的時間預算（秒，從使用者點擊或開始執行時計算），接近時縮減捲動、QA 與 Gemini 篩選；0 表示不限時
+JOB_DEADLINE_SECONDS = float(os.getenv('JOB_DEADLINE_SECONDS', '480'))
+# 分散式執行：設定後工作與爬取狀態存在此 SQLite 資料庫，由 worker.py 進程領取執行
+# （本進程仍會啟動 SCRAPE_WORKERS 個 worker，純 API 節點可設 SCRAPE_WORKERS=0）
+JOB_STORE_PATH = os.getenv('JOB_STORE_PATH', '')
+# worker 租約秒數，超過未續約（worker 當機）時工作重新排隊，最多嘗試 JOB_MAX_ATTEMPTS 次
+JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', '60'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+# 處理評論時最多每隔幾秒更新一次進度（分散式模式下每次更新都是一次 SQLite 寫入）
+STATUS_PROGRESS_INTERVAL = float(os.getenv('STATUS_PROGRESS_INTERVAL', '1'))
+# 附近餐廳預先分析：是否預設啟用、每次搜尋預先分析前幾間、每段時間（秒）最多送出的工作數
+PREFETCH = os.getenv('PREFETCH', '0') == '1'
+PREFETCH_TOP_N = int(os.getenv('PREFETCH_TOP_N', '5'))
+PREFETCH_BUDGET = int(os.getenv('PREFETCH_BUDGET', '20'))
+PREFETCH_BUDGET_WINDOW = int(os.getenv('PREFETCH_BUDGET_WINDOW', '3600'))
+# 是否記錄 /metrics 指標，關閉後各記錄點只剩一次判斷
+METRICS = os.getenv('METRICS', '1') == '1'
+# 離線測試：改用 fakes.py 的 Firestore 與 Gemini 替身，不需要 Google 憑證
+FAKE_SERVICES = os.getenv('WHAT2EAT_FAKE_SERVICES', '0') == '1'
+# 分析過程的中間結果輸出目錄
+RESULTS_DIR = os.getenv('RESULTS_DIR', 'results')
+# 是否將分析的中間結果（first / filtered / final_result.json）寫到 RESULTS_DIR；
+# 檔名固定，同時執行的工作會互相覆寫，批次處理時關閉
+SAVE_INTERMEDIATE_RESULTS = os.getenv('SAVE_INTERMEDIATE_RESULTS', '1') == '1'
+# 管理 API（工作剖析）的存取權杖，需放在 X-Profiling-Token 標頭；未設定時停用剖析
+PROFILING_TOKEN = os.getenv('PROFILING_TOKEN', '')
+# 剖析結果的存放目錄
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(RESULTS_DIR, 'profiles'))
 
 app = Flask(__name__)
 CORS(app)
 
-# export GOOGLE_APPLICATION_CREDENTIALS="/path/to/your/service-account-file.json" -> 環境變數 mac
-# set GOOGLE_APPLICATION_CREDENTIALS=C:\Users\username\Downloads\your-service-account-file.json -> 環境變數 windows
-credentials = service_account.Credentials.from_service_account_file(
-    GOOGLE_APPLICATION_CREDENTIALS
-)
+if FAKE_SERVICES:
+    from fakes import FakeFirestore, FakeReviewSource, StubGemini
+
+    credentials = None
+    db = FakeFirestore(latency_ms=float(os.getenv('FAKE_FIRESTORE_LATENCY_MS', '0')))
+    gemini_stub = StubGemini(latency_ms=float(os.getenv('FAKE_GEMINI_LATENCY_MS', '0')))
+    # 以存下來的評論 HTML 代替 Selenium 爬蟲，FAKE_SCRAPER_LATENCY_MS 模擬開瀏覽器與捲動的時間
+    review_source = FakeReviewSource(
+        os.getenv('FAKE_REVIEWS_FIXTURE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'reviews.html')),
+        latency_ms=float(os.getenv('FAKE_SCRAPER_LATENCY_MS', '0')),
+    )
+else:
+    # export GOOGLE_APPLICATION_CREDENTIALS="/path/to/your/service-account-file.json" -> 環境變數 mac
+    # set GOOGLE_APPLICATION_CREDENTIALS=C:\Users\username\Downloads\your-service-account-file.json -> 環境變數 windows
+    credentials = service_account.Credentials.from_service_account_file(
+        GOOGLE_APPLICATION_CREDENTIALS
+    )
+
+    # 初始化 AI Platform，傳遞憑證
+    aiplatform.init(project=PROJECT_ID, credentials=credentials, location="us-central1")
 
-# 初始化 AI Platform，傳遞憑證
-aiplatform.init(project=PROJECT_ID, credentials=credentials, location="us-central1")
+    # 初始化 Firestore 客戶端
+    db = firestore.Client(
+        project=PROJECT_ID, credentials=credentials, database="dm-firestore"
+    )
+
+# 用於儲存爬蟲狀態；分散式模式下存在共用的資料庫，所有節點看到同一份
+if JOB_STORE_PATH:
+    job_store = JobStore(JOB_STORE_PATH, max_attempts=JOB_MAX_ATTEMPTS)
+    scraping_status = SharedStatus(job_store)
+else:
+    scraping_status = {}
+# QA 推論客戶端，啟動時由 init_qa_client 建立
+qa_client = None
+
+# /metrics 指標；吞吐量（評論數 / 秒、QA 呼叫 / 秒）由 Prometheus 以 rate() 計算
+metrics.set_enabled(METRICS)
+STAGE_SECONDS = metrics.histogram(
+    "what2eat_stage_seconds", "爬蟲與分析各階段耗時（秒）", ["stage"]
+)
+REVIEWS_SCRAPED = metrics.counter("what2eat_reviews_scraped_total", "擷取的評論數")
+REVIEWS_UPLOADED = metrics.counter("what2eat_reviews_uploaded_total", "上傳到 Firestore 的評論數")
+SCRAPE_JOBS = metrics.counter("what2eat_scrape_jobs_total", "爬蟲與分析工作數", ["result"])
+QA_REVIEWS = metrics.counter("what2eat_qa_reviews_total", "送進 QA 模型的評論數")
+QA_CALLS = metrics.counter("what2eat_qa_calls_total", "送進 QA 模型的（評論, 問題）數")
+GEMINI_CALLS = metrics.counter("what2eat_gemini_calls_total", "Gemini 呼叫次數", ["call", "result"])
+SCRAPE_GOVERNOR_DECISIONS = metrics.counter(
+    "what2eat_scrape_governor_decisions_total", "瀏覽器上限調整次數", ["action", "cause"]
+)
+HTTP_REQUESTS = metrics.counter(
+    "what2eat_http_requests_total", "HTTP 請求數", ["endpoint", "method", "status"]
+)
+HTTP_SECONDS = metrics.histogram(
+    "what2eat_http_request_seconds", "HTTP 請求處理耗時（秒）", ["endpoint"]
+)
 
-# 初始化 Firestore 客戶端
-db = firestore.Client(
-    project=PROJECT_ID, credentials=credentials, database="dm-firestore"
+# 各分析階段還沒有耗時紀錄時預估的秒數，用來判斷時間預算是否足夠
+STAGE_ESTIMATES = {
+    "qa_inference": 60.0,
+    "gemini_filter": 20.0,
+    "gemini_summarize": 20.0,
+    "firestore_upload_analysis": 2.0,
+}
+# 工作狀態中每個部分結果列表最多保留的項目數
+PARTIAL_LIST_LIMIT = 20
+# 略過 Gemini 篩選時，每個列表保留出現次數最多的前幾項送去總結
+UNFILTERED_TOP_N = 10
+
+# 瀏覽器工作的速率控制，Google 變慢或逾時時減少同時開啟的瀏覽器並放慢啟動
+scrape_governor = RateGovernor(
+    SCRAPE_SESSION_LIMIT,
+    min_interval=SCRAPE_START_INTERVAL,
+    latency_target=SCRAPE_PAGE_READY_TARGET,
+    timeout_errors=(TimeoutException,),
+    on_decision=lambda action, cause: SCRAPE_GOVERNOR_DECISIONS.inc(action=action, cause=cause),
 )
 
-# 用於儲存爬蟲狀態
-scraping_status = {}
-# 用於儲存正在執行的線程
-active_threads = {}
+
+@app.before_request
+def start_request_timer():
+    if metrics.is_enabled():
+        g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.get("request_start")
+    if start is not None:
+        # 以路由樣板當標籤，避免每個餐廳名稱各自成為一組指標
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        HTTP_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+        HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    return response
 
 
 def save2json(dir_name: str, file_name: str, reviews: list | dict):
@@ -83,6 +233,8 @@ def build_prompt(context, question):
 
 def answer_question_gemini(context, question):
     """使用 Gemini 模型回答問題"""
+    if FAKE_SERVICES:
+        return gemini_stub(context, question)
     prompt = build_prompt(context, question)
 
     model = GenerativeModel("gemini-1.5-pro-002")
@@ -102,17 +254,33 @@ def answer_question_gemini(context, question):
         logging.error(f"發生錯誤：{e}")
 
 
+@metrics.timed(STAGE_SECONDS, stage="firestore_upload_reviews")
+def review_doc_id(review):
+    """評論文檔的 ID，由關鍵字、用戶、評論時間與內容決定，重複匯入同一則評論時覆寫同一個文檔"""
+    key = "\n".join(str(review.get(field) or "") for field in ("關鍵字", "用戶", "評論時間", "評論"))
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def existing_review_ids(collection_name, doc_ids):
+    """回傳 doc_ids 中已經存在於 Firestore 的評論文檔 ID"""
+    if not doc_ids:
+        return set()
+    refs = [db.collection(collection_name).document(doc_id) for doc_id in doc_ids]
+    return {snapshot.id for snapshot in db.get_all(refs) if snapshot.exists}
+
+
 def upload_reviews_to_firestore(collection_name, reviews):
     """
     將評論數據上傳到 Firestore 的指定集合。
-    每條評論作為一個文檔存儲。
+    每條評論作為一個文檔存儲，文檔 ID 為 review_doc_id。
     """
     try:
         batch = db.batch()
         for review in reviews:
-            doc_ref = db.collection(collection_name).document()
+            doc_ref = db.collection(collection_name).document(review_doc_id(review))
             batch.set(doc_ref, review)
         batch.commit()
+        REVIEWS_UPLOADED.inc(len(reviews))
         logging.info(
             f"成功上傳 {len(reviews)} 條評論到 Firestore 集合: {collection_name}"
         )
@@ -121,22 +289,27 @@ def upload_reviews_to_firestore(collection_name, reviews):
         raise
 
 
-def upload_analysis_to_firestore(collection_name, keyword, analysis):
+@metrics.timed(STAGE_SECONDS, stage="firestore_upload_analysis")
+def upload_analysis_to_firestore(collection_name, keyword, analysis, rating_stats=None):
     """
     將分析結果上傳到 Firestore 的指定集合中的一個文檔。
+    :param rating_stats: 可選，累計的評分統計，與分析結果存在同一個文檔
     """
     try:
         # 創建或更新一個文檔用於存儲分析結果，文檔 ID 為關鍵字
         doc_ref = db.collection(collection_name).document(keyword)
-        doc_ref.set(
-            {
-                "keyword": keyword,
-                "分析結果": analysis,
-                "分析時間": firestore.SERVER_TIMESTAMP,
-                "last_scraped": firestore.SERVER_TIMESTAMP,  # 記錄最後爬取時間
-            },
-            merge=True,
-        )
+        data = {
+            "keyword": keyword,
+            "分析結果": analysis,
+            "分析時間": firestore.SERVER_TIMESTAMP,
+            "last_scraped": firestore.SERVER_TIMESTAMP,  # 記錄最後爬取時間
+            # 因時間預算縮減過或有階段失敗的結果不算新鮮，下次點擊時重新分析
+            "分析已縮減": bool(analysis.get("degradations")),
+            "分析不完整": bool(analysis.get("errors")),
+        }
+        if rating_stats is not None:
+            data["評分統計"] = rating_stats
+        doc_ref.set(data, merge=True)
         logging.info(
             f"成功上傳分析結果到 Firestore 集合: {collection_name}, 文檔 ID: {keyword}"
         )
@@ -153,8 +326,14 @@ def should_scrape(keyword, frequency_days=7):
     :return: True 如果需要爬取，否則 False
     """
     doc_ref = db.collection("reviews").document(keyword)
-    doc = doc_ref.get()
+    return is_stale(doc_ref.get(), frequency_days)
+
+
+def is_stale(doc, frequency_days=7):
+    """依分析文檔的 last_scraped 判斷是否需要重新爬取，同步與非同步 Firestore 共用"""
     if doc.exists:
+        if doc.to_dict().get("分析已縮減") or doc.to_dict().get("分析不完整"):
+            return True
         last_scraped = doc.to_dict().get("last_scraped")
         if last_scraped:
             last_scraped_time = last_scraped
@@ -165,10 +344,262 @@ def should_scrape(keyword, frequency_days=7):
     return True
 
 
-def scrape_google_reviews(
-    keyword, driver_path, collection_name="reviews", frequency_days=7
-):
-    logging.info(f"Start scraping for keyword: {keyword}")
+def build_review_records(parsed_reviews, keyword, last_scraped_time=None, on_progress=None):
+    """
+    將 parse_reviews_html 的結果轉成要上傳到 Firestore 的評論資料。
+    :param last_scraped_time: 上次爬取時間，早於此時間的評論會被跳過
+    :param on_progress: 可選，每處理完一則評論呼叫 on_progress(idx)
+    """
+    all_reviews = []
+    for idx, review in enumerate(parsed_reviews, 1):
+        try:
+            # 與逐欄位 find_element 相同，缺少必要欄位的評論視為錯誤並跳過
+            for field in ("reviewer", "rating", "comment"):
+                if review[field] is None:
+                    raise ValueError(f"找不到欄位 {field}")
+            reviewer = review["reviewer"]
+            rating = review["rating"]
+            comment = review["comment"]
+
+            # 嘗試獲取評論時間
+            review_time_str = review["time"]
+            try:
+                # 解析評論時間（根據實際格式調整）
+                review_time = datetime.strptime(
+                    review_time_str, "%Y-%m-%d"
+                )  # 示例格式
+            except Exception:
+                review_time = None
+
+            # 如果評論時間早於上次爬取時間，則跳過
+            if (
+                last_scraped_time
+                and review_time
+                and review_time < last_scraped_time
+            ):
+                logging.info(f"跳過早於上次爬取的評論: {review_time}")
+                continue
+
+            review_data = {
+                "評論編號": idx,
+                "用戶": reviewer,
+                "評分": rating,
+                "評論": comment,
+                "關鍵字": keyword,
+                "抓取時間": firestore.SERVER_TIMESTAMP,
+                "評論時間": review_time_str if review_time else None,
+            }
+            all_reviews.append(review_data)
+
+            if on_progress:
+                on_progress(idx)
+
+        except Exception as e:
+            logging.error(f"處理第 {idx} 則評論時發生錯誤: {e}")
+            continue
+    return all_reviews
+
+
+def estimate_stages(*stages):
+    """以過去各階段的平均耗時估計剩下的工作需要幾秒，沒有紀錄（或關閉指標）時使用 STAGE_ESTIMATES"""
+    snapshot = STAGE_SECONDS.snapshot()
+    total = 0.0
+    for stage in stages:
+        count, seconds = snapshot.get((stage,), (0, 0.0))
+        total += seconds / count if count else STAGE_ESTIMATES[stage]
+    return total
+
+
+def record_partial(keyword, stage, data):
+    """
+    在工作狀態發布已完成階段的部分結果，依序為 reviews（評論數）、qa（QA 抽取並分群的片段）、
+    filtered（篩選後的列表）與 summary。
+    """
+    if keyword not in scraping_status:
+        return
+    status = scraping_status[keyword]
+    partial = dict(status.get("partial") or {})
+    partial[stage] = data
+    # 整個欄位重新指定並一起更新，分散式模式下只寫回共用狀態一次
+    status.update({"partial": partial, "stage": stage})
+
+
+def partial_lists(lists):
+    """部分結果的列表只保留前 PARTIAL_LIST_LIMIT 項，counts 為截斷前的項目數"""
+    data = {key: value[:PARTIAL_LIST_LIMIT] for key, value in lists.items()}
+    data["counts"] = {key: len(value) for key, value in lists.items()}
+    return data
+
+
+def job_deadline(keyword):
+    """
+    依 JOB_DEADLINE_SECONDS 建立工作的時間預算，縮減紀錄寫進工作狀態的 degradations。
+    使用者點擊的工作從點擊時（requested_at）開始計時；預先分析的工作從開始執行時計時，
+    排隊等待的時間不算在預算內，之後被使用者點擊提前也不會一開始就超時。
+    """
+
+    def on_degrade(degradations):
+        if keyword in scraping_status:
+            scraping_status[keyword]["degradations"] = degradations
+
+    if JOB_DEADLINE_SECONDS <= 0:
+        return JobDeadline(on_degrade=on_degrade)
+    status = scraping_status.get(keyword) or {}
+    deadline = JobDeadline(JOB_DEADLINE_SECONDS, started_at=status.get("requested_at"), on_degrade=on_degrade)
+    if keyword in scraping_status:
+        scraping_status[keyword]["deadline_at"] = deadline.expires_at
+    return deadline
+
+
+def previous_rating_stats(collection_name, keyword, doc):
+    """
+    取得分析文檔上的評分統計；這個欄位加入前就分析過的餐廳，
+    從已上傳的評論（只讀評分欄位）補算一次，之後再累加新評論。
+    """
+    if not doc.exists:
+        return None
+    stats = doc.to_dict().get("評分統計")
+    if stats is not None:
+        return stats
+    docs = (
+        db.collection(collection_name)
+        .where("`關鍵字`", "==", keyword)
+        .select(["`評分`", "`抓取時間`"])
+        .stream()
+    )
+    # 已上傳的評論只有相對時間（未保存），近期平均以抓取時間由新到舊近似
+    records = sorted(
+        (d.to_dict() for d in docs),
+        key=lambda record: record.get("抓取時間") or datetime.min.replace(tzinfo=timezone.utc),
+        reverse=True,
+    )
+    return merge_ratings(None, [record.get("評分") for record in records])
+
+
+def process_scraped_reviews(keyword, parsed_reviews, collection_name, clock, deadline=None, strict=False):
+    """
+    整理擷取到的評論、上傳 Firestore 並執行 QA 分析，真實爬蟲、假爬蟲與批次匯入共用。
+    :param deadline: 可選，工作的時間預算（JobDeadline），未指定時不限時
+    :param strict: 分析有任何階段失敗時引發 RuntimeError、不上傳分析結果（批次處理用，讓項目之後可重跑）；
+                   預設上傳並標記為不完整，下次點擊時重新分析
+    :return: 上傳的評論數
+    """
+    total_reviews = len(parsed_reviews)
+    logging.info(f"Total extracted reviews: {total_reviews}")
+
+    if keyword in scraping_status:
+        scraping_status[keyword]["total_reviews"] = total_reviews
+
+    # 獲取上次爬取的最新評論時間
+    doc_ref = db.collection("reviews").document(keyword)
+    doc = doc_ref.get()
+    last_scraped_time = None
+    if doc.exists:
+        last_scraped = doc.to_dict().get("last_scraped")
+        if last_scraped:
+            last_scraped_time = last_scraped
+
+    # 進度依時間節流，避免每則評論都寫一次狀態
+    last_progress = 0.0
+
+    def on_progress(idx):
+        nonlocal last_progress
+        now = time.monotonic()
+        if now - last_progress < STATUS_PROGRESS_INTERVAL:
+            return
+        last_progress = now
+        if keyword in scraping_status:
+            scraping_status[keyword]["processed_reviews"] = idx
+
+    all_reviews = build_review_records(
+        parsed_reviews, keyword, last_scraped_time, on_progress=on_progress
+    )
+    if keyword in scraping_status:
+        scraping_status[keyword]["processed_reviews"] = total_reviews
+    # 同一則評論只保留一份；已上傳過的評論（例如重新匯入）覆寫原文檔，不再計入評分統計
+    unique_reviews = {}
+    for review in all_reviews:
+        unique_reviews.setdefault(review_doc_id(review), review)
+    all_reviews = list(unique_reviews.values())
+    existing = existing_review_ids(collection_name, list(unique_reviews))
+    # 在上傳新評論前讀取舊統計，補算時才不會重複計入這批評論
+    new_reviews = [review for doc_id, review in unique_reviews.items() if doc_id not in existing]
+    rating_stats = merge_ratings(
+        previous_rating_stats(collection_name, keyword, doc),
+        [review["評分"] for review in new_reviews],
+        # 近期平均依評論時間排序；上傳的紀錄只保留可解析的絕對時間，從原始擷取結果取相對時間
+        [parsed_reviews[review["評論編號"] - 1]["time"] for review in new_reviews],
+    )
+
+    clock.lap("extract")
+    REVIEWS_SCRAPED.inc(len(all_reviews))
+    logging.info("Reviews extracted, uploading to Firestore...")
+    # 上傳評論到 Firestore
+    upload_reviews_to_firestore(collection_name, all_reviews)
+
+    record_partial(keyword, "reviews", {"count": len(all_reviews)})
+
+    logging.info("Reviews uploaded, starting QA analysis...")
+    # 爬完之後進行 QA 分析和總結
+    analysis_result = analyze_reviews_with_qa_lora(
+        all_reviews,
+        deadline=deadline,
+        on_partial=lambda stage, data: record_partial(keyword, stage, data),
+    )
+    # API會使用太多資源，所以使用 local LLM 配合 lora 進行分析
+    # analysis_result = analyze_reviews_with_qa_gemeni(all_reviews)
+    if strict and analysis_result.get("errors"):
+        details = "; ".join(f"{error['stage']}: {error['detail']}" for error in analysis_result["errors"])
+        raise RuntimeError(f"分析未完成: {details}")
+
+    logging.info("QA analysis completed, uploading analysis to Firestore...")
+    # 上傳分析結果到 Firestore
+    upload_analysis_to_firestore(collection_name, keyword, analysis_result, rating_stats)
+
+    if keyword in scraping_status:
+        scraping_status[keyword]["status"] = "completed"
+        scraping_status[keyword][
+            "message"
+        ] = f"完成，共收集 {len(all_reviews)} 則評論，並產生QA分析結果"
+    return len(all_reviews)
+
+
+def record_scrape_error(keyword, error):
+    SCRAPE_JOBS.inc(result="error")
+    logging.error(f"Error during scraping: {error}")
+    if keyword in scraping_status:
+        scraping_status[keyword]["status"] = "error"
+        scraping_status[keyword]["error"] = str(error)
+
+
+def record_browser_status(keyword, stats, message=None):
+    """把速率控制器目前的上限與最近的調整寫進工作狀態"""
+    if keyword not in scraping_status:
+        return
+    status = scraping_status[keyword]
+    if message:
+        status["message"] = message
+    status["browser"] = {
+        "limit": stats["limit"],
+        "running": stats["running"],
+        "waiting": stats["waiting"],
+        "start_interval": stats["start_interval"],
+        "recent_decisions": stats["decisions"][-3:],
+    }
+
+
+def browser_session(keyword):
+    """取得一個瀏覽器名額；需要排隊時在工作狀態顯示等待中"""
+    return scrape_governor.session(
+        keyword,
+        on_wait=lambda stats: record_browser_status(
+            keyword, stats, f"等待瀏覽器名額（{stats['running']}/{stats['limit']} 使用中）"
+        ),
+    )
+
+
+def fetch_reviews_html(keyword, session, clock, deadline):
+    """開啟 Google Maps 並捲動載入評論，回傳評論區塊的 HTML；頁面就緒時回報給速率控制器"""
     chrome_options = Options()
     chrome_options.add_argument("--headless=new")
     chrome_options.add_argument("--disable-gpu")
@@ -180,14 +611,14 @@ def scrape_google_reviews(
     service = Service(ChromeDriverManager().install())
     driver = webdriver.Chrome(service=service, options=chrome_options)
     wait = WebDriverWait(driver, 15)
-
-    all_reviews = []
+    clock.lap("chrome_start")
 
     try:
         if keyword in scraping_status:
             scraping_status[keyword]["status"] = "processing"
             scraping_status[keyword]["message"] = "連接到 Google Maps"
 
+        page_start = time.perf_counter()
         driver.get("https://www.google.com.tw/maps/preview")
         search_box = wait.until(
             EC.presence_of_element_located((By.ID, "searchboxinput"))
@@ -208,9 +639,15 @@ def scrape_google_reviews(
                 )
             )
         )
+        session.page_ready(time.perf_counter() - page_start)
 
+        clock.lap("open_reviews")
         logging.info("Scrolling to load reviews...")
-        for _ in range(10):
+        for scrolls in range(10):
+            # 每次捲動最多等 15 秒；剩餘時間不夠後續分析時提早停止
+            if not deadline.can_afford(15 + estimate_stages(*STAGE_ESTIMATES)):
+                deadline.degrade("stop_scrolling", f"捲動 {scrolls} 次後停止載入評論")
+                break
             previous_height = driver.execute_script(
                 "return arguments[0].scrollHeight;", scrollable_div
             )
@@ -230,113 +667,90 @@ def scrape_google_reviews(
                 # 若超過指定秒數沒變化，表示已無更多評論可以載入
                 break
 
+        clock.lap("scroll")
         logging.info("Extracting reviews...")
-        reviews = driver.find_elements(By.CSS_SELECTOR, "div.jftiEf.fontBodyMedium")
-        total_reviews = len(reviews)
-        logging.info(f"Total extracted reviews: {total_reviews}")
-
-        if keyword in scraping_status:
-            scraping_status[keyword]["total_reviews"] = total_reviews
-
-        # 獲取上次爬取的最新評論時間
-        doc_ref = db.collection("reviews").document(keyword)
-        doc = doc_ref.get()
-        last_scraped_time = None
-        if doc.exists:
-            last_scraped = doc.to_dict().get("last_scraped")
-            if last_scraped:
-                last_scraped_time = last_scraped
-
-        for idx, review in enumerate(reviews, 1):
+        # 先展開所有「更多」按鈕，再一次取出評論區塊的 HTML 在本機解析，
+        # 避免每則評論的每個欄位各做一次 WebDriver 往返
+        more_buttons = driver.find_elements(
+            By.CSS_SELECTOR, "div.jftiEf.fontBodyMedium button.w8nwRe.kyuRq"
+        )
+        for more_button in more_buttons:
             try:
-                more_button = review.find_elements(
-                    By.CSS_SELECTOR, "button.w8nwRe.kyuRq"
-                )
-                if more_button:
-                    more_button[0].click()
-                    time.sleep(0.1) # NOTE 修改成0.1秒
-
-                reviewer = review.find_element(By.CSS_SELECTOR, "div.d4r55").text
-                rating_element = review.find_element(By.CSS_SELECTOR, "span.kvMYJc")
-                rating = (
-                    rating_element.get_attribute("aria-label")
-                    if rating_element
-                    else "無評分"
-                )
-                comment = review.find_element(By.CSS_SELECTOR, "span.wiI7pd").text
-
-                # 嘗試獲取評論時間
-                try:
-                    review_time_str = review.find_element(
-                        By.CSS_SELECTOR, "span.rsqaWe"
-                    ).text
-                    # 解析評論時間（根據實際格式調整）
-                    review_time = datetime.strptime(
-                        review_time_str, "%Y-%m-%d"
-                    )  # 示例格式
-                except Exception:
-                    review_time = None
-
-                # 如果評論時間早於上次爬取時間，則跳過
-                if (
-                    last_scraped_time
-                    and review_time
-                    and review_time < last_scraped_time
-                ):
-                    logging.info(f"跳過早於上次爬取的評論: {review_time}")
-                    continue
-
-                review_data = {
-                    "評論編號": idx,
-                    "用戶": reviewer,
-                    "評分": rating,
-                    "評論": comment,
-                    "關鍵字": keyword,
-                    "抓取時間": firestore.SERVER_TIMESTAMP,
-                    "評論時間": review_time_str if review_time else None,
-                }
-                all_reviews.append(review_data)
-
-                if keyword in scraping_status:
-                    scraping_status[keyword]["processed_reviews"] = idx
-
+                more_button.click()
             except Exception as e:
-                logging.error(f"處理第 {idx} 則評論時發生錯誤: {e}")
-                continue
+                logging.error(f"展開評論時發生錯誤: {e}")
+        if more_buttons:
+            time.sleep(0.1) # NOTE 修改成0.1秒
+        return driver.execute_script("return arguments[0].outerHTML;", scrollable_div)
+    finally:
+        driver.quit()
 
-        logging.info("Reviews extracted, uploading to Firestore...")
-        # 上傳評論到 Firestore
-        upload_reviews_to_firestore(collection_name, all_reviews)
 
-        logging.info("Reviews uploaded, starting QA analysis...")
-        # 爬完之後進行 QA 分析和總結
-        analysis_result = analyze_reviews_with_qa_lora(all_reviews)
-        # API會使用太多資源，所以使用 local LLM 配合 lora 進行分析
-        # analysis_result = analyze_reviews_with_qa_gemeni(all_reviews)
+@metrics.timed(STAGE_SECONDS, stage="scrape_job")
+def scrape_google_reviews(
+    keyword, driver_path, collection_name="reviews", frequency_days=7, deadline=None, strict=False
+):
+    logging.info(f"Start scraping for keyword: {keyword}")
+    clock = metrics.StageClock(STAGE_SECONDS)
+    deadline = deadline or JobDeadline()
+    try:
+        # 瀏覽器在取得 HTML 後就關閉，分析期間不佔用名額
+        with browser_session(keyword) as session:
+            clock.lap("browser_wait")
+            record_browser_status(keyword, scrape_governor.stats())
+            html = fetch_reviews_html(keyword, session, clock, deadline)
+        review_count = process_scraped_reviews(
+            keyword, parse_reviews_html(html), collection_name, clock, deadline, strict
+        )
+        SCRAPE_JOBS.inc(result="completed")
+        logging.info("Scraping and analysis completed.")
+        return review_count
+    except Exception as e:
+        record_scrape_error(keyword, e)
+        raise
 
-        logging.info("QA analysis completed, uploading analysis to Firestore...")
-        # 上傳分析結果到 Firestore
-        upload_analysis_to_firestore(collection_name, keyword, analysis_result)
 
+@metrics.timed(STAGE_SECONDS, stage="scrape_job")
+def scrape_fixture_reviews(keyword, collection_name="reviews", deadline=None, strict=False):
+    """WHAT2EAT_FAKE_SERVICES 模式的爬蟲：由 review_source 取得評論 HTML，之後的流程與 scrape_google_reviews 相同"""
+    logging.info(f"Start fake scraping for keyword: {keyword}")
+    clock = metrics.StageClock(STAGE_SECONDS)
+    try:
         if keyword in scraping_status:
-            scraping_status[keyword]["status"] = "completed"
-            scraping_status[keyword][
-                "message"
-            ] = f"完成，共收集 {len(all_reviews)} 則評論，並產生QA分析結果"
-
-        logging.info("Scraping and analysis completed.")
+            scraping_status[keyword]["status"] = "processing"
+            scraping_status[keyword]["message"] = "讀取測試評論"
+        with browser_session(keyword) as session:
+            clock.lap("browser_wait")
+            record_browser_status(keyword, scrape_governor.stats())
+            html = review_source.fetch(keyword)
+            session.page_ready()
+        clock.lap("scroll")
+        review_count = process_scraped_reviews(
+            keyword, parse_reviews_html(html), collection_name, clock, deadline, strict
+        )
+        SCRAPE_JOBS.inc(result="completed")
+        return review_count
     except Exception as e:
-        logging.error(f"Error during scraping: {e}")
-        if keyword in scraping_status:
-            scraping_status[keyword]["status"] = "error"
-            scraping_status[keyword]["error"] = str(e)
+        record_scrape_error(keyword, e)
         raise
-    finally:
-        driver.quit()
 
 
-def analyze_reviews_with_qa_lora(reviews):
+@metrics.timed(STAGE_SECONDS, stage="analysis")
+def analyze_reviews_with_qa_lora(reviews, deadline=None, on_partial=None):
+    """
+    :param deadline: 可選，工作的時間預算；不夠時 QA 只處理前 K 則評論、略過 Gemini 篩選
+    :param on_partial: 可選，每個階段完成時呼叫 on_partial(階段, 部分結果)
+    """
+    if qa_client is None:
+        # 沒有 QA 客戶端時每批都會失敗，讓工作失敗而不是上傳空的分析結果
+        raise RuntimeError("QA 客戶端尚未建立，需先呼叫 init_qa_client()")
     logging.info("Analyzing reviews with QA pipeline...")
+    clock = metrics.StageClock(STAGE_SECONDS)
+    deadline = deadline or JobDeadline()
+
+    def publish(stage, data):
+        if on_partial:
+            on_partial(stage, data)
 
     # 讓問題本身更明確,引導模型給出更準確的答案
     question1 = "根據這段評論,這家餐廳實際表現好的地方有哪些?請列出具體的優點。若無則回答「無優點」"
@@ -345,72 +759,167 @@ def analyze_reviews_with_qa_lora(reviews):
         "根據這段評論,有哪些值得一試的餐點或特色菜?請列出具體菜名。若無則回答「無推薦」"
     )
 
+    # 保留重複的答案，之後分群時用來計算出現次數
     positives = []
     negatives = []
     recommendations = []
 
-    seen_positives = set()
-    seen_negatives = set()
-    seen_recommendations = set()
+    questions = (question1, question2, question3)
 
-    for idx, r in enumerate(reviews, start=1):
+    # 前置篩選：決定每則評論的哪些問題需要送進 QA 模型
+    prefilter_stats = PrefilterStats()
+    pending = []
+    for r in reviews:
         context = r.get("評論", "")
         if not context:
             continue
-
+        plan = plan_questions(r) if QA_PREFILTER else (True, True, True)
+        prefilter_stats.record(plan)
+        if any(plan):
+            pending.append((plan, context))
+
+    if deadline.limited:
+        # 資訊量高（要問的問題多、內容長）的評論先做，時間不夠停下時保留的是前 K 則
+        pending.sort(key=lambda item: (sum(item[0]), content_length(item[1])), reverse=True)
+
+    clock.lap("qa_prefilter")
+
+    # 每則評論的 token 數與視窗數，用來觀察推論時間花在哪些評論上
+    review_costs = []
+
+    # 失敗的階段，與分析結果一起保存
+    errors = []
+    qa_succeeded = 0
+
+    # 每次送出 10 則評論給 QA 客戶端，worker pool 會再切成批次平行處理
+    chunk_size = 10
+    # 保留 Gemini 與上傳分析結果的時間；至少處理一批，之後以上一批的耗時判斷下一批是否來得及
+    qa_reserve = estimate_stages("gemini_filter", "gemini_summarize", "firestore_upload_analysis")
+    chunk_seconds = 0.0
+    for start in range(0, len(pending), chunk_size):
+        if start and not deadline.can_afford(qa_reserve + chunk_seconds):
+            deadline.degrade("qa_top_k", f"QA 只處理資訊量最高的 {start}/{len(pending)} 則評論")
+            break
+        chunk = pending[start : start + chunk_size]
+        chunk_start = time.perf_counter()
         try:
-            ans1 = qa_pipeline(question=question1, context=context)
-            ans2 = qa_pipeline(question=question2, context=context)
-            ans3 = qa_pipeline(question=question3, context=context)
-
-            # 只過濾重複內容和無效答案
+            with profiler.qa_trace():
+                chunk_answers = qa_client.answer(
+                    [(select_questions(questions, plan), context) for plan, context in chunk]
+                )
+        except Exception as e:
+            logging.error(
+                f"QA處理第 {start + 1}-{start + len(chunk)} 則評論時出現問題: {e}"
+            )
+            errors.append({"stage": "qa", "detail": f"第 {start + 1}-{start + len(chunk)} 則評論: {e}"})
+            chunk_seconds = time.perf_counter() - chunk_start
+            continue
+        chunk_seconds = time.perf_counter() - chunk_start
+        qa_succeeded += len(chunk)
+        QA_REVIEWS.inc(len(chunk))
+        QA_CALLS.inc(sum(sum(plan) for plan, _ in chunk))
+
+        for (plan, context), (answers, stats) in zip(chunk, chunk_answers):
+            ans1, ans2, ans3 = expand_answers(plan, answers)
+            if stats:
+                review_costs.append((stats, sum(plan), context))
+            # 只過濾無效答案，重複內容留到分群時合併
             if ans1 and ans1["answer"] and ans1["answer"] != "無優點":
-                if ans1["answer"] not in seen_positives:
-                    positives.append(ans1["answer"])
-                    seen_positives.add(ans1["answer"])
+                positives.append(ans1["answer"])
 
             if ans2 and ans2["answer"] and ans2["answer"] != "無缺點":
-                if ans2["answer"] not in seen_negatives:
-                    negatives.append(ans2["answer"])
-                    seen_negatives.add(ans2["answer"])
+                negatives.append(ans2["answer"])
 
             if ans3 and ans3["answer"] and ans3["answer"] != "無推薦":
-                if ans3["answer"] not in seen_recommendations:
-                    recommendations.append(ans3["answer"])
-                    seen_recommendations.add(ans3["answer"])
+                recommendations.append(ans3["answer"])
 
-            if idx % 10 == 0:
-                logging.info(f"QA processed {idx}/{len(reviews)} reviews...")
+        logging.info(f"QA processed {start + len(chunk)}/{len(pending)} reviews...")
+    clock.lap("qa_inference")
+    if pending and not qa_succeeded:
+        raise RuntimeError(f"QA 全部失敗（{len(errors)} 批）: {errors[0]['detail']}")
 
-        except Exception as e:
-            logging.error(f"QA處理第 {idx} 則評論時出現問題: {e}")
-            continue
+    logging.info(
+        f"QA 前置篩選略過 {prefilter_stats.skipped_pairs}/{prefilter_stats.pairs} 個問題 "
+        f"({prefilter_stats.saved_ratio:.0%})"
+    )
+    if review_costs:
+        total_tokens = sum(stats["tokens"] for stats, _, _ in review_costs)
+        total_windows = sum(stats["windows"] * n for stats, n, _ in review_costs)
+        truncated = sum(1 for stats, _, _ in review_costs if stats["truncated"])
+        logging.info(
+            f"QA 共 {total_tokens} 個評論 token，推論 {total_windows} 個視窗，"
+            f"{truncated} 則評論超過視窗上限被截斷"
+        )
+        heaviest = sorted(review_costs, key=lambda c: c[0]["tokens"], reverse=True)[:3]
+        for stats, _, context in heaviest:
+            logging.info(
+                f"最長評論: {stats['tokens']} tokens / {stats['windows']} 視窗: {context[:30]}..."
+            )
+
+    # 近似重複分群：合併相似的片段並保留出現次數，減少送進 Gemini 的內容
+    clusters = {
+        "positives": cluster_phrases(positives),
+        "negatives": cluster_phrases(negatives),
+        "recommendations": cluster_phrases(recommendations),
+    }
+    results = {key: [c["text"] for c in value] for key, value in clusters.items()}
+    counts = {key: [c["count"] for c in value] for key, value in clusters.items()}
+    clock.lap("answer_clustering")
+    publish("qa", partial_lists(results))
+
+    exact_dedup = [list(dict.fromkeys(values)) for values in (positives, negatives, recommendations)]
+    tokens_before = estimate_tokens(json.dumps(exact_dedup, ensure_ascii=False))
+    tokens_after = estimate_tokens(json.dumps(list(results.values()), ensure_ascii=False))
+    logging.info(
+        f"答案分群: {sum(len(v) for v in exact_dedup)} -> "
+        f"{sum(len(v) for v in results.values())} 個片段，"
+        f"預估 prompt tokens {tokens_before} -> {tokens_after}"
+    )
 
     # 在進行 GPT 總結前，先進行一次 GPT 篩選
     logging.info("Starting GPT filtering...")
 
-    results = {
-        "positives": positives,
-        "negatives": negatives,
-        "recommendations": recommendations,
-    }
+    if SAVE_INTERMEDIATE_RESULTS:
+        save2json(dir_name=RESULTS_DIR, file_name="first_result.json", reviews=results)
 
-    save2json(dir_name="results", file_name="first_result.json", reviews=results)
-
-    filtered_results = filter_with_gemini(positives, negatives, recommendations)
+    if deadline.can_afford(estimate_stages("gemini_filter", "gemini_summarize", "firestore_upload_analysis")):
+        filtered_results = filter_with_gemini(
+            results["positives"],
+            results["negatives"],
+            results["recommendations"],
+            counts=counts,
+            errors=errors,
+        )
+    else:
+        deadline.degrade("skip_gemini_filter", f"略過 Gemini 篩選，以出現次數最多的前 {UNFILTERED_TOP_N} 項總結")
+        filtered_results = {
+            key: [c["text"] for c in sorted(value, key=lambda c: c["count"], reverse=True)[:UNFILTERED_TOP_N]]
+            for key, value in clusters.items()
+        }
+    publish("filtered", partial_lists(filtered_results))
 
-    save2json(dir_name="results", file_name="filtered_result.json", reviews=results)
+    if SAVE_INTERMEDIATE_RESULTS:
+        save2json(dir_name=RESULTS_DIR, file_name="filtered_result.json", reviews=results)
 
     logging.info("GPT filtering completed, starting final summary...")
     summary_result = summarize_with_gemini(
         filtered_results["positives"],
         filtered_results["negatives"],
         filtered_results["recommendations"],
+        errors=errors,
     )
 
+    publish("summary", summary_result)
+
     final_result = {"individual_analysis": filtered_results, "summary": summary_result}
+    if deadline.degradations:
+        # 與分析結果一起保存，之後讀到的人也知道這份結果經過縮減
+        final_result["degradations"] = deadline.degradations
+    if errors:
+        final_result["errors"] = errors
 
-    save2json(dir_name="results", file_name="final_result.json", reviews=final_result)
+    if SAVE_INTERMEDIATE_RESULTS:
+        save2json(dir_name=RESULTS_DIR, file_name="final_result.json", reviews=final_result)
 
     return final_result
 
@@ -545,7 +1054,24 @@ def analyze_reviews_with_qa_gemeni(reviews):
     return {"individual_analysis": filtered_results, "summary": summary_result}
 
 
-def filter_with_gemini(positives, negatives, recommendations):
+def format_with_counts(phrases, counts=None):
+    """將片段與出現次數組成「片段 (×n)」，次數為 1 時不標示"""
+    if not counts:
+        return list(phrases)
+    return [
+        f"{phrase} (×{count})" if count > 1 else phrase
+        for phrase, count in zip(phrases, counts)
+    ]
+
+
+@metrics.timed(STAGE_SECONDS, stage="gemini_filter")
+def filter_with_gemini(positives, negatives, recommendations, counts=None, errors=None):
+    """
+    以 Gemini 二次篩選 QA 抽取出的內容，失敗時回傳未篩選的內容。
+    :param counts: 可選，{"positives": [...], ...}，各片段在評論中出現的次數
+    :param errors: 可選，失敗時附加 {"stage": "gemini_filter", "detail": ...}
+    """
+    counts = counts or {}
     context = (
         context
     ) = """
@@ -564,27 +1090,33 @@ def filter_with_gemini(positives, negatives, recommendations):
             "recommendations": list[str]
         }
         5. json 回覆時，不要有多餘的字體，像是 "json"、換行符號等
+        6. 項目後面的 (×n) 代表相似描述出現了 n 次，可作為重要性的參考，回傳結果中不要包含 (×n)
     """
 
     question = f"""
     請參考以下優缺點和推薦的原始資料，並根據上述要求進行分析和整理。
         original positives:
-        {json.dumps(positives, ensure_ascii=False)}
+        {json.dumps(format_with_counts(positives, counts.get("positives")), ensure_ascii=False)}
 
         original negatives:
-        {json.dumps(negatives, ensure_ascii=False)}
+        {json.dumps(format_with_counts(negatives, counts.get("negatives")), ensure_ascii=False)}
 
         original recommendations:
-        {json.dumps(recommendations, ensure_ascii=False)}
+        {json.dumps(format_with_counts(recommendations, counts.get("recommendations")), ensure_ascii=False)}
     """
 
     try:
         response = answer_question_gemini(context=context, question=question)
         response = response.strip()
         logging.info("gemini filtering completed.")
-        return json.loads(response)
+        filtered = json.loads(response)
+        GEMINI_CALLS.inc(call="filter", result="ok")
+        return filtered
     except Exception as e:
+        GEMINI_CALLS.inc(call="filter", result="error")
         logging.error(f"gemini 篩選時發生錯誤: {e}")
+        if errors is not None:
+            errors.append({"stage": "gemini_filter", "detail": str(e)})
         return {
             "positives": positives,
             "negatives": negatives,
@@ -592,7 +1124,12 @@ def filter_with_gemini(positives, negatives, recommendations):
         }
 
 
-def summarize_with_gemini(positives, negatives, recommendations):
+@metrics.timed(STAGE_SECONDS, stage="gemini_summarize")
+def summarize_with_gemini(positives, negatives, recommendations, errors=None):
+    """
+    以 Gemini 總結篩選後的內容，失敗時以錯誤訊息作為總結。
+    :param errors: 可選，失敗時附加 {"stage": "gemini_summarize", "detail": ...}
+    """
     context = """
         你是一位專業的餐廳評論家，擁有豐富的經驗。用一段話總結一下整體感受，這家餐廳適合什麼樣的消費者，有哪些值得改進的地方。
         
@@ -621,9 +1158,13 @@ def summarize_with_gemini(positives, negatives, recommendations):
 
     try:
         answer = answer_question_gemini(context=context, question=questions)
+        GEMINI_CALLS.inc(call="summarize", result="ok")
         logging.info("gemini summarization completed.")
     except Exception as e:
+        GEMINI_CALLS.inc(call="summarize", result="error")
         logging.error(f"gemini 總結時發生錯誤: {e}")
+        if errors is not None:
+            errors.append({"stage": "gemini_summarize", "detail": str(e)})
         answer = f"gemini 總結時發生錯誤: {e}"
 
     return answer
@@ -648,100 +1189,360 @@ def get_status(keyword):
         return jsonify({"status": "not_found", "message": "No scraping job found"}), 404
 
 
-@app.route("/api/scrape-reviews", methods=["POST"])
-def start_scrape():
-    try:
-        data = request.json
-        keyword = data.get("keyword")
+def run_scrape_job(keyword):
+    """工作佇列執行的爬取與分析工作，管理者有設定時在工作線程上剖析"""
+    job = job_queue.get(keyword)
+    deadline = job_deadline(keyword)
+    profiler.run(job.job_id if job else keyword, keyword, scrape_keyword, keyword, deadline)
 
-        if not keyword:
-            logging.warning("No keyword provided in request")
-            return jsonify({"error": "No keyword provided"}), 400
 
-        # 判斷是否需要爬取
-        if not should_scrape(keyword):
-            # 如果沒有狀態，則會無法觸發前端抓取資訊
-            scraping_status[keyword] = {
-                "status": "completed",
-                "message": "未達到爬取頻率",
-                "total_reviews": 0,
-                "processed_reviews": 0,
-            }
-            logging.info(f"不需要爬取 {keyword}，因為未達到爬取頻率")
-            return (
-                jsonify(
-                    {
-                        "message": "Scraping not needed at this time",
-                        "status": "not_required",
-                    }
-                ),
-                200,
-            )
+def scrape_keyword(keyword, deadline=None, strict=False):
+    """
+    爬取並分析一間餐廳，回傳評論數
+    :param deadline: 可選，工作的時間預算，批次處理等不指定時不限時
+    :param strict: 分析有階段失敗時引發例外，見 process_scraped_reviews
+    """
+    if FAKE_SERVICES:
+        return scrape_fixture_reviews(keyword, "reviews", deadline, strict)
+    return scrape_google_reviews(
+        keyword,
+        "scraper/chromedriver-win32/chromedriver-win64/chromedriver.exe",  # NOTE 確保 chromedriver 路徑正確
+        "reviews",
+        deadline=deadline,
+        strict=strict,
+    )
+
+
+def mark_prefetch_queued(keyword):
+    scraping_status[keyword] = {
+        "status": "queued",
+        "message": "預先分析排隊中",
+        "total_reviews": 0,
+        "processed_reviews": 0,
+        "prefetch": True,
+    }
+
+
+def unmark_prefetch_queued(keyword):
+    """預先分析的工作因佇列已滿沒有送出時，移除 mark_prefetch_queued 建立的狀態，前端才不會一直輪詢"""
+    status = scraping_status.get(keyword)
+    # 使用者在這之間點擊時 enqueue_scrape 已重設狀態，不能移除
+    if status and status.get("prefetch") and status.get("status") == "queued":
+        del scraping_status[keyword]
+
+
+# 按需剖析爬蟲 / 分析工作，沒有設定時不影響一般流程
+profiler = JobProfiler(PROFILE_DIR)
+# 爬蟲 / 分析工作佇列，使用者點擊的工作優先於預先分析。
+# 工作線程由各入口在 init_qa_client() 之後以 job_queue.start() 啟動，
+# 避免模型載入期間就領取（分散式模式下為共用佇列中既有的）工作
+if JOB_STORE_PATH:
+    job_queue = DurableJobQueue(
+        job_store,
+        run_scrape_job,
+        num_workers=SCRAPE_WORKERS,
+        capacity=SCRAPE_QUEUE_CAPACITY,
+        lease_seconds=JOB_LEASE_SECONDS,
+    )
+else:
+    job_queue = JobQueue(num_workers=SCRAPE_WORKERS, capacity=SCRAPE_QUEUE_CAPACITY)
+prefetcher = Prefetcher(
+    job_queue,
+    should_scrape,
+    run_scrape_job,
+    top_n=PREFETCH_TOP_N,
+    budget=PREFETCH_BUDGET,
+    budget_window=PREFETCH_BUDGET_WINDOW,
+    on_submit=mark_prefetch_queued,
+    on_reject=unmark_prefetch_queued,
+).start()
+
+
+def enqueue_scrape(keyword, needed):
+    """
+    依 should_scrape 的結果排入爬取與分析工作，Flask 與 ASGI 模式共用。
+    :param needed: should_scrape(keyword) 的結果
+    :return: 回應內容 dict
+    """
+    prefetch_outcome = prefetcher.record_click(keyword, fresh=not needed)
+    logging.info(f"預先分析結果 {keyword}: {prefetch_outcome}")
+    if not needed:
+        # 如果沒有狀態，則會無法觸發前端抓取資訊
+        scraping_status[keyword] = {
+            "status": "completed",
+            "message": "未達到爬取頻率",
+            "total_reviews": 0,
+            "processed_reviews": 0,
+        }
+        logging.info(f"不需要爬取 {keyword}，因為未達到爬取頻率")
+        return {"message": "Scraping not needed at this time", "status": "not_required"}
 
-        # 初始化狀態
+    job = job_queue.get(keyword)
+    if job is None or job.status not in ("queued", "running"):
+        # 初始化狀態；已有預先分析或其他使用者的工作時沿用其狀態
         scraping_status[keyword] = {
             "status": "initializing",
             "message": "初始化中",
             "total_reviews": 0,
             "processed_reviews": 0,
         }
+        logging.info(f"Queueing scrape job for keyword: {keyword}")
+    if keyword in scraping_status and "requested_at" not in scraping_status[keyword]:
+        # 時間預算從第一位使用者點擊時開始計算（預先分析排隊的時間不算）
+        scraping_status[keyword]["requested_at"] = time.time()
+    # 已排隊的工作會提高優先順序
+    job = job_queue.submit(keyword, run_scrape_job, (keyword,), priority=HIGH_PRIORITY)
+    return {"message": "Scraping started", "status": "processing", "job_id": job.job_id}
 
-        logging.info(f"Starting scrape thread for keyword: {keyword}")
-        # 開始爬蟲線程
-        thread = threading.Thread(
-            target=scrape_google_reviews,
-            args=(
-                keyword,
-                "scraper/chromedriver-win32/chromedriver-win64/chromedriver.exe",  # NOTE 確保 chromedriver 路徑正確
-                "reviews",
-            ),
-        )
-        active_threads[keyword] = thread
-        thread.start()
 
-        return jsonify({"message": "Scraping started", "status": "processing"})
+@app.route("/api/scrape-reviews", methods=["POST"])
+def start_scrape():
+    try:
+        data = request.json
+        keyword = data.get("keyword")
+
+        if not keyword:
+            logging.warning("No keyword provided in request")
+            return jsonify({"error": "No keyword provided"}), 400
+
+        if data.get("profile"):
+            if not profiling_authorized(request.headers):
+                return jsonify({"error": "Profiling not allowed"}), 403
+            profile_request, error = parse_profile_request(data["profile"])
+            if error:
+                return jsonify({"error": error}), 400
+            # 在排入工作前設定，cProfile 才能從工作一開始就啟用
+            profiler.arm(keyword, profile_request)
+
+        # 判斷是否需要爬取
+        return jsonify(enqueue_scrape(keyword, should_scrape(keyword))), 200
 
     except Exception as e:
         logging.error(f"Error when starting scrape: {e}")
         return jsonify({"error": str(e)}), 500
 
-def calculate_distance(loc1, loc2):
+
+@app.route("/api/prefetch/stats", methods=["GET"])
+def get_prefetch_stats():
+    """預先分析的命中率與工作佇列狀態"""
+    return jsonify(
+        {"prefetch": prefetcher.stats(), "queue": job_queue.stats(), "browser": scrape_governor.stats()}
+    )
+
+
+def profiling_authorized(headers):
+    """PROFILING_TOKEN 有設定且 X-Profiling-Token 標頭相符"""
+    return bool(PROFILING_TOKEN) and hmac.compare_digest(
+        headers.get("X-Profiling-Token", ""), PROFILING_TOKEN
+    )
+
+
+def parse_profile_request(options):
     """
-    使用 Haversine 公式計算兩點之間的距離（米）
+    解析剖析設定，Flask 與 ASGI 模式共用。
+    :param options: true 或 {"mode": "cprofile" | "sample", "torch": bool, "interval_ms": 數字}
+    :return: (ProfileRequest, None) 或 (None, 錯誤訊息)
     """
-    R = 6371e3  # 地球半徑（米）
-    phi1 = radians(loc1['lat'])
-    phi2 = radians(loc2['lat'])
-    delta_phi = radians(loc2['lat'] - loc1['lat'])
-    delta_lambda = radians(loc2['lng'] - loc1['lng'])
+    if not isinstance(options, dict):
+        options = {}
+    mode = options.get("mode", "cprofile")
+    if mode not in PROFILE_MODES:
+        return None, f"mode must be one of {', '.join(PROFILE_MODES)}"
+    try:
+        interval_ms = float(options.get("interval_ms", DEFAULT_INTERVAL_MS))
+    except (TypeError, ValueError):
+        return None, "Invalid interval_ms"
+    if interval_ms <= 0:
+        return None, "Invalid interval_ms"
+    return ProfileRequest(mode=mode, torch=bool(options.get("torch")), interval_ms=interval_ms), None
 
-    a = sin(delta_phi / 2) ** 2 + cos(phi1) * cos(phi2) * sin(delta_lambda / 2) ** 2
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))
 
-    distance = R * c
-    return round(distance)
+def start_profiling(keyword, profile_request):
+    """
+    執行中的工作直接附加取樣剖析，否則設定在下一次工作開始時剖析。
+    :return: (回應內容 dict, HTTP 狀態碼)
+    """
+    job = job_queue.get(keyword)
+    if job is not None and job.status == "running":
+        if profile_request.mode != "sample":
+            return {"error": "Job already running; only sample mode can attach to it"}, 409
+        if job.thread_ident is None:
+            return {"error": "Job is running on another worker node"}, 409
+        session = profiler.attach(job.job_id, keyword, job.thread_ident, profile_request)
+        if session is None:
+            return {"error": "Job finished before profiling could attach"}, 409
+        return {"status": "attached", "job_id": session.job_id}, 200
+    profiler.arm(keyword, profile_request)
+    return {"status": "armed", "keyword": keyword}, 200
+
+
+@app.route("/api/admin/profile", methods=["POST"])
+def request_profile():
+    """為某間餐廳的工作開啟剖析，需 X-Profiling-Token"""
+    if not profiling_authorized(request.headers):
+        return jsonify({"error": "Profiling not allowed"}), 403
+    data = request.json or {}
+    keyword = data.get("keyword")
+    if not keyword:
+        return jsonify({"error": "No keyword provided"}), 400
+    profile_request, error = parse_profile_request(data)
+    if error:
+        return jsonify({"error": error}), 400
+    body, status = start_profiling(keyword, profile_request)
+    return jsonify(body), status
+
+
+@app.route("/api/admin/profiles", methods=["GET"])
+def list_profiles():
+    if not profiling_authorized(request.headers):
+        return jsonify({"error": "Profiling not allowed"}), 403
+    return jsonify({"armed": profiler.armed(), "sessions": profiler.sessions()})
+
+
+@app.route("/api/admin/profiles/<job_id>/<name>", methods=["GET"])
+def download_profile(job_id, name):
+    if not profiling_authorized(request.headers):
+        return jsonify({"error": "Profiling not allowed"}), 403
+    path = profiler.artifact_path(job_id, name)
+    if path is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return send_file(path, as_attachment=True, download_name=f"{job_id}-{name}")
+
+
+# /api/reviews/<keyword> 可回傳的評論欄位；關鍵字、抓取時間等內部欄位在查詢時就不讀取
+REVIEW_FIELDS = ("評論編號", "用戶", "評分", "評論", "評論時間")
+MAX_REVIEWS_LIMIT = 1000
+
+
+def parse_reviews_args(args):
+    """
+    解析 /api/reviews/<keyword> 的查詢參數，Flask 與 ASGI 模式共用。
+    limit: 每頁筆數；after: 上一頁回傳的 next；fields: 以逗號分隔的欄位；format: json 或 ndjson
+    :return: (參數 dict, None) 或 (None, 錯誤訊息)
+    """
+    response_format = args.get("format", "json")
+    if response_format not in ("json", "ndjson"):
+        return None, "format must be json or ndjson"
+    try:
+        limit = int(args.get("limit")) if args.get("limit") else None
+    except ValueError:
+        return None, "Invalid limit"
+    if limit is not None and not 1 <= limit <= MAX_REVIEWS_LIMIT:
+        return None, f"limit must be between 1 and {MAX_REVIEWS_LIMIT}"
+    fields = list(REVIEW_FIELDS)
+    if args.get("fields"):
+        fields = [field.strip() for field in args.get("fields").split(",") if field.strip()]
+        unknown = [field for field in fields if field not in REVIEW_FIELDS]
+        if unknown or not fields:
+            return None, f"fields must be chosen from {', '.join(REVIEW_FIELDS)}"
+    return {
+        "limit": limit,
+        "after": args.get("after") or None,
+        "fields": fields,
+        "format": response_format,
+    }, None
+
+
+def reviews_query(collection, keyword, params):
+    """
+    建立評論查詢，同步與非同步的 Firestore 客戶端共用：只讀取要回傳的欄位；
+    分頁時依文件 ID 排序，並多取一筆判斷是否還有下一頁。
+    """
+    query = collection.where("`關鍵字`", "==", keyword).select(
+        [f"`{field}`" for field in params["fields"]]
+    )
+    if params["limit"] or params["after"]:
+        query = query.order_by("__name__")
+    if params["after"]:
+        query = query.start_after({"__name__": params["after"]})
+    if params["limit"]:
+        query = query.limit(params["limit"] + 1)
+    return query
+
+
+class ReviewsWriter:
+    """
+    將 Firestore 文件逐筆序列化成回應片段，不需要先把所有評論放進記憶體。
+    json：未分頁時為陣列，有 limit 時為 {"reviews": [...], "next": 下一頁的 after 或 null}；
+    ndjson：每行一則評論，有 limit 時最後一行為 {"next": ...}。
+    """
+
+    def __init__(self, params):
+        self.format = params["format"]
+        self.limit = params["limit"]
+        self.count = 0
+        self.next_cursor = None
+        self._last_id = None
+
+    @property
+    def media_type(self):
+        return "application/x-ndjson" if self.format == "ndjson" else "application/json"
+
+    def start(self):
+        if self.format == "ndjson":
+            return ""
+        return '{"reviews": [' if self.limit else "["
+
+    def add(self, doc):
+        """回傳這則評論的片段；遇到超過 limit 的那一筆時記下 next 並回傳 None"""
+        if self.limit and self.count >= self.limit:
+            self.next_cursor = self._last_id
+            return None
+        row = json.dumps(doc.to_dict(), ensure_ascii=False, default=str)
+        separator = "," if self.count and self.format == "json" else ""
+        self.count += 1
+        self._last_id = doc.id
+        return row + "\n" if self.format == "ndjson" else separator + row
+
+    def end(self):
+        if self.format == "ndjson":
+            return json.dumps({"next": self.next_cursor}) + "\n" if self.limit else ""
+        if self.limit:
+            return '], "next": ' + json.dumps(self.next_cursor, ensure_ascii=False) + "}"
+        return "]"
+
 
 @app.route("/api/reviews/<keyword>", methods=["GET"])
 def get_reviews(keyword):
+    params, error = parse_reviews_args(request.args)
+    if error:
+        return jsonify({"error": error}), 400
     try:
-        reviews_ref = db.collection("reviews")
-        print("keyword: " + keyword)
-        query = reviews_ref.where("`關鍵字`", "==", keyword).stream()
-
-        reviews = []
-        for doc in query:
-            review = doc.to_dict()
-            # 移除 Firestore 內部的字段
-            review.pop("關鍵字", None)
-            review.pop("抓取時間", None)
-            reviews.append(review)
-
-        if reviews:
-            return jsonify(reviews)
-        return jsonify([]), 404
+        docs = reviews_query(db.collection("reviews"), keyword, params).stream()
+        # 先取第一筆：沒有任何評論時維持原本的 404
+        first = next(docs, None)
     except Exception as e:
         logging.error(f"Error getting reviews for {keyword}: {e}")
         return jsonify({"error": str(e)}), 500
+    if first is None and not params["after"]:
+        return jsonify([]), 404
+
+    writer = ReviewsWriter(params)
+
+    def generate():
+        yield writer.start()
+        try:
+            for doc in itertools.chain([first] if first else [], docs):
+                chunk = writer.add(doc)
+                if chunk is None:
+                    break
+                yield chunk
+        except Exception as e:
+            # 已開始回應，只能中斷輸出
+            logging.error(f"Error streaming reviews for {keyword}: {e}")
+            return
+        yield writer.end()
+
+    return Response(stream_with_context(generate()), mimetype=writer.media_type)
+
+
+def analysis_response(data):
+    """分析結果加上評分統計（rating_stats），結果頁只需讀這一份文件"""
+    analysis = dict(data.get("分析結果", {}))
+    stats = public_stats(data.get("評分統計"))
+    if stats is not None:
+        analysis["rating_stats"] = stats
+    return analysis
 
 
 @app.route("/api/reviews/<keyword>_analysis", methods=["GET"])
@@ -750,81 +1551,245 @@ def get_analysis(keyword):
         doc_ref = db.collection("reviews").document(keyword)
         doc = doc_ref.get()
         if doc.exists:
-            analysis = doc.to_dict().get("分析結果", {})
-            return jsonify(analysis)
+            return jsonify(analysis_response(doc.to_dict()))
         return jsonify({"error": "Analysis not found"}), 404
     except Exception as e:
         logging.error(f"Error getting analysis for {keyword}: {e}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/nearby-restaurants', methods=['GET'])
-def get_nearby_restaurants():
-    lat = request.args.get('lat')
-    lng = request.args.get('lng')
-    radius = request.args.get('radius', 1500)
+# 所有對外 HTTP 請求共用的連線池
+http_client = HttpClient(
+    pool_maxsize=HTTP_POOL_MAXSIZE,
+    retries=HTTP_RETRIES,
+    timeout=(3.05, HTTP_TIMEOUT),
+)
+places_client = PlacesClient(http_client, GOOGLE_MAPS_API_KEY, base_url=PLACES_API_BASE_URL)
+
+
+def fetch_places_nearby(lat, lng, radius, on_page=None):
+    """
+    呼叫 Google Places Nearby Search。
+    :return: (第一頁 results, Future)，後續分頁在背景取得並交給 on_page
+    """
+    return places_client.nearby_search(lat, lng, radius, on_page=on_page)
+
+
+def format_place(place, distance):
+    return {
+        'id': place['place_id'],
+        'name': place['name'],
+        'address': place.get('vicinity', ''),
+        'lat': place['geometry']['location']['lat'],
+        'lng': place['geometry']['location']['lng'],
+        'distance': round(distance)
+    }
 
-    if not lat or not lng:
-        return jsonify({'error': 'Missing latitude or longitude'}), 400
 
+def stream_nearby(lat, lng, radius, k, nearby, updates, pending):
+    """以 NDJSON 逐筆輸出：先輸出已取得的結果，再輸出背景分頁陸續取得的地點"""
+    sent = set()
+    for place, distance in nearby:
+        sent.add(place['place_id'])
+        yield json.dumps(format_place(place, distance), ensure_ascii=False) + "\n"
+
+    while not (k and len(sent) >= k):
+        try:
+            page = updates.get(timeout=0.2)
+        except queue.Empty:
+            if all(future.done() for future in pending) and updates.empty():
+                return
+            continue
+        for row in page_rows(lat, lng, radius, k, page, sent):
+            yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+def page_rows(lat, lng, radius, k, page, sent):
+    """後續分頁中在半徑內且尚未輸出的地點，依距離排序，最多輸出到 k 筆"""
+    for place, distance in sort_by_distance(lat, lng, page):
+        if k and len(sent) >= k:
+            return
+        if distance > radius or place['place_id'] in sent:
+            continue
+        sent.add(place['place_id'])
+        yield format_place(place, distance)
+
+
+# 所有從 Places API 取得過的餐廳，用於離線的半徑與 k 近鄰查詢
+restaurant_index = RestaurantIndex()
+nearby_cache = NearbySearchCache(
+    fetch_places_nearby,
+    max_tiles=NEARBY_CACHE_MAX_TILES,
+    ttl_seconds=NEARBY_CACHE_TTL,
+    on_fetch=restaurant_index.add,
+)
+
+
+def job_queue_depth():
+    stats = job_queue.stats()
+    return {("queued",): stats["queued"], ("running",): stats["running"]}
+
+
+def prefetch_clicks():
+    stats = prefetcher.stats()
+    return {(outcome,): stats[counter] for outcome, counter in CLICK_COUNTERS.items()}
+
+
+metrics.gauge("what2eat_job_queue_jobs", "工作佇列中的工作數", ["state"], function=job_queue_depth)
+metrics.callback_counter(
+    "what2eat_nearby_cache_lookups_total",
+    "附近餐廳圖塊快取查詢數",
+    lambda: {("hit",): nearby_cache.tiles.hits, ("miss",): nearby_cache.tiles.misses},
+    ["result"],
+)
+metrics.gauge(
+    "what2eat_nearby_cache_tiles",
+    "快取中的圖塊數",
+    function=lambda: nearby_cache.tiles.stats()["tiles"],
+)
+metrics.gauge(
+    "what2eat_restaurant_index_size", "本機餐廳索引中的地點數", function=lambda: len(restaurant_index)
+)
+metrics.gauge(
+    "what2eat_scrape_browser_limit", "速率控制器目前允許同時開啟的瀏覽器數", function=lambda: scrape_governor.limit
+)
+metrics.gauge(
+    "what2eat_scrape_browser_sessions",
+    "開啟中與等待名額的瀏覽器工作數",
+    ["state"],
+    function=lambda: {
+        (state,): scrape_governor.stats()[state] for state in ("running", "waiting")
+    },
+)
+metrics.callback_counter(
+    "what2eat_scrape_browser_sessions_total",
+    "瀏覽器工作結果（slow 為頁面就緒超過 SCRAPE_PAGE_READY_TARGET）",
+    lambda: {(outcome,): count for outcome, count in scrape_governor.outcome_counts().items()},
+    ["outcome"],
+)
+metrics.callback_counter(
+    "what2eat_prefetch_clicks_total", "使用者點擊時的預先分析結果", prefetch_clicks, ["outcome"]
+)
+
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+def parse_nearby_args(args):
+    """
+    解析 /api/nearby-restaurants 的查詢參數，Flask 與 ASGI 模式共用。
+    :return: (參數 dict, None) 或 (None, 錯誤訊息)
+    """
+    lat = args.get('lat')
+    lng = args.get('lng')
+    radius = args.get('radius', 1500)
+    # k: 只回傳最近的 k 間；offline=1: 只用本機索引回答，不呼叫 Places API
+    k = args.get('k')
+    if not lat or not lng:
+        return None, 'Missing latitude or longitude'
     try:
-        lat = float(lat)
-        lng = float(lng)
-        radius = int(radius)
+        params = {
+            'lat': float(lat),
+            'lng': float(lng),
+            'radius': int(radius),
+            'k': int(k) if k else None,
+            'offline': args.get('offline') == '1',
+            # stream=1: 以 NDJSON 串流回傳，包含背景取得的後續分頁
+            'stream': args.get('stream') == '1',
+            # prefetch=1 / 0: 是否在背景預先分析最近的幾間餐廳，未指定時依 PREFETCH 設定
+            'prefetch': args.get('prefetch', '1' if PREFETCH else '0') == '1',
+        }
     except ValueError:
-        return jsonify({'error': 'Invalid latitude, longitude, or radius format'}), 400
+        return None, 'Invalid latitude, longitude, or radius format'
+    if params['radius'] <= 0:
+        return None, 'radius must be positive'
+    # Places API 的半徑上限
+    params['radius'] = min(params['radius'], PLACES_MAX_RADIUS)
+    return params, None
 
-    url = (
-        f'https://maps.googleapis.com/maps/api/place/nearbysearch/json'
-        f'?location={lat},{lng}&radius={radius}&type=restaurant&key={GOOGLE_MAPS_API_KEY}'
-    )
+
+def nearby_from_index(lat, lng, radius, k):
+    """只用本機餐廳索引回答（offline=1）"""
+    if k:
+        return restaurant_index.nearest(lat, lng, k, max_radius=radius)
+    return restaurant_index.radius_query(lat, lng, radius)
+
+
+@app.route('/api/nearby-restaurants', methods=['GET'])
+def get_nearby_restaurants():
+    params, error = parse_nearby_args(request.args)
+    if error:
+        return jsonify({'error': error}), 400
+    lat, lng, radius, k = params['lat'], params['lng'], params['radius'], params['k']
+    stream = params['stream']
 
     try:
-        response = requests.get(url)
-        data = response.json()
-
-        if data.get('status') != 'OK':
-            raise Exception(f"Google Places API error: {data.get('status')}")
-
-        results = []
-        for place in data.get('results', []):
-            place_lat = place['geometry']['location']['lat']
-            place_lng = place['geometry']['location']['lng']
-            distance = calculate_distance(
-                {'lat': lat, 'lng': lng},
-                {'lat': place_lat, 'lng': place_lng}
+        updates = queue.Queue()
+        pending = []
+        if params['offline']:
+            nearby = nearby_from_index(lat, lng, radius, k)
+        else:
+            if NEARBY_CACHE:
+                places, pending = nearby_cache.search(
+                    lat, lng, radius, on_more=updates.put if stream else None
+                )
+            else:
+                # 後續分頁在背景取得，加入索引並在串流模式下輸出
+                def on_page(page):
+                    restaurant_index.add(page)
+                    if stream:
+                        updates.put(page)
+
+                places, done = fetch_places_nearby(lat, lng, radius, on_page=on_page)
+                pending = [done]
+                restaurant_index.add(places)
+            nearby = sort_by_distance(lat, lng, places)[:k]
+
+        if params['prefetch']:
+            prefetcher.offer([place['name'] for place, _ in nearby])
+
+        if stream:
+            return Response(
+                stream_with_context(
+                    stream_nearby(lat, lng, radius, k, nearby, updates, pending)
+                ),
+                mimetype='application/x-ndjson',
             )
-            results.append({
-                'id': place['place_id'],
-                'name': place['name'],
-                'address': place.get('vicinity', ''),
-                'lat': place_lat,
-                'lng': place_lng,
-                'distance': distance
-            })
-
-        return jsonify(results)
+        return jsonify([format_place(place, distance) for place, distance in nearby])
     except Exception as error:
         print(error)
         return jsonify({'error': 'Failed to fetch restaurants'}), 500
 
-if __name__ == "__main__":
-    # 設定QA模型路徑（請確認模型文件在此路徑下）
-    model_path = r"scraper/lora_qa_model_new/lora_qa_model_new"
-
-    # 使用PEFT從LoRA模型中取config
-    logging.info("Loading PEFT config...")
-    peft_config = PeftConfig.from_pretrained(model_path)
-
-    logging.info("Loading base model and tokenizer...")
-    base_tokenizer = AutoTokenizer.from_pretrained(peft_config.base_model_name_or_path)
-    base_model = AutoModelForQuestionAnswering.from_pretrained(
-        peft_config.base_model_name_or_path
-    )
+def init_qa_client(backend=QA_BACKEND, num_workers=QA_WORKERS):
+    """建立 QA 推論客戶端：num_workers > 0 時啟動多進程 worker pool"""
+    global qa_client
+    if FAKE_SERVICES and backend == "fake":
+        from fakes import FakeQAClient
+
+        qa_client = FakeQAClient(latency_ms_per_review=float(os.getenv('FAKE_QA_LATENCY_MS', '0')))
+        return qa_client
+    if backend not in QA_BACKENDS:
+        raise ValueError(f"QA_BACKEND 必須是 {', '.join(QA_BACKENDS)} 其中之一")
+    engine_options = {
+        "max_seq_len": QA_MAX_SEQ_LEN,
+        "doc_stride": QA_DOC_STRIDE,
+        "max_windows": QA_MAX_WINDOWS,
+    }
+    logging.info(f"Using QA backend: {backend}, {engine_options}")
+    if num_workers > 0:
+        logging.info(f"Starting {num_workers} QA workers...")
+        qa_client = QAWorkerPool(
+            num_workers, backend=backend, engine_options=engine_options
+        ).start()
+    else:
+        qa_client = LocalQAClient(load_qa_backend(backend, **engine_options))
+    return qa_client
 
-    logging.info("Loading LoRA weights...")
-    model = PeftModel.from_pretrained(base_model, model_path)
-    tokenizer = base_tokenizer
 
-    logging.info("Initializing QA pipeline...")
-    qa_pipeline = pipeline("question-answering", model=model, tokenizer=tokenizer)
-    app.run(debug=True, port=5000)
\ No newline at end of file
+if __name__ == "__main__":
+    init_qa_client()
+    job_queue.start()
+    # debug 模式的 reloader 會再啟動一個子進程，避免重複建立 QA worker，
+    # 分散式模式下也避免父進程的工作線程領取工作
+    app.run(debug=True, port=5000, use_reloader=QA_WORKERS == 0 and not JOB_STORE_PATH)
@@ -0,0 +1,333 @@
+"""
+後端的 ASGI 非同步服務模式。
+
+提供與 app.py 相同的 API，但所有請求在單一進程的事件迴圈上處理：Firestore 讀取改用
+AsyncClient、Places API 改用 httpx.AsyncClient，狀態輪詢與評論讀取不再各自佔用一個
+worker 線程。爬蟲與 QA 分析仍由 app.py 的工作佇列在背景線程執行，狀態也共用。
+分散式模式下工作佇列與爬取狀態存在 SQLite（會阻塞），這些呼叫以 run_in_threadpool 執行。
+
+用法（於專案根目錄）:
+    uvicorn asgi_app:app --app-dir scraper --port 5000
+"""
+import asyncio
+import json
+import logging
+import time
+from contextlib import asynccontextmanager
+
+import httpx
+from google.cloud import firestore
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.routing import Match, Route
+
+import app as backend
+import metrics
+from places_api import AsyncPlacesClient
+from spatial_index import sort_by_distance
+
+# 非同步 Firestore 客戶端，與 app.py 使用相同的專案與憑證
+if backend.FAKE_SERVICES:
+    from fakes import AsyncFakeFirestore
+
+    adb = AsyncFakeFirestore(backend.db)
+else:
+    adb = firestore.AsyncClient(
+        project=backend.PROJECT_ID, credentials=backend.credentials, database="dm-firestore"
+    )
+# 由 lifespan 建立，需在事件迴圈內使用
+places_client = None
+
+
+async def should_scrape_async(keyword, frequency_days=7):
+    doc = await adb.collection("reviews").document(keyword).get()
+    return backend.is_stale(doc, frequency_days)
+
+
+async def get_status(request):
+    keyword = request.path_params["keyword"]
+    status = await run_in_threadpool(backend.scraping_status.get, keyword)
+    if status is None:
+        return JSONResponse(
+            {"status": "not_found", "message": "No scraping job found"}, status_code=404
+        )
+    try:
+        doc = await adb.collection("reviews").document(keyword).get()
+        if doc.exists and status.get("status") != "completed":
+            await run_in_threadpool(status.__setitem__, "status", "completed")
+    except Exception as e:
+        logging.error(f"Error getting analysis for {keyword}: {e}")
+    return JSONResponse(status)
+
+
+async def start_scrape(request):
+    try:
+        data = await request.json()
+        keyword = data.get("keyword")
+        if not keyword:
+            logging.warning("No keyword provided in request")
+            return JSONResponse({"error": "No keyword provided"}, status_code=400)
+        if data.get("profile"):
+            if not backend.profiling_authorized(request.headers):
+                return JSONResponse({"error": "Profiling not allowed"}, status_code=403)
+            profile_request, error = backend.parse_profile_request(data["profile"])
+            if error:
+                return JSONResponse({"error": error}, status_code=400)
+            backend.profiler.arm(keyword, profile_request)
+        needed = await should_scrape_async(keyword)
+        return JSONResponse(await run_in_threadpool(backend.enqueue_scrape, keyword, needed))
+    except Exception as e:
+        logging.error(f"Error when starting scrape: {e}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+async def get_reviews(request):
+    keyword = request.path_params["keyword"]
+    params, error = backend.parse_reviews_args(request.query_params)
+    if error:
+        return JSONResponse({"error": error}, status_code=400)
+    try:
+        docs = backend.reviews_query(adb.collection("reviews"), keyword, params).stream()
+        first = await anext(docs, None)
+    except Exception as e:
+        logging.error(f"Error getting reviews for {keyword}: {e}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+    if first is None and not params["after"]:
+        return JSONResponse([], status_code=404)
+
+    writer = backend.ReviewsWriter(params)
+
+    async def generate():
+        yield writer.start()
+        try:
+            if first is not None:
+                yield writer.add(first)
+            async for doc in docs:
+                chunk = writer.add(doc)
+                if chunk is None:
+                    break
+                yield chunk
+        except Exception as e:
+            logging.error(f"Error streaming reviews for {keyword}: {e}")
+            return
+        yield writer.end()
+
+    return StreamingResponse(generate(), media_type=writer.media_type)
+
+
+async def get_analysis(request):
+    keyword = request.path_params["keyword"]
+    try:
+        doc = await adb.collection("reviews").document(keyword).get()
+        if doc.exists:
+            return JSONResponse(backend.analysis_response(doc.to_dict()))
+        return JSONResponse({"error": "Analysis not found"}, status_code=404)
+    except Exception as e:
+        logging.error(f"Error getting analysis for {keyword}: {e}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+async def stream_nearby(lat, lng, radius, k, nearby, updates, pending):
+    """與 app.stream_nearby 相同的 NDJSON 輸出，等待背景分頁時不阻塞事件迴圈"""
+    sent = set()
+    for place, distance in nearby:
+        sent.add(place["place_id"])
+        yield json.dumps(backend.format_place(place, distance), ensure_ascii=False) + "\n"
+
+    while not (k and len(sent) >= k):
+        try:
+            page = await asyncio.wait_for(updates.get(), timeout=0.2)
+        except asyncio.TimeoutError:
+            if all(task.done() for task in pending) and updates.empty():
+                return
+            continue
+        for row in backend.page_rows(lat, lng, radius, k, page, sent):
+            yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+async def get_nearby_restaurants(request):
+    params, error = backend.parse_nearby_args(request.query_params)
+    if error:
+        return JSONResponse({"error": error}, status_code=400)
+    lat, lng, radius, k = params["lat"], params["lng"], params["radius"], params["k"]
+    stream = params["stream"]
+
+    try:
+        updates = asyncio.Queue()
+        pending = []
+        if params["offline"]:
+            nearby = backend.nearby_from_index(lat, lng, radius, k)
+        else:
+            if backend.NEARBY_CACHE:
+                places, pending = await backend.nearby_cache.search_async(
+                    lat,
+                    lng,
+                    radius,
+                    places_client.nearby_search,
+                    on_more=updates.put_nowait if stream else None,
+                )
+            else:
+                def on_page(page):
+                    backend.restaurant_index.add(page)
+                    if stream:
+                        updates.put_nowait(page)
+
+                places, done = await places_client.nearby_search(
+                    lat, lng, radius, on_page=on_page
+                )
+                pending = [done]
+                backend.restaurant_index.add(places)
+            nearby = sort_by_distance(lat, lng, places)[:k]
+
+        if params["prefetch"]:
+            backend.prefetcher.offer([place["name"] for place, _ in nearby])
+
+        if stream:
+            return StreamingResponse(
+                stream_nearby(lat, lng, radius, k, nearby, updates, pending),
+                media_type="application/x-ndjson",
+            )
+        return JSONResponse(
+            [backend.format_place(place, distance) for place, distance in nearby]
+        )
+    except Exception as e:
+        logging.error(f"Error fetching nearby restaurants: {e}")
+        return JSONResponse({"error": "Failed to fetch restaurants"}, status_code=500)
+
+
+async def get_metrics(request):
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+def route_template(scope):
+    """
+    請求對應的路由樣板，例如 /api/reviews/{keyword}/status。
+    starlette 0.41 不會在 scope 設定 route，這裡依 routes 的順序自行比對；
+    路徑相符但方法不符（405）時也使用該路由。
+    """
+    partial = None
+    for route in routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path
+    return partial or "unmatched"
+
+
+class MetricsMiddleware:
+    """以路由樣板為標籤記錄 HTTP 請求數與耗時，與 Flask 模式共用同一組指標"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not metrics.is_enabled():
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            endpoint = route_template(scope)
+            backend.HTTP_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+            backend.HTTP_REQUESTS.inc(
+                endpoint=endpoint, method=scope["method"], status=status["code"]
+            )
+
+
+async def get_prefetch_stats(request):
+    return JSONResponse(
+        {
+            "prefetch": backend.prefetcher.stats(),
+            "queue": await run_in_threadpool(backend.job_queue.stats),
+            "browser": backend.scrape_governor.stats(),
+        }
+    )
+
+
+async def request_profile(request):
+    if not backend.profiling_authorized(request.headers):
+        return JSONResponse({"error": "Profiling not allowed"}, status_code=403)
+    data = await request.json()
+    keyword = data.get("keyword")
+    if not keyword:
+        return JSONResponse({"error": "No keyword provided"}, status_code=400)
+    profile_request, error = backend.parse_profile_request(data)
+    if error:
+        return JSONResponse({"error": error}, status_code=400)
+    body, status = await run_in_threadpool(backend.start_profiling, keyword, profile_request)
+    return JSONResponse(body, status_code=status)
+
+
+async def list_profiles(request):
+    if not backend.profiling_authorized(request.headers):
+        return JSONResponse({"error": "Profiling not allowed"}, status_code=403)
+    return JSONResponse({"armed": backend.profiler.armed(), "sessions": backend.profiler.sessions()})
+
+
+async def download_profile(request):
+    if not backend.profiling_authorized(request.headers):
+        return JSONResponse({"error": "Profiling not allowed"}, status_code=403)
+    job_id, name = request.path_params["job_id"], request.path_params["name"]
+    path = backend.profiler.artifact_path(job_id, name)
+    if path is None:
+        return JSONResponse({"error": "Profile not found"}, status_code=404)
+    return FileResponse(path, filename=f"{job_id}-{name}")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global places_client
+    http = httpx.AsyncClient(
+        timeout=httpx.Timeout(backend.HTTP_TIMEOUT, connect=3.05),
+        limits=httpx.Limits(
+            max_connections=backend.HTTP_POOL_MAXSIZE,
+            max_keepalive_connections=backend.HTTP_POOL_MAXSIZE,
+        ),
+        transport=httpx.AsyncHTTPTransport(retries=backend.HTTP_RETRIES),
+    )
+    places_client = AsyncPlacesClient(
+        http, backend.GOOGLE_MAPS_API_KEY, base_url=backend.PLACES_API_BASE_URL
+    )
+    backend.init_qa_client()
+    backend.job_queue.start()
+    try:
+        yield
+    finally:
+        await http.aclose()
+        backend.qa_client.close()
+
+
+# /api/reviews/{keyword}_analysis 必須排在 /api/reviews/{keyword} 之前
+routes = [
+    Route("/api/reviews/{keyword}/status", get_status, methods=["GET"]),
+    Route("/api/reviews/{keyword}_analysis", get_analysis, methods=["GET"]),
+    Route("/api/reviews/{keyword}", get_reviews, methods=["GET"]),
+    Route("/api/scrape-reviews", start_scrape, methods=["POST"]),
+    Route("/api/nearby-restaurants", get_nearby_restaurants, methods=["GET"]),
+    Route("/api/prefetch/stats", get_prefetch_stats, methods=["GET"]),
+    Route("/api/admin/profile", request_profile, methods=["POST"]),
+    Route("/api/admin/profiles", list_profiles, methods=["GET"]),
+    Route("/api/admin/profiles/{job_id}/{name}", download_profile, methods=["GET"]),
+    Route("/metrics", get_metrics, methods=["GET"]),
+]
+
+app = Starlette(
+    routes=routes,
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"]),
+        Middleware(MetricsMiddleware),
+    ],
+    lifespan=lifespan,
+)
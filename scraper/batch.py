@@ -0,0 +1,292 @@
+"""
+大量餐廳的離線批次處理。
+
+兩種輸入：
+- 關鍵字檔（每行一間餐廳，# 開頭為註解）：逐一爬取評論、上傳 Firestore、QA 分析與 Gemini 總結，
+  與 POST /api/scrape-reviews 的工作相同；預設略過分析結果仍新鮮的餐廳（--force 強制重跑）
+- 評論 JSON 檔（scrape_google_reviews.py 輸出的 [{"用戶", "評分", "評論", "評論時間"}, ...]，
+  關鍵字取檔名；或 {"keyword": ..., "reviews": [...]}）：不開瀏覽器，直接匯入、分析與總結
+
+多個項目同時執行（--jobs），QA 推論使用多進程 worker pool（--qa-workers）用滿整台機器。
+每個項目的結果立即寫入 checkpoint（JSONL），中斷後以相同參數重新執行會略過已完成的項目；
+單一項目失敗（包含 QA 或 Gemini 任一階段失敗）只記錄錯誤，不影響其他項目。評論文檔 ID 由評論內容決定，
+重跑或重新匯入同一份評論不會產生重複的評論，也不會重複計入評分統計。結束時輸出吞吐量報告。
+
+用法（於專案根目錄）:
+    python scraper/batch.py --keywords taipei.txt --jobs 4
+    python scraper/batch.py --dumps dumps/ --qa-workers 8 --jobs 16
+    python scraper/batch.py --dumps dumps/ --retry-failed     # 重跑上次失敗的項目
+
+也可以在程式中使用：
+    items = load_keywords("taipei.txt")
+    report = run_batch(items, process_item, jobs=4, checkpoint_path="results/batch.jsonl")
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+
+@dataclass(frozen=True)
+class BatchItem:
+    """
+    :param kind: scrape（爬取關鍵字）或 ingest（匯入評論檔）
+    :param key: 餐廳名稱，也是 checkpoint 中的識別
+    :param source: ingest 時的評論檔路徑
+    """
+
+    kind: str
+    key: str
+    source: str | None = None
+
+    @property
+    def item_id(self):
+        return f"{self.kind}:{self.key}"
+
+
+def load_keywords(path):
+    items = []
+    seen = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            keyword = line.strip()
+            if keyword and not keyword.startswith("#") and keyword not in seen:
+                seen.add(keyword)
+                items.append(BatchItem("scrape", keyword))
+    return items
+
+
+def load_dumps(paths):
+    """收集評論檔；目錄會展開為其中所有 .json 檔"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(
+                os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith(".json")
+            )
+        else:
+            files.append(path)
+    items = []
+    for path in files:
+        keyword = os.path.splitext(os.path.basename(path))[0]
+        items.append(BatchItem("ingest", keyword, path))
+    return items
+
+
+def read_dump(item):
+    """讀取評論檔，回傳 (關鍵字, parse_reviews_html 格式的評論列表)"""
+    with open(item.source, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    keyword = item.key
+    if isinstance(data, dict):
+        keyword = data.get("keyword") or keyword
+        data = data.get("reviews", [])
+    reviews = [
+        {
+            "reviewer": review.get("用戶"),
+            "rating": review.get("評分"),
+            "comment": review.get("評論"),
+            "time": review.get("評論時間"),
+        }
+        for review in data
+    ]
+    return keyword, reviews
+
+
+class Checkpoint:
+    """每個項目完成時附加一行 JSON；重新執行時讀回各項目最後一次的結果"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.results = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 中斷時可能留下寫到一半的最後一行
+                        continue
+                    self.results[record["item"]] = record
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def record(self, record):
+        with self._lock:
+            self.results[record["item"]] = record
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+
+
+def run_batch(items, process, jobs=1, checkpoint_path=None, retry_failed=False, on_result=None):
+    """
+    以 jobs 個線程執行 process(item) -> 評論數（或 None 表示略過），單一項目的例外只記錄不中斷。
+    :param checkpoint_path: 可選，已完成（以及 retry_failed=False 時已失敗）的項目會被略過
+    :param on_result: 可選，每個項目完成時呼叫 on_result(結果 dict, 已完成數, 本次要處理的項目數)
+    :return: 報告 dict
+    """
+    checkpoint = Checkpoint(checkpoint_path) if checkpoint_path else None
+    pending = []
+    resumed = 0
+    previously_failed = 0
+    for item in items:
+        previous = checkpoint.results.get(item.item_id) if checkpoint else None
+        if previous is None or (previous["status"] == "error" and retry_failed):
+            pending.append(item)
+        elif previous["status"] == "error":
+            previously_failed += 1
+        else:
+            resumed += 1
+
+    results = []
+
+    def run_one(item):
+        start = time.perf_counter()
+        record = {"item": item.item_id, "key": item.key}
+        try:
+            reviews = process(item)
+            record["status"] = "skipped" if reviews is None else "done"
+            record["reviews"] = reviews or 0
+        except Exception as e:
+            logging.error(f"批次項目 {item.item_id} 失敗: {e}")
+            record["status"] = "error"
+            record["error"] = str(e) or type(e).__name__
+        record["seconds"] = time.perf_counter() - start
+        record["finished_at"] = datetime.now(timezone.utc).isoformat()
+        return record
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, jobs), thread_name_prefix="batch") as executor:
+        futures = [executor.submit(run_one, item) for item in pending]
+        for future in as_completed(futures):
+            record = future.result()
+            if checkpoint:
+                checkpoint.record(record)
+            results.append(record)
+            if on_result:
+                on_result(record, len(results), len(pending))
+    elapsed = time.perf_counter() - started
+
+    done = [r for r in results if r["status"] == "done"]
+    seconds = sorted(r["seconds"] for r in done)
+    reviews = sum(r["reviews"] for r in done)
+    return {
+        "items": len(items),
+        "resumed": resumed,
+        "previously_failed": previously_failed,
+        "processed": len(results),
+        "done": len(done),
+        "skipped": sum(r["status"] == "skipped" for r in results),
+        "failed": [{"item": r["item"], "error": r["error"]} for r in results if r["status"] == "error"],
+        "elapsed_s": elapsed,
+        "items_per_hour": len(done) / elapsed * 3600 if elapsed else 0.0,
+        "reviews": reviews,
+        "reviews_per_s": reviews / elapsed if elapsed else 0.0,
+        "item_p50_s": statistics.median(seconds) if seconds else None,
+        "item_p95_s": seconds[min(len(seconds) - 1, int(len(seconds) * 0.95))] if seconds else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk offline scrape / ingest and analysis")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--keywords", help="每行一間餐廳的關鍵字檔，逐一爬取並分析")
+    source.add_argument("--dumps", nargs="+", help="評論 JSON 檔或目錄，直接匯入並分析")
+    parser.add_argument("--jobs", type=int, help="同時處理的項目數，預設爬取 2、匯入為 QA worker 數的 2 倍")
+    parser.add_argument(
+        "--qa-workers", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="QA 推論 worker 進程數"
+    )
+    parser.add_argument("--qa-backend", default=os.getenv("QA_BACKEND", "torch"))
+    parser.add_argument("--checkpoint", help="checkpoint 檔，預設 results/batch_<輸入名稱>.jsonl")
+    parser.add_argument("--retry-failed", action="store_true", help="重跑 checkpoint 中失敗的項目")
+    parser.add_argument("--force", action="store_true", help="爬取模式下不略過分析結果仍新鮮的餐廳")
+    parser.add_argument("--report", help="報告 JSON 輸出路徑，預設與 checkpoint 同名的 .report.json")
+    args = parser.parse_args()
+
+    if args.keywords:
+        items = load_keywords(args.keywords)
+        name = os.path.splitext(os.path.basename(args.keywords))[0]
+        jobs = args.jobs or 2
+    else:
+        items = load_dumps(args.dumps)
+        name = os.path.basename(os.path.normpath(args.dumps[0]))
+        name = os.path.splitext(name)[0]
+        jobs = args.jobs or max(2, args.qa_workers * 2)
+    checkpoint_path = args.checkpoint or os.path.join("results", f"batch_{name}.jsonl")
+    report_path = args.report or os.path.splitext(checkpoint_path)[0] + ".report.json"
+
+    # 必須在匯入 app 之前設定；批次模式不需要背景工作佇列與預先分析，
+    # 多個項目同時執行時中間結果檔會互相覆寫，也不寫出
+    os.environ["SCRAPE_WORKERS"] = "0"
+    os.environ["PREFETCH"] = "0"
+    os.environ["SAVE_INTERMEDIATE_RESULTS"] = "0"
+    os.environ.pop("JOB_STORE_PATH", None)
+    import app
+    import metrics
+
+    def process_item(item):
+        if item.kind == "scrape":
+            if not args.force and not app.should_scrape(item.key):
+                return None
+            return app.scrape_keyword(item.key, strict=True)
+        keyword, reviews = read_dump(item)
+        # strict：QA 或 Gemini 有任何失敗時項目記為失敗，可用 --retry-failed 重跑
+        return app.process_scraped_reviews(
+            keyword, reviews, "reviews", metrics.StageClock(app.STAGE_SECONDS), strict=True
+        )
+
+    def on_result(record, finished, total):
+        detail = record.get("error") or f"{record.get('reviews', 0)} 則評論"
+        print(
+            f"[{finished}/{total}] {record['key']}: {record['status']}，"
+            f"{record['seconds']:.1f} 秒，{detail}",
+            flush=True,
+        )
+
+    app.init_qa_client(backend=args.qa_backend, num_workers=args.qa_workers)
+    stages_before = app.STAGE_SECONDS.snapshot()
+    try:
+        report = run_batch(
+            items, process_item, jobs=jobs, checkpoint_path=checkpoint_path,
+            retry_failed=args.retry_failed, on_result=on_result,
+        )
+    finally:
+        app.qa_client.close()
+    stages_after = app.STAGE_SECONDS.snapshot()
+    # 各階段的累計耗時（多個項目同時執行，總和會超過實際經過時間）
+    report["stage_seconds"] = {
+        key[0]: count_sum[1] - stages_before.get(key, (0, 0.0))[1]
+        for key, count_sum in sorted(stages_after.items())
+    }
+    report["jobs"] = jobs
+    report["qa_workers"] = args.qa_workers
+    report["checkpoint"] = checkpoint_path
+
+    print(
+        f"共 {report['items']} 項，先前已完成 {report['resumed']}，本次完成 {report['done']}、"
+        f"略過 {report['skipped']}、失敗 {len(report['failed'])}"
+    )
+    if report["previously_failed"]:
+        print(f"另有 {report['previously_failed']} 項先前失敗，加上 --retry-failed 重跑")
+    print(
+        f"耗時 {report['elapsed_s']:.1f} 秒，{report['items_per_hour']:.0f} 間/小時，"
+        f"{report['reviews_per_s']:.1f} 則評論/秒"
+    )
+    if report["item_p50_s"] is not None:
+        print(f"每間餐廳 p50 {report['item_p50_s']:.1f} 秒，p95 {report['item_p95_s']:.1f} 秒")
+    for failure in report["failed"]:
+        print(f"  失敗 {failure['item']}: {failure['error']}")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"報告已寫入 {report_path}，checkpoint: {checkpoint_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+答案分群的效能與 prompt 縮減測試。
+
+以 results/first_result.json 的片段加上常見變化（語助詞、標點、前綴）產生
+大量近似重複的答案，量測分群耗時，並比較只做完全去重與分群後送進
+Gemini 篩選的 prompt token 數。
+
+用法（在專案根目錄執行）:
+    python scraper/bench_answer_clustering.py --sizes 1000 5000 20000
+"""
+import argparse
+import json
+import random
+import time
+
+from answer_clustering import cluster_phrases, estimate_tokens
+
+VARIATIONS = (
+    lambda p: p,
+    lambda p: p + "！",
+    lambda p: p + "喔",
+    lambda p: "真的" + p,
+    lambda p: "覺得" + p,
+    lambda p: p + "～～",
+    lambda p: " " + p + " ",
+)
+
+
+def synthetic_phrases(base, size, seed=0):
+    rng = random.Random(seed)
+    return [rng.choice(VARIATIONS)(rng.choice(base)) for _ in range(size)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer clustering benchmark")
+    parser.add_argument("--input", default="results/first_result.json")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    args = parser.parse_args()
+
+    with open(args.input, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    print(f"{'phrases':>8}{'unique':>8}{'clusters':>10}{'ms':>10}{'tokens before':>15}{'tokens after':>14}{'saved':>8}")
+    for size in args.sizes:
+        # 三類答案分別產生，模擬一家餐廳的所有抽取結果
+        lists = {
+            key: synthetic_phrases(values, size // len(data), seed=size)
+            for key, values in data.items()
+            if values
+        }
+
+        start = time.perf_counter()
+        clustered = {key: cluster_phrases(values) for key, values in lists.items()}
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        exact = [list(dict.fromkeys(values)) for values in lists.values()]
+        collapsed = [[c["text"] for c in value] for value in clustered.values()]
+        tokens_before = estimate_tokens(json.dumps(exact, ensure_ascii=False))
+        tokens_after = estimate_tokens(json.dumps(collapsed, ensure_ascii=False))
+
+        print(
+            f"{sum(len(v) for v in lists.values()):>8}"
+            f"{sum(len(v) for v in exact):>8}"
+            f"{sum(len(v) for v in collapsed):>10}"
+            f"{elapsed_ms:>10.1f}"
+            f"{tokens_before:>15}{tokens_after:>14}"
+            f"{1 - tokens_after / tokens_before:>8.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
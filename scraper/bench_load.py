@@ -0,0 +1,377 @@
+"""
+後端 HTTP API 的負載測試。
+
+在本機以替身服務啟動後端：Places API 使用 stub_places_server.py，Firestore、Gemini 與
+Selenium 爬蟲使用 fakes.py（WHAT2EAT_FAKE_SERVICES=1），QA 使用 FakeQAClient，各自的延遲
+都可設定。接著以 httpx 非同步客戶端模擬使用者，依設定的比例混合送出附近餐廳搜尋、
+開始爬取、輪詢狀態、讀取評論與分析結果，同時連線數逐段增加。
+
+每一段輸出各端點的吞吐量、延遲百分位數與錯誤率，以及工作佇列的排隊數；p95 超過
+--slo-p95-ms、錯誤率超過 --max-error-rate，或同時連線數增加但吞吐量幾乎沒有增加時，
+視為該端點在此連線數飽和。結果寫成 JSON。
+
+用法（於專案根目錄）:
+    python scraper/bench_load.py --server flask --concurrency 10,50,100,200 --stage-duration 20
+    python scraper/bench_load.py --server asgi --mix search=1,status=10,reviews=2 --scraper-latency-ms 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+import httpx
+
+from bench_serving import percentile
+
+SCRAPER_DIR = os.path.dirname(os.path.abspath(__file__))
+OPERATIONS = ("search", "scrape", "status", "reviews", "analysis")
+DEFAULT_MIX = "search=3,scrape=1,status=8,reviews=2,analysis=2"
+# 模擬使用者集中的搜尋地點（台北市區）
+HOTSPOTS = [(25.0330, 121.5654), (25.0478, 121.5170), (25.0418, 121.5436), (25.0260, 121.5430)]
+SEED_PREFIX = "負載測試種子餐廳"
+POOL_PREFIX = "負載測試餐廳"
+
+
+def parse_mix(text):
+    """'search=3,status=8' -> {"search": 3, "status": 8}"""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"未知的請求類型 {name}，可選: {', '.join(OPERATIONS)}")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Workload:
+    """
+    產生各類型的請求。
+    :param seeded: 測試開始前已完成分析的餐廳，讀取評論 / 分析結果時使用
+    :param pool_size: 開始爬取時從多少間餐廳中挑選，重複點擊的餐廳會得到 not_required 或併入既有工作
+    :param hotspot_ratio: 搜尋落在熱門地點附近（可命中附近餐廳快取）的比例
+    """
+
+    def __init__(self, mix, seeded, pool_size, hotspot_ratio, radius):
+        self.ops = [op for op, weight in mix.items() for _ in range(weight)]
+        self.seeded = seeded
+        self.pool_size = pool_size
+        self.hotspot_ratio = hotspot_ratio
+        self.radius = radius
+
+    def next_request(self, rng, user):
+        """回傳 (類型, method, path, JSON body)"""
+        op = rng.choice(self.ops)
+        if op == "search":
+            if rng.random() < self.hotspot_ratio:
+                lat, lng = rng.choice(HOTSPOTS)
+                lat, lng = lat + rng.uniform(-0.001, 0.001), lng + rng.uniform(-0.001, 0.001)
+            else:
+                lat, lng = 25.0 + rng.uniform(0, 0.1), 121.5 + rng.uniform(0, 0.1)
+            path = f"/api/nearby-restaurants?lat={lat:.6f}&lng={lng:.6f}&radius={self.radius}&k=20"
+            return op, "GET", path, None
+        if op == "scrape":
+            keyword = f"{POOL_PREFIX} {rng.randrange(self.pool_size)}"
+            # 之後的狀態輪詢追蹤這間餐廳
+            user["watching"] = keyword
+            return op, "POST", "/api/scrape-reviews", {"keyword": keyword}
+        if op == "status":
+            keyword = user.get("watching") or rng.choice(self.seeded)
+            return op, "GET", f"/api/reviews/{quote(keyword)}/status", None
+        keyword = rng.choice(self.seeded)
+        suffix = "_analysis" if op == "analysis" else ""
+        return op, "GET", f"/api/reviews/{quote(keyword)}{suffix}", None
+
+
+async def user_loop(http, workload, deadline, samples, errors, think_ms, rng):
+    user = {}
+    while time.perf_counter() < deadline:
+        op, method, path, body = workload.next_request(rng, user)
+        start = time.perf_counter()
+        try:
+            response = await http.request(method, path, json=body)
+            # 404 代表沒有資料（例如尚未開始爬取的餐廳），仍是正常回應
+            if response.status_code >= 500:
+                errors[op] = errors.get(op, 0) + 1
+            else:
+                samples.setdefault(op, []).append((time.perf_counter() - start) * 1000)
+        except httpx.HTTPError:
+            errors[op] = errors.get(op, 0) + 1
+        if think_ms:
+            await asyncio.sleep(rng.uniform(0, 2 * think_ms) / 1000)
+
+
+async def run_stage(http, workload, concurrency, duration, think_ms, seed):
+    samples = {}
+    errors = {}
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        user_loop(http, workload, deadline, samples, errors, think_ms, random.Random(seed * 100_000 + i))
+        for i in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - started
+
+    endpoints = {}
+    for op in sorted(set(samples) | set(errors)):
+        latencies = samples.get(op, [])
+        failed = errors.get(op, 0)
+        endpoints[op] = {
+            "requests": len(latencies) + failed,
+            "throughput_rps": len(latencies) / elapsed,
+            "error_rate": failed / (len(latencies) + failed),
+            "p50_ms": percentile(latencies, 0.5) if latencies else None,
+            "p95_ms": percentile(latencies, 0.95) if latencies else None,
+            "p99_ms": percentile(latencies, 0.99) if latencies else None,
+        }
+    return {"concurrency": concurrency, "elapsed_s": elapsed, "endpoints": endpoints}
+
+
+def find_saturation(stages, slo_p95_ms, max_error_rate, min_gain):
+    """
+    找出每個端點開始飽和的同時連線數。
+    :param min_gain: 連線數增加後吞吐量至少要增加的比例，低於此值視為飽和
+    :return: {類型: {"concurrency": 連線數, "reason": 原因}}，未飽和的端點不列出
+    """
+    saturation = {}
+    previous = {}
+    for stage in stages:
+        for op, stats in stage["endpoints"].items():
+            if op in saturation:
+                continue
+            reason = None
+            if stats["error_rate"] > max_error_rate:
+                reason = f"錯誤率 {stats['error_rate']:.1%}"
+            elif stats["p95_ms"] is not None and stats["p95_ms"] > slo_p95_ms:
+                reason = f"p95 {stats['p95_ms']:.0f} ms"
+            elif op in previous:
+                last_concurrency, last_rps = previous[op]
+                expected = last_rps * (1 + min_gain * (stage["concurrency"] / last_concurrency - 1))
+                if stats["throughput_rps"] < expected:
+                    reason = f"吞吐量 {last_rps:.1f} -> {stats['throughput_rps']:.1f} req/s"
+            if reason:
+                saturation[op] = {"concurrency": stage["concurrency"], "reason": reason}
+            previous[op] = (stage["concurrency"], stats["throughput_rps"])
+    return saturation
+
+
+async def wait_until_ready(http, process, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"後端進程已結束，結束碼 {process.returncode}")
+        try:
+            if (await http.get("/api/prefetch/stats")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError(f"後端在 {timeout} 秒內沒有回應")
+
+
+async def seed_reviews(http, keywords, timeout):
+    """開始爬取種子餐廳並等到分析完成，讓讀取評論 / 分析結果的請求有資料"""
+    for keyword in keywords:
+        response = await http.post("/api/scrape-reviews", json={"keyword": keyword})
+        response.raise_for_status()
+    deadline = time.monotonic() + timeout
+    pending = set(keywords)
+    while pending:
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"種子餐廳在 {timeout} 秒內沒有完成: {', '.join(sorted(pending))}")
+        for keyword in list(pending):
+            response = await http.get(f"/api/reviews/{quote(keyword)}/status")
+            status = response.json().get("status") if response.status_code == 200 else None
+            if status == "completed":
+                pending.discard(keyword)
+            elif status == "error":
+                raise RuntimeError(f"種子餐廳 {keyword} 爬取失敗: {response.json().get('error')}")
+        await asyncio.sleep(0.2)
+
+
+def start_places_stub(args, log):
+    port = free_port()
+    command = [
+        sys.executable, os.path.join(SCRAPER_DIR, "stub_places_server.py"),
+        "--port", str(port),
+        "--latency-ms", str(args.places_latency_ms),
+        "--failure-rate", str(args.places_failure_rate),
+        "--token-delay", "0",
+    ]
+    return subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT), f"http://127.0.0.1:{port}"
+
+
+def start_backend(args, places_url, workdir, log):
+    port = free_port()
+    env = dict(
+        os.environ,
+        WHAT2EAT_FAKE_SERVICES="1",
+        QA_BACKEND="fake",
+        QA_WORKERS="0",
+        FAKE_QA_LATENCY_MS=str(args.qa_latency_ms),
+        FAKE_SCRAPER_LATENCY_MS=str(args.scraper_latency_ms),
+        FAKE_FIRESTORE_LATENCY_MS=str(args.firestore_latency_ms),
+        FAKE_GEMINI_LATENCY_MS=str(args.gemini_latency_ms),
+        PLACES_API_BASE_URL=places_url,
+        SCRAPE_WORKERS=str(args.scrape_workers),
+        PREFETCH="1" if args.prefetch else "0",
+        RESULTS_DIR=os.path.join(workdir, "results"),
+    )
+    if args.server == "asgi":
+        command = [
+            sys.executable, "-m", "uvicorn", "asgi_app:app",
+            "--app-dir", SCRAPER_DIR, "--port", str(port), "--log-level", "warning",
+        ]
+    else:
+        command = [sys.executable, os.path.abspath(__file__), "--serve-flask", str(port)]
+    # 在暫存目錄執行，app.log 與分析中間結果不會寫進專案
+    process = subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    return process, f"http://127.0.0.1:{port}"
+
+
+def serve_flask(port):
+    """以 threaded 模式執行 Flask（不使用 debug reloader），供負載測試的子進程使用"""
+    from werkzeug.serving import run_simple
+
+    import app as backend
+
+    backend.init_qa_client()
+    backend.job_queue.start()
+    run_simple("127.0.0.1", port, backend.app, threaded=True)
+
+
+def print_stage(stage, ops):
+    queue = stage.get("queue", {})
+    print(
+        f"同時連線 {stage['concurrency']}（{stage['elapsed_s']:.1f} 秒，"
+        f"佇列排隊 {queue.get('queued', '?')} / 執行中 {queue.get('running', '?')}）"
+    )
+    for op in ops:
+        stats = stage["endpoints"].get(op)
+        if stats is None:
+            continue
+        if stats["p50_ms"] is None:
+            print(f"  {op:<9} 全部失敗 ({stats['requests']})")
+            continue
+        print(
+            f"  {op:<9} {stats['throughput_rps']:8.1f} req/s  p50 {stats['p50_ms']:7.1f} ms  "
+            f"p95 {stats['p95_ms']:7.1f} ms  p99 {stats['p99_ms']:7.1f} ms  錯誤率 {stats['error_rate']:.1%}"
+        )
+
+
+async def run(args):
+    workdir = tempfile.mkdtemp(prefix="bench_load_")
+    log_path = os.path.join(workdir, "server.log")
+    mix = args.mix
+    seeded = [f"{SEED_PREFIX} {i}" for i in range(args.seed_keywords)]
+    workload = Workload(mix, seeded, args.scrape_pool, args.hotspot_ratio, args.radius)
+    concurrency_levels = [int(value) for value in args.concurrency.split(",")]
+
+    with open(log_path, "w", encoding="utf-8") as log:
+        stub, places_url = start_places_stub(args, log)
+        server, base_url = start_backend(args, places_url, workdir, log)
+        limits = httpx.Limits(
+            max_connections=max(concurrency_levels), max_keepalive_connections=max(concurrency_levels)
+        )
+        stages = []
+        try:
+            async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as http:
+                await wait_until_ready(http, server, args.startup_timeout)
+                print(f"{args.server} 後端已啟動於 {base_url}，Places 替身 {places_url}，記錄檔 {log_path}")
+                await seed_reviews(http, seeded, args.startup_timeout)
+
+                for index, concurrency in enumerate(concurrency_levels):
+                    stage = await run_stage(http, workload, concurrency, args.stage_duration, args.think_ms, index)
+                    stage["queue"] = (await http.get("/api/prefetch/stats")).json()["queue"]
+                    stages.append(stage)
+                    print_stage(stage, mix)
+        finally:
+            server.terminate()
+            stub.terminate()
+            server.wait(timeout=10)
+            stub.wait(timeout=10)
+
+    saturation = find_saturation(stages, args.slo_p95_ms, args.max_error_rate, args.min_gain)
+    print("飽和點：")
+    for op in mix:
+        if op in saturation:
+            print(f"  {op:<9} 同時連線 {saturation[op]['concurrency']}（{saturation[op]['reason']}）")
+        else:
+            print(f"  {op:<9} 測試範圍內未飽和")
+
+    result = {
+        "meta": {
+            "server": args.server,
+            "mix": mix,
+            "stage_duration_s": args.stage_duration,
+            "think_ms": args.think_ms,
+            "latency_ms": {
+                "scraper": args.scraper_latency_ms,
+                "qa_per_review": args.qa_latency_ms,
+                "firestore": args.firestore_latency_ms,
+                "gemini": args.gemini_latency_ms,
+                "places": args.places_latency_ms,
+            },
+            "places_failure_rate": args.places_failure_rate,
+            "scrape_workers": args.scrape_workers,
+            "cpu_count": os.cpu_count(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        },
+        "stages": stages,
+        "saturation": saturation,
+    }
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP API load test against local service stand-ins")
+    parser.add_argument("--server", default="flask", choices=("flask", "asgi"))
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help=f"請求比例，預設 {DEFAULT_MIX}")
+    parser.add_argument("--concurrency", default="10,50,100,200", help="逐段增加的同時連線數")
+    parser.add_argument("--stage-duration", type=float, default=20)
+    parser.add_argument("--think-ms", type=float, default=0, help="每個使用者兩次請求間的平均間隔")
+    parser.add_argument("--seed-keywords", type=int, default=5, help="測試前先完成分析的餐廳數")
+    parser.add_argument("--scrape-pool", type=int, default=200, help="開始爬取時挑選的餐廳數")
+    parser.add_argument("--hotspot-ratio", type=float, default=0.8, help="搜尋集中在熱門地點附近的比例")
+    parser.add_argument("--radius", type=int, default=1500)
+    parser.add_argument("--scraper-latency-ms", type=float, default=2000, help="每次爬取的模擬瀏覽器時間")
+    parser.add_argument("--qa-latency-ms", type=float, default=5, help="每則評論的模擬 QA 推論時間")
+    parser.add_argument("--firestore-latency-ms", type=float, default=10)
+    parser.add_argument("--gemini-latency-ms", type=float, default=800)
+    parser.add_argument("--places-latency-ms", type=float, default=80)
+    parser.add_argument("--places-failure-rate", type=float, default=0.0)
+    parser.add_argument("--scrape-workers", type=int, default=2)
+    parser.add_argument("--prefetch", action="store_true", help="開啟預先分析")
+    parser.add_argument("--slo-p95-ms", type=float, default=500, help="p95 超過此值視為飽和")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="錯誤率超過此值視為飽和")
+    parser.add_argument("--min-gain", type=float, default=0.2, help="連線數增加時吞吐量至少要跟著增加的比例")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    parser.add_argument("--output", default="results/bench_load.json")
+    parser.add_argument("--serve-flask", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_flask:
+        serve_flask(args.serve_flask)
+        return
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
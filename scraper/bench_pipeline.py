@@ -0,0 +1,244 @@
+"""
+評論處理流程的離線效能測試。
+
+以存下來的評論 HTML 重播整條流程：HTML 解析 -> 評論資料整理 -> 上傳 Firestore ->
+QA 分析（前置篩選、推論、答案分群、Gemini 篩選與總結）-> 上傳分析結果。
+Firestore 與 Gemini 使用 fakes.py 的替身（WHAT2EAT_FAKE_SERVICES=1），不需要網路與憑證；
+QA 可用實際模型（torch / onnx）或 --qa fake 的替身。
+
+輸出各階段延遲、吞吐量與最高 RSS，寫成 JSON，並可與基準結果比較，變慢超過容許範圍時
+以非零結束碼回報。
+
+用法（於專案根目錄）:
+    python scraper/bench_pipeline.py --qa fake --save-baseline results/bench_baseline.json
+    python scraper/bench_pipeline.py --qa fake --baseline results/bench_baseline.json
+    python scraper/bench_pipeline.py --write-fixture scraper/fixtures/reviews.html
+"""
+import argparse
+import html
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+DEFAULT_FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "reviews.html")
+DEFAULT_PHRASES = "results/first_result.json"
+KEYWORD = "離線測試餐廳"
+# 分析函式內部的階段，由 app.STAGE_SECONDS 的差值取得
+ANALYSIS_STAGES = ("qa_prefilter", "qa_inference", "answer_clustering", "gemini_filter", "gemini_summarize")
+
+
+def peak_rss_mb():
+    """目前進程的最高常駐記憶體（MB）"""
+    try:
+        import resource
+    except ImportError:
+        import psutil
+
+        memory = psutil.Process().memory_info()
+        return getattr(memory, "peak_wset", memory.rss) / 2**20
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 單位為 KB，macOS 為 bytes
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def build_fixture_html(phrases, count, seed=0):
+    """以評論片段組出與 Google Maps 評論區塊相同結構的 HTML"""
+    rng = random.Random(seed)
+    blocks = []
+    for i in range(count):
+        size = rng.randint(1, 6)
+        lines = ["，".join(rng.choice(phrases) for _ in range(size))]
+        if rng.random() < 0.2:
+            lines.append("，".join(rng.choice(phrases) for _ in range(size)))
+        comment = "<br>".join(html.escape(line) for line in lines)
+        time_span = f'<span class="rsqaWe">{rng.randint(1, 11)} 個月前</span>' if rng.random() < 0.9 else ""
+        more = '<button class="w8nwRe kyuRq" aria-label="顯示更多">更多</button>' if size > 4 else ""
+        blocks.append(
+            f'<div class="jftiEf fontBodyMedium" data-review-id="r{i}">'
+            f'<div class="WNxzHc"><div class="d4r55">{html.escape(f"評論者 {i}")}</div></div>'
+            f'<div class="DU9Pgb"><span class="kvMYJc" role="img" aria-label="{rng.randint(1, 5)} 顆星">'
+            f'<img src="star.png"></span>{time_span}</div>'
+            f'<div class="MyEned"><span class="wiI7pd">{comment}</span>{more}</div>'
+            "</div>"
+        )
+    return '<div class="m6QErb DxyBCb">' + "".join(blocks) + "</div>"
+
+
+def write_fixture(path, count):
+    with open(DEFAULT_PHRASES, "r", encoding="utf-8") as f:
+        phrases = [p for values in json.load(f).values() for p in values]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(build_fixture_html(phrases, count))
+    print(f"已寫入 {count} 則評論到 {path}")
+
+
+def summarize(samples_ms):
+    ordered = sorted(samples_ms)
+    return {
+        "mean_ms": statistics.mean(ordered),
+        "p50_ms": statistics.median(ordered),
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+    }
+
+
+def run_iteration(app, page_html):
+    """執行一次完整流程，回傳 ({階段: 毫秒}, 評論數)"""
+    timings = {}
+
+    def timed(stage, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        timings[stage] = (time.perf_counter() - start) * 1000
+        return result
+
+    parsed = timed("parse_html", app.parse_reviews_html, page_html)
+    records = timed("build_records", app.build_review_records, parsed, KEYWORD)
+    timed("upload_reviews", app.upload_reviews_to_firestore, "reviews", records)
+
+    before = app.STAGE_SECONDS.snapshot()
+    analysis = timed("analysis", app.analyze_reviews_with_qa_lora, records)
+    after = app.STAGE_SECONDS.snapshot()
+    for stage in ANALYSIS_STAGES:
+        key = (stage,)
+        if key in after:
+            timings[stage] = (after[key][1] - before.get(key, (0, 0.0))[1]) * 1000
+
+    timed("upload_analysis", app.upload_analysis_to_firestore, "reviews", KEYWORD, analysis)
+    timings["total"] = sum(
+        timings[stage]
+        for stage in ("parse_html", "build_records", "upload_reviews", "analysis", "upload_analysis")
+    )
+    return timings, len(records)
+
+
+def compare(result, baseline, tolerance, min_delta_ms):
+    """回傳變慢的項目列表"""
+    regressions = []
+    for stage, stats in baseline["stages"].items():
+        current = result["stages"].get(stage)
+        if current is None:
+            continue
+        delta = current["p50_ms"] - stats["p50_ms"]
+        if delta > min_delta_ms and current["p50_ms"] > stats["p50_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{stage}: p50 {stats['p50_ms']:.1f} -> {current['p50_ms']:.1f} ms "
+                f"(+{delta / stats['p50_ms']:.0%})"
+            )
+    if result["throughput_reviews_per_s"] < baseline["throughput_reviews_per_s"] * (1 - tolerance):
+        regressions.append(
+            f"throughput: {baseline['throughput_reviews_per_s']:.1f} -> "
+            f"{result['throughput_reviews_per_s']:.1f} reviews/s"
+        )
+    if result["peak_rss_mb"] > baseline["peak_rss_mb"] * (1 + tolerance):
+        regressions.append(
+            f"peak RSS: {baseline['peak_rss_mb']:.0f} -> {result['peak_rss_mb']:.0f} MB"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline review pipeline benchmark")
+    parser.add_argument("--fixture", default=DEFAULT_FIXTURE, help="存下來的評論區塊 HTML")
+    parser.add_argument("--qa", default="torch", choices=("torch", "onnx", "fake"))
+    parser.add_argument("--fake-qa-latency-ms", type=float, default=0, help="--qa fake 時每則評論的模擬推論時間")
+    parser.add_argument("--gemini-latency-ms", type=float, default=0)
+    parser.add_argument("--firestore-latency-ms", type=float, default=0)
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--output", default="results/bench_pipeline.json")
+    parser.add_argument("--baseline", help="與此基準結果比較")
+    parser.add_argument("--save-baseline", help="將本次結果另存為基準")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="容許變慢的比例")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="小於此差距的變化不視為退步")
+    parser.add_argument("--write-fixture", help="由 results/first_result.json 產生 HTML 測試資料後結束")
+    parser.add_argument("--fixture-reviews", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.write_fixture:
+        write_fixture(args.write_fixture, args.fixture_reviews)
+        return
+
+    # 必須在匯入 app 之前設定
+    os.environ["WHAT2EAT_FAKE_SERVICES"] = "1"
+    os.environ["FAKE_GEMINI_LATENCY_MS"] = str(args.gemini_latency_ms)
+    os.environ["FAKE_FIRESTORE_LATENCY_MS"] = str(args.firestore_latency_ms)
+    os.environ["METRICS"] = "1"
+    os.environ["RESULTS_DIR"] = tempfile.mkdtemp(prefix="bench_pipeline_")
+    import app
+    from fakes import FakeQAClient
+
+    if args.qa == "fake":
+        app.qa_client = FakeQAClient(latency_ms_per_review=args.fake_qa_latency_ms)
+    else:
+        app.init_qa_client(backend=args.qa, num_workers=0)
+
+    with open(args.fixture, "r", encoding="utf-8") as f:
+        page_html = f.read()
+
+    for _ in range(args.warmup):
+        run_iteration(app, page_html)
+        app.db.reset()
+
+    samples = {}
+    review_count = 0
+    for _ in range(args.iterations):
+        timings, review_count = run_iteration(app, page_html)
+        app.db.reset()
+        for stage, value in timings.items():
+            samples.setdefault(stage, []).append(value)
+
+    stages = {stage: summarize(values) for stage, values in samples.items()}
+    result = {
+        "meta": {
+            "fixture": os.path.basename(args.fixture),
+            "reviews": review_count,
+            "qa": args.qa,
+            "iterations": args.iterations,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        },
+        "stages": stages,
+        "throughput_reviews_per_s": review_count / (stages["total"]["p50_ms"] / 1000),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+    print(f"{review_count} 則評論，QA: {args.qa}，{args.iterations} 次")
+    for stage, stats in stages.items():
+        print(
+            f"  {stage:<18} p50 {stats['p50_ms']:9.1f} ms  p95 {stats['p95_ms']:9.1f} ms"
+            f"  mean {stats['mean_ms']:9.1f} ms"
+        )
+    print(f"  吞吐量 {result['throughput_reviews_per_s']:.1f} reviews/s，最高 RSS {result['peak_rss_mb']:.0f} MB")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["meta"].get("qa") != args.qa or baseline["meta"].get("reviews") != review_count:
+            print("警告：基準結果的 QA 後端或評論數不同，比較結果僅供參考")
+        regressions = compare(result, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print("效能退步：")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("與基準相比沒有退步")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Places API 客戶端的效能與完整性測試（使用本機 stub_places_server）。
+
+比較每次 requests.get 新建連線與共用連線池的 HttpClient 在並發查詢下的延遲，
+並確認 PlacesClient 在 next_page_token 尚未生效時會重試、取得全部分頁。
+
+用法:
+    python scraper/bench_places_client.py --requests 200 --concurrency 8 --latency-ms 20
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from http_client import HttpClient
+from places_api import PlacesClient
+from stub_places_server import StubPlaces, start_in_thread
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def run(label, get, base_url, count, concurrency):
+    url = f"{base_url}/nearbysearch/json"
+
+    def one(i):
+        start = time.perf_counter()
+        response = get(url, params={"location": f"25.03,{121.5 + i * 1e-4}", "radius": 1000, "key": "x"})
+        response.json()
+        return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(one, range(count)))
+    elapsed = time.perf_counter() - start
+    print(
+        f"{label:<14} p50 {statistics.median(latencies):7.1f} ms，"
+        f"p95 {percentile(latencies, 0.95):7.1f} ms，{count / elapsed:7.1f} req/s"
+    )
+
+
+def check_pagination(base_url, stub):
+    client = PlacesClient(HttpClient(), "x", base_url=base_url, page_token_delay=0.2)
+    pages = []
+    first, done = client.nearby_search(25.03, 121.5, 1000, on_page=pages.append)
+    done.result()
+    total = len(first) + sum(len(page) for page in pages)
+    print(f"分頁完整性: 第一頁 {len(first)} 筆 + 背景 {len(pages)} 頁，共 {total}/{stub.total} 筆")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Places client benchmark")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    stub = StubPlaces(latency_ms=args.latency_ms, token_delay=0.3)
+    server, base_url = start_in_thread(stub)
+    try:
+        http = HttpClient(pool_maxsize=args.concurrency)
+        run("requests.get", requests.get, base_url, args.requests, args.concurrency)
+        run("HttpClient", http.get, base_url, args.requests, args.concurrency)
+        check_pagination(base_url, stub)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
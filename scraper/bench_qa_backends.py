@@ -0,0 +1,92 @@
+"""
+比較 transformers QA pipeline（基準）與 QAEngine 的 torch / ONNX Runtime 後端的
+延遲、吞吐量與答案一致性。
+
+用法（在專案根目錄執行，需先執行 qa_onnx_export.py）:
+    python scraper/bench_qa_backends.py --reviews reviews.json --limit 200
+"""
+import argparse
+import logging
+import statistics
+import time
+
+from bench_qa_workers import QUESTIONS, load_contexts
+from qa_model import (
+    DEFAULT_MODEL_PATH,
+    DEFAULT_ONNX_PATH,
+    answer_batch,
+    load_qa_backend,
+    load_qa_pipeline,
+)
+
+
+def measure(backend, contexts, batch_size):
+    """回傳 (單則評論延遲列表, 批次總耗時, 答案)"""
+    latencies = []
+    for context in contexts:
+        start = time.perf_counter()
+        answer_batch(backend, [(QUESTIONS, context)], batch_size=batch_size)
+        latencies.append(time.perf_counter() - start)
+
+    items = [(QUESTIONS, context) for context in contexts]
+    start = time.perf_counter()
+    results = answer_batch(backend, items, batch_size=batch_size)
+    elapsed = time.perf_counter() - start
+    return latencies, elapsed, [answers for answers, _ in results]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="QA pipeline vs QAEngine backend benchmark")
+    parser.add_argument("--reviews", help="reviews.json 路徑")
+    parser.add_argument("--limit", type=int, default=100, help="測試評論數")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--model-path", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--onnx-path", default=DEFAULT_ONNX_PATH)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    contexts = load_contexts(args.reviews, args.limit)
+
+    results = {}
+    for name in ("pipeline", "torch", "onnx"):
+        if name == "pipeline":
+            backend = load_qa_pipeline(args.model_path)
+        else:
+            # 不限制視窗數，與 pipeline 的行為相同
+            backend = load_qa_backend(
+                name, args.model_path, args.onnx_path, max_windows=10**6
+            )
+        # 暖機
+        answer_batch(backend, [(QUESTIONS, contexts[0])])
+        results[name] = measure(backend, contexts, args.batch_size)
+
+    print(f"\n{len(contexts)} 則評論 x {len(QUESTIONS)} 題，batch_size={args.batch_size}")
+    print(f"{'backend':<8}{'p50 ms':>10}{'p95 ms':>10}{'batch s':>10}{'reviews/s':>12}")
+    for name, (latencies, elapsed, _) in results.items():
+        latencies_ms = sorted(l * 1000 for l in latencies)
+        p95 = latencies_ms[int(len(latencies_ms) * 0.95) - 1]
+        print(
+            f"{name:<8}{statistics.median(latencies_ms):>10.1f}{p95:>10.1f}"
+            f"{elapsed:>10.2f}{len(contexts) / elapsed:>12.2f}"
+        )
+
+    # 以 pipeline 的答案為基準，檢查各後端是否一致
+    total = len(contexts) * len(QUESTIONS)
+    for name in ("torch", "onnx"):
+        mismatches = []
+        for context, expected_answers, answers in zip(
+            contexts, results["pipeline"][2], results[name][2]
+        ):
+            for question, a, b in zip(QUESTIONS, expected_answers, answers):
+                a_text = a["answer"] if a else None
+                b_text = b["answer"] if b else None
+                if a_text != b_text:
+                    mismatches.append((context[:30], question[:12], a_text, b_text))
+
+        print(f"\n{name} 與 pipeline 答案一致: {total - len(mismatches)}/{total}")
+        for mismatch in mismatches[:20]:
+            print("  不一致:", mismatch)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+在保留資料集上評估 QA 前置篩選：省下多少 QA 推論、又有多少答案因此改變。
+
+用法（在專案根目錄執行）:
+    python scraper/bench_qa_prefilter.py --reviews heldout_reviews.json
+reviews 檔案格式與爬蟲輸出相同，每則評論需包含「評論」與「評分」欄位。
+"""
+import argparse
+import json
+import logging
+import time
+
+from bench_qa_workers import QUESTIONS
+from qa_model import DEFAULT_MODEL_PATH, QA_BACKENDS, load_qa_backend
+from qa_prefilter import evaluate_prefilter
+from qa_workers import LocalQAClient
+
+
+def main():
+    parser = argparse.ArgumentParser(description="QA prefilter evaluation")
+    parser.add_argument("--reviews", required=True, help="保留資料集 reviews.json 路徑")
+    parser.add_argument("--backend", choices=QA_BACKENDS, default="torch")
+    parser.add_argument("--model-path", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--output", help="將報告另存為 JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    with open(args.reviews, "r", encoding="utf-8") as f:
+        reviews = json.load(f)
+
+    client = LocalQAClient(load_qa_backend(args.backend, args.model_path))
+    start = time.perf_counter()
+    report = evaluate_prefilter(reviews, client, QUESTIONS)
+    report["full_qa_seconds"] = round(time.perf_counter() - start, 2)
+
+    print(f"\n評論數: {report['reviews']}，問題數: {report['pairs']}")
+    print(f"略過問題: {report['skipped_pairs']} ({report['saved_ratio']:.1%})")
+    for key, count in report["skipped_by_question"].items():
+        print(f"  {key:<15}{count:>6}")
+    print(f"答案改變: {report['changed_answers']} ({report['changed_ratio']:.1%})")
+    for key, count in report["changed_by_question"].items():
+        print(f"  {key:<15}{count:>6}")
+    for key, context, answer in report["changed_examples"]:
+        print(f"  [{key}] {context[:40]!r} -> {answer!r}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=4)
+
+
+if __name__ == "__main__":
+    main()
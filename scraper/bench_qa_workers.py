@@ -0,0 +1,87 @@
+"""
+QA worker pool 吞吐量測試：比較本進程推論與不同 worker 數量的 reviews/s。
+
+用法（在專案根目錄執行）:
+    python scraper/bench_qa_workers.py --reviews reviews.json --workers 1 2 4
+    python scraper/bench_qa_workers.py --concurrency 4   # 模擬同時進行的爬蟲工作
+"""
+import argparse
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from qa_model import DEFAULT_MODEL_PATH, QA_BACKENDS, load_qa_backend
+from qa_workers import LocalQAClient, QAWorkerPool
+
+QUESTIONS = (
+    "根據這段評論,這家餐廳實際表現好的地方有哪些?請列出具體的優點。若無則回答「無優點」",
+    "根據這段評論,這家餐廳實際表現不好的地方有哪些?請列出具體的缺點。若無則回答「無缺點」",
+    "根據這段評論,有哪些值得一試的餐點或特色菜?請列出具體菜名。若無則回答「無推薦」",
+)
+
+
+def load_contexts(path, limit):
+    """讀取爬蟲輸出的 reviews.json；沒有檔案時用 results/first_result.json 組出測試評論"""
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            contexts = [r.get("評論", "") for r in json.load(f)]
+    else:
+        with open("results/first_result.json", "r", encoding="utf-8") as f:
+            phrases = [p for values in json.load(f).values() for p in values]
+        contexts = ["，".join(phrases[i : i + 8]) for i in range(0, len(phrases), 8)]
+    contexts = [c for c in contexts if c]
+    return (contexts * (limit // max(len(contexts), 1) + 1))[:limit]
+
+
+def run_jobs(client, contexts, concurrency):
+    """將評論平均分給 concurrency 個同時進行的工作，回傳耗時（秒）"""
+    jobs = [contexts[i::concurrency] for i in range(concurrency)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(
+            executor.map(
+                lambda job: client.answer([(QUESTIONS, c) for c in job]), jobs
+            )
+        )
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="QA worker pool benchmark")
+    parser.add_argument("--reviews", help="reviews.json 路徑")
+    parser.add_argument("--limit", type=int, default=200, help="測試評論數")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int, default=1, help="同時進行的工作數")
+    parser.add_argument("--backend", choices=QA_BACKENDS, default="torch")
+    parser.add_argument("--model-path", default=DEFAULT_MODEL_PATH)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    contexts = load_contexts(args.reviews, args.limit)
+
+    rows = []
+    local_client = LocalQAClient(load_qa_backend(args.backend, args.model_path))
+    elapsed = run_jobs(local_client, contexts, args.concurrency)
+    rows.append(("in-process", elapsed))
+
+    for num_workers in args.workers:
+        pool = QAWorkerPool(
+            num_workers, backend=args.backend, model_path=args.model_path
+        ).start()
+        try:
+            # 先暖機一次，避免把第一次推論的初始化時間算進去
+            pool.answer([(QUESTIONS, contexts[0])] * num_workers)
+            elapsed = run_jobs(pool, contexts, args.concurrency)
+        finally:
+            pool.close()
+        rows.append((f"{num_workers} workers", elapsed))
+
+    print(f"\n{len(contexts)} 則評論 x {len(QUESTIONS)} 題，同時 {args.concurrency} 個工作")
+    print(f"{'mode':<14}{'seconds':>10}{'reviews/s':>12}")
+    for mode, elapsed in rows:
+        print(f"{mode:<14}{elapsed:>10.2f}{len(contexts) / elapsed:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
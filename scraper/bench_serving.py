@@ -0,0 +1,91 @@
+"""
+Flask 與 ASGI 服務模式的負載比較。
+
+以 httpx 非同步客戶端模擬大量同時輪詢狀態與讀取評論的使用者，對指定的後端位址
+持續送出請求，回報吞吐量、延遲百分位數與錯誤率。分別對兩種模式執行後比較：
+
+    python scraper/app.py                                          # Flask，port 5000
+    uvicorn asgi_app:app --app-dir scraper --port 5001             # ASGI
+
+    python scraper/bench_serving.py --url http://127.0.0.1:5000 --keyword 某餐廳 --concurrency 1000
+    python scraper/bench_serving.py --url http://127.0.0.1:5001 --keyword 某餐廳 --concurrency 1000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from urllib.parse import quote
+
+import httpx
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def client_loop(http, paths, deadline, latencies, errors, think_ms, rng):
+    while time.perf_counter() < deadline:
+        path = rng.choice(paths)
+        start = time.perf_counter()
+        try:
+            response = await http.get(path)
+            # 404 代表沒有資料，仍是正常回應
+            if response.status_code >= 500:
+                errors[path] = errors.get(path, 0) + 1
+            else:
+                latencies.setdefault(path, []).append((time.perf_counter() - start) * 1000)
+        except httpx.HTTPError:
+            errors[path] = errors.get(path, 0) + 1
+        if think_ms:
+            await asyncio.sleep(rng.uniform(0, 2 * think_ms) / 1000)
+
+
+async def run(args):
+    keyword = quote(args.keyword)
+    paths = [f"/api/reviews/{keyword}/status"] * args.status_weight + [
+        f"/api/reviews/{keyword}"
+    ] * args.read_weight
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    latencies = {}
+    errors = {}
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as http:
+        deadline = time.perf_counter() + args.duration
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            client_loop(http, paths, deadline, latencies, errors, args.think_ms, random.Random(i))
+            for i in range(args.concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+
+    print(f"{args.url}，{args.concurrency} 個同時連線，{elapsed:.1f} 秒")
+    for path in sorted(set(paths)):
+        samples = latencies.get(path, [])
+        failed = errors.get(path, 0)
+        total = len(samples) + failed
+        if not samples:
+            print(f"  {path}: 全部失敗 ({failed})")
+            continue
+        print(
+            f"  {path}: {len(samples) / elapsed:8.1f} req/s，"
+            f"p50 {statistics.median(samples):7.1f} ms，p95 {percentile(samples, 0.95):7.1f} ms，"
+            f"p99 {percentile(samples, 0.99):7.1f} ms，錯誤率 {failed / total:.1%}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flask vs ASGI serving load test")
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--keyword", required=True, help="已有評論資料的餐廳名稱")
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--think-ms", type=float, default=0, help="每個使用者兩次請求間的平均間隔")
+    parser.add_argument("--status-weight", type=int, default=9)
+    parser.add_argument("--read-weight", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=30)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
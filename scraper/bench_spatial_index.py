@@ -0,0 +1,94 @@
+"""
+附近餐廳距離計算與空間索引的效能測試。
+
+以台北市範圍內隨機產生的地點，比較逐筆 haversine 迴圈與向量化計算，
+並量測 RestaurantIndex 的建立時間、半徑查詢與 k 近鄰查詢延遲。
+
+用法:
+    python scraper/bench_spatial_index.py --points 100000
+"""
+import argparse
+import random
+import statistics
+import time
+
+import numpy as np
+
+from geo_cache import haversine_m
+from spatial_index import RestaurantIndex, haversine_many, place_distances
+
+# 台北市大致範圍
+LAT_RANGE = (24.96, 25.21)
+LNG_RANGE = (121.45, 121.67)
+
+
+def synthetic_places(count, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            "place_id": f"place-{i}",
+            "name": f"餐廳 {i}",
+            "geometry": {
+                "location": {"lat": rng.uniform(*LAT_RANGE), "lng": rng.uniform(*LNG_RANGE)}
+            },
+        }
+        for i in range(count)
+    ]
+
+
+def time_us(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Spatial index benchmark")
+    parser.add_argument("--points", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--radius", type=int, default=1500)
+    parser.add_argument("--k", type=int, default=20)
+    args = parser.parse_args()
+
+    places = synthetic_places(args.points)
+    rng = random.Random(1)
+    queries = [(rng.uniform(*LAT_RANGE), rng.uniform(*LNG_RANGE)) for _ in range(args.queries)]
+    lat, lng = queries[0]
+
+    def scalar_loop():
+        for p in places:
+            location = p["geometry"]["location"]
+            haversine_m(lat, lng, location["lat"], location["lng"])
+
+    print(f"{args.points} 個地點")
+    print(f"逐筆 haversine 迴圈: {time_us(scalar_loop, 3) / 1000:10.1f} ms")
+    print(f"向量化 haversine:    {time_us(lambda: place_distances(lat, lng, places), 3) / 1000:10.1f} ms")
+    lats = [p["geometry"]["location"]["lat"] for p in places]
+    lngs = [p["geometry"]["location"]["lng"] for p in places]
+    lats, lngs = np.array(lats), np.array(lngs)
+    print(f"  （只算座標陣列）:  {time_us(lambda: haversine_many(lat, lng, lats, lngs), 10) / 1000:10.1f} ms")
+
+    index = RestaurantIndex()
+    start = time.perf_counter()
+    index.add(places)
+    index.radius_query(lat, lng, 1)  # 建立查詢用陣列
+    print(f"建立索引:            {(time.perf_counter() - start) * 1000:10.1f} ms")
+
+    radius_us = [time_us(lambda: index.radius_query(qlat, qlng, args.radius), 1) for qlat, qlng in queries]
+    nearest_us = [time_us(lambda: index.nearest(qlat, qlng, args.k), 1) for qlat, qlng in queries]
+    found = statistics.mean(len(index.radius_query(qlat, qlng, args.radius)) for qlat, qlng in queries)
+    print(
+        f"半徑 {args.radius}m 查詢:    p50 {statistics.median(radius_us):8.0f} µs"
+        f"，p95 {sorted(radius_us)[int(len(radius_us) * 0.95) - 1]:8.0f} µs，平均 {found:.0f} 筆"
+    )
+    print(
+        f"k={args.k} 近鄰查詢:       p50 {statistics.median(nearest_us):8.0f} µs"
+        f"，p95 {sorted(nearest_us)[int(len(nearest_us) * 0.95) - 1]:8.0f} µs"
+    )
+
+
+if __name__ == "__main__":
+    main()
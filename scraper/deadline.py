@@ -0,0 +1,53 @@
+"""
+爬蟲 / 分析工作的時間預算。
+
+每個工作從使用者點擊（預先分析則從開始執行）起有 budget 秒（前端輪詢 10 分鐘後放棄），各階段依剩餘時間決定是否縮減工作量，
+並以 degrade() 記錄採用了哪些縮減：
+
+- stop_scrolling：剩餘時間不夠後續分析時提早停止捲動載入評論
+- qa_top_k：QA 依資訊量排序評論，時間不夠時只處理前 K 則
+- skip_gemini_filter：略過 Gemini 篩選，直接以分群結果總結
+
+沒有預算的工作（例如批次匯入）使用 budget=math.inf，所有判斷都會通過。
+"""
+import logging
+import math
+import time
+
+
+class JobDeadline:
+    """
+    :param budget: 預算秒數，math.inf 表示不限時
+    :param started_at: 開始計時的 time.time()，預設為現在；使用者點擊的工作以點擊時間計算
+    :param on_degrade: 可選，每次縮減時呼叫 on_degrade(目前所有縮減紀錄的 list)
+    """
+
+    def __init__(self, budget=math.inf, started_at=None, on_degrade=None):
+        self.budget = budget
+        self.started_at = time.time() if started_at is None else started_at
+        self.on_degrade = on_degrade
+        self.degradations = []
+
+    @property
+    def limited(self):
+        return math.isfinite(self.budget)
+
+    @property
+    def expires_at(self):
+        return self.started_at + self.budget
+
+    def elapsed(self):
+        return time.time() - self.started_at
+
+    def remaining(self):
+        return self.expires_at - time.time()
+
+    def can_afford(self, seconds):
+        """剩餘時間是否還夠 seconds 秒"""
+        return self.remaining() >= seconds
+
+    def degrade(self, name, detail):
+        self.degradations.append({"name": name, "detail": detail, "elapsed_s": round(self.elapsed(), 1)})
+        logging.warning(f"工作時間不足（剩 {self.remaining():.0f} 秒），{name}: {detail}")
+        if self.on_degrade:
+            self.on_degrade(list(self.degradations))
@@ -0,0 +1,331 @@
+"""
+離線測試用的外部服務替身。
+
+設定 WHAT2EAT_FAKE_SERVICES=1 時 app.py 改用這裡的 FakeFirestore、StubGemini 與 FakeReviewSource，
+不需要 Google 憑證就能匯入並執行整條評論處理流程，供效能測試與負載測試使用。
+只實作 app.py 用到的 Firestore API，可選的延遲參數用來模擬網路往返。
+"""
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+try:
+    from google.cloud.firestore import SERVER_TIMESTAMP
+except ImportError:
+    SERVER_TIMESTAMP = object()
+
+
+def _resolve(value):
+    if value is SERVER_TIMESTAMP:
+        return datetime.now(timezone.utc)
+    return value
+
+
+class FakeSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeDocument:
+    def __init__(self, store, collection, doc_id):
+        self._store = store
+        self._collection = collection
+        self.id = doc_id
+
+    def get(self):
+        self._store._delay()
+        return self._get()
+
+    def _get(self):
+        with self._store._lock:
+            data = self._store._data.get(self._collection, {}).get(self.id)
+            return FakeSnapshot(self.id, dict(data) if data is not None else None)
+
+    def set(self, data, merge=False):
+        self._store._delay()
+        self._store._write(self._collection, self.id, data, merge)
+
+
+class FakeQuery:
+    def __init__(self, store, collection, filters=(), fields=None, after=None, limit=None):
+        self._store = store
+        self._collection = collection
+        self._filters = filters
+        self._fields = fields
+        self._after = after
+        self._limit = limit
+
+    def _copy(self, **changes):
+        options = {
+            "filters": self._filters,
+            "fields": self._fields,
+            "after": self._after,
+            "limit": self._limit,
+        }
+        options.update(changes)
+        return FakeQuery(self._store, self._collection, **options)
+
+    def where(self, field, op, value):
+        if op != "==":
+            raise NotImplementedError(f"FakeFirestore 只支援 ==，收到 {op}")
+        return self._copy(filters=self._filters + ((field.strip("`"), value),))
+
+    def select(self, field_paths):
+        return self._copy(fields=[field.strip("`") for field in field_paths])
+
+    def order_by(self, field):
+        # 文件一律依 ID 排序，只支援 cursor 分頁用的 __name__
+        if field != "__name__":
+            raise NotImplementedError(f"FakeFirestore 只支援依 __name__ 排序，收到 {field}")
+        return self
+
+    def start_after(self, values):
+        return self._copy(after=values["__name__"])
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def stream(self):
+        self._store._delay()
+        yield from self._matching()
+
+    def _matching(self):
+        with self._store._lock:
+            docs = sorted(self._store._data.get(self._collection, {}).items())
+        snapshots = []
+        for doc_id, data in docs:
+            if self._after is not None and doc_id <= self._after:
+                continue
+            if not all(data.get(field) == value for field, value in self._filters):
+                continue
+            if self._fields is not None:
+                data = {field: data[field] for field in self._fields if field in data}
+            snapshots.append(FakeSnapshot(doc_id, dict(data)))
+            if self._limit is not None and len(snapshots) >= self._limit:
+                break
+        return snapshots
+
+
+class FakeCollection(FakeQuery):
+    def document(self, doc_id=None):
+        return FakeDocument(self._store, self._collection, doc_id or uuid.uuid4().hex[:20])
+
+
+class FakeBatch:
+    def __init__(self, store):
+        self._store = store
+        self._writes = []
+
+    def set(self, doc_ref, data, merge=False):
+        self._writes.append((doc_ref, data, merge))
+
+    def commit(self):
+        self._store._delay()
+        for doc_ref, data, merge in self._writes:
+            self._store._write(doc_ref._collection, doc_ref.id, data, merge)
+        self._writes = []
+
+
+class FakeFirestore:
+    """
+    記憶體內的 Firestore 替身。
+    :param latency_ms: 每次讀寫的模擬延遲
+    """
+
+    def __init__(self, latency_ms=0):
+        self.latency_ms = latency_ms
+        self._data = {}  # collection -> {doc_id: dict}
+        self._lock = threading.Lock()
+        self.operations = 0
+
+    def _delay(self):
+        with self._lock:
+            self.operations += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+    async def _async_delay(self):
+        with self._lock:
+            self.operations += 1
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+
+    def _write(self, collection, doc_id, data, merge):
+        data = {key: _resolve(value) for key, value in data.items()}
+        with self._lock:
+            docs = self._data.setdefault(collection, {})
+            if merge and doc_id in docs:
+                docs[doc_id] = {**docs[doc_id], **data}
+            else:
+                docs[doc_id] = data
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def get_all(self, references):
+        self._delay()
+        return [reference._get() for reference in references]
+
+    def reset(self):
+        with self._lock:
+            self._data = {}
+            self.operations = 0
+
+
+class _AsyncDocument:
+    def __init__(self, document):
+        self._document = document
+
+    async def get(self):
+        await self._document._store._async_delay()
+        return self._document._get()
+
+    async def set(self, data, merge=False):
+        document = self._document
+        await document._store._async_delay()
+        document._store._write(document._collection, document.id, data, merge)
+
+
+class _AsyncQuery:
+    def __init__(self, query):
+        self._query = query
+
+    def where(self, field, op, value):
+        return _AsyncQuery(self._query.where(field, op, value))
+
+    def select(self, field_paths):
+        return _AsyncQuery(self._query.select(field_paths))
+
+    def order_by(self, field):
+        return _AsyncQuery(self._query.order_by(field))
+
+    def start_after(self, values):
+        return _AsyncQuery(self._query.start_after(values))
+
+    def limit(self, count):
+        return _AsyncQuery(self._query.limit(count))
+
+    def document(self, doc_id=None):
+        return _AsyncDocument(self._query.document(doc_id))
+
+    async def stream(self):
+        await self._query._store._async_delay()
+        for snapshot in self._query._matching():
+            yield snapshot
+
+
+class AsyncFakeFirestore:
+    """
+    與 FakeFirestore 共用資料的非同步介面，對應 firestore.AsyncClient（ASGI 模式使用）。
+    模擬延遲以 asyncio.sleep 等待，不會阻塞事件迴圈。
+    """
+
+    def __init__(self, store):
+        self._store = store
+
+    def collection(self, name):
+        return _AsyncQuery(self._store.collection(name))
+
+
+class StubGemini:
+    """
+    取代 answer_question_gemini 的 Gemini 替身。
+    篩選請求原樣回傳輸入的片段（去掉 (×n) 標記），總結請求回傳固定格式的文字。
+    :param latency_ms: 每次呼叫的模擬延遲
+    """
+
+    _SECTION = re.compile(r"original (positives|negatives|recommendations):\s*(\[.*?\])\s*$", re.S | re.M)
+    _COUNT = re.compile(r" \(×\d+\)$")
+
+    def __init__(self, latency_ms=0):
+        self.latency_ms = latency_ms
+        self.calls = 0
+
+    def __call__(self, context, question):
+        self.calls += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        sections = dict(self._SECTION.findall(question))
+        if sections:
+            return json.dumps(
+                {
+                    key: [self._COUNT.sub("", item) for item in json.loads(sections.get(key, "[]"))]
+                    for key in ("positives", "negatives", "recommendations")
+                },
+                ensure_ascii=False,
+            )
+        return "評分：4/5\n\n（離線測試用的固定總結）"
+
+
+class FakeReviewSource:
+    """
+    取代 Selenium 爬蟲的評論來源，每次都回傳同一份存下來的評論區塊 HTML。
+    :param fixture_path: 評論區塊 HTML 檔案
+    :param latency_ms: 每次爬取的模擬時間（開瀏覽器、搜尋、捲動），實際值在 ±50% 間隨機
+    """
+
+    def __init__(self, fixture_path, latency_ms=0, seed=None):
+        with open(fixture_path, "r", encoding="utf-8") as f:
+            self.html = f.read()
+        self.latency_ms = latency_ms
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def fetch(self, keyword):
+        with self._lock:
+            self.calls += 1
+            jitter = self._rng.uniform(0.5, 1.5)
+        if self.latency_ms:
+            time.sleep(self.latency_ms * jitter / 1000)
+        return self.html
+
+
+class FakeQAClient:
+    """
+    沒有 QA 模型時使用的替身，介面與 LocalQAClient 相同。
+    每個問題回傳評論中依序輪替的一個子句，可選的延遲用來模擬每則評論的推論時間。
+    """
+
+    _CLAUSE = re.compile(r"[^，,。.!！?？\n]+")
+
+    def __init__(self, latency_ms_per_review=0):
+        self.latency_ms_per_review = latency_ms_per_review
+
+    def answer(self, items, timeout=None):
+        if self.latency_ms_per_review:
+            time.sleep(self.latency_ms_per_review * len(items) / 1000)
+        results = []
+        for questions, context in items:
+            clauses = [m for m in self._CLAUSE.finditer(context) if m.group().strip()]
+            answers = []
+            for i, _ in enumerate(questions):
+                if not clauses:
+                    answers.append({"answer": "", "score": 0.0, "start": 0, "end": 0})
+                    continue
+                match = clauses[i % len(clauses)]
+                answers.append(
+                    {"answer": match.group().strip(), "score": 0.5, "start": match.start(), "end": match.end()}
+                )
+            stats = {"tokens": len(context), "windows": 1, "truncated": False}
+            results.append((answers, stats))
+        return results
+
+    def close(self):
+        pass
@@ -0,0 +1,318 @@
+"""
+/api/nearby-restaurants 的地理圖塊快取。
+
+查詢半徑向上取到 RADIUS_BUCKETS 的級距，查詢座標對齊到邊長遠小於半徑的 geohash 圖塊，
+每個（圖塊, 級距）只以圖塊中心呼叫一次 Places API，搜尋半徑為級距加上圖塊半對角線，
+能涵蓋圖塊內任一點的查詢圓，再依實際距離過濾（TTL + LRU 淘汰）。
+站得很近、半徑相近的使用者共用同一批結果；冷查詢與不快取時一樣只呼叫一次 API，
+搜尋半徑也只比查詢半徑略大，Places 依知名度回傳的前 20~60 筆大多仍在查詢範圍內。
+搜尋半徑會超過 Places API 上限時不快取，直接以查詢座標與半徑呼叫。
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from math import atan2, ceil, cos, radians, sin, sqrt
+
+from spatial_index import place_distances
+
+EARTH_RADIUS_M = 6371e3
+# Places Nearby Search 的最大半徑（米）
+PLACES_MAX_RADIUS = 50_000
+# 查詢半徑向上取到的級距，相鄰級距相差約 1.25~1.5 倍
+RADIUS_BUCKETS = (
+    100, 150, 200, 250, 300, 400, 500, 600, 800, 1000, 1200, 1500, 2000, 2500, 3000,
+    4000, 5000, 6000, 8000, 10_000, 12_000, 15_000, 20_000, 25_000, 30_000, 40_000, 50_000,
+)
+# 圖塊半對角線最多為級距的此比例，API 搜尋半徑因此最多比級距大 20%
+MAX_TILE_RATIO = 0.2
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# geohash 精度 -> (圖塊高度, 圖塊寬度)，單位為度
+_CELL_DEGREES = {}
+for _precision in range(1, 10):
+    _lng_bits = (5 * _precision + 1) // 2
+    _lat_bits = 5 * _precision // 2
+    _CELL_DEGREES[_precision] = (180.0 / 2**_lat_bits, 360.0 / 2**_lng_bits)
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """兩點之間的大圓距離（米）"""
+    phi1 = radians(lat1)
+    phi2 = radians(lat2)
+    delta_phi = radians(lat2 - lat1)
+    delta_lambda = radians(lng2 - lng1)
+    a = sin(delta_phi / 2) ** 2 + cos(phi1) * cos(phi2) * sin(delta_lambda / 2) ** 2
+    return EARTH_RADIUS_M * 2 * atan2(sqrt(a), sqrt(1 - a))
+
+
+def geohash_encode(lat, lng, precision):
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        value, value_range = (lng, lng_range) if even else (lat, lat_range)
+        mid = (value_range[0] + value_range[1]) / 2
+        if value >= mid:
+            bits = bits * 2 + 1
+            value_range[0] = mid
+        else:
+            bits = bits * 2
+            value_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars)
+
+
+def geohash_bounds(geohash):
+    """回傳 (lat_min, lat_max, lng_min, lng_max)"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = _BASE32.index(char)
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            value_range = lng_range if even else lat_range
+            mid = (value_range[0] + value_range[1]) / 2
+            if bit:
+                value_range[0] = mid
+            else:
+                value_range[1] = mid
+            even = not even
+    return lat_range[0], lat_range[1], lng_range[0], lng_range[1]
+
+
+def radius_bucket(radius):
+    """大於等於 radius 的最小級距"""
+    for bucket in RADIUS_BUCKETS:
+        if bucket >= radius:
+            return bucket
+    return RADIUS_BUCKETS[-1]
+
+
+def tile_half_diagonal(lat, precision):
+    """在緯度 lat 上 geohash 圖塊半對角線的長度（米）"""
+    cell_lat, cell_lng = _CELL_DEGREES[precision]
+    height = cell_lat * 111_000
+    width = cell_lng * 111_000 * max(cos(radians(lat)), 1e-6)
+    return sqrt(height**2 + width**2) / 2
+
+
+def plan_tile(lat, lng, radius):
+    """
+    決定查詢要使用的快取圖塊。
+    :return: (快取 key, 圖塊中心 lat, 圖塊中心 lng, API 搜尋半徑)，
+             搜尋半徑會超過 PLACES_MAX_RADIUS 時回傳 None（改為直接查詢）
+    """
+    bucket = radius_bucket(radius)
+    # 最粗（共用範圍最大）且半對角線不超過 MAX_TILE_RATIO * 級距的精度
+    for precision in range(1, 10):
+        if tile_half_diagonal(lat, precision) <= MAX_TILE_RATIO * bucket:
+            break
+    geohash = geohash_encode(lat, lng, precision)
+    lat_min, lat_max, lng_min, lng_max = geohash_bounds(geohash)
+    center_lat = (lat_min + lat_max) / 2
+    center_lng = (lng_min + lng_max) / 2
+    fetch_radius = ceil(bucket + haversine_m(center_lat, center_lng, lat_max, lng_max))
+    if bucket < radius or fetch_radius > PLACES_MAX_RADIUS:
+        return None
+    return f"{geohash}/{bucket}", center_lat, center_lng, fetch_radius
+
+
+class TileCache:
+    """以 geohash 為 key 的 TTL + LRU 快取"""
+
+    def __init__(self, max_tiles=2000, ttl_seconds=1800):
+        self.max_tiles = max_tiles
+        self.ttl_seconds = ttl_seconds
+        self._tiles = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, geohash):
+        with self._lock:
+            entry = self._tiles.get(geohash)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._tiles[geohash]
+                self.misses += 1
+                return None
+            self._tiles.move_to_end(geohash)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, geohash, places):
+        with self._lock:
+            self._tiles[geohash] = (time.monotonic() + self.ttl_seconds, places)
+            self._tiles.move_to_end(geohash)
+            while len(self._tiles) > self.max_tiles:
+                self._tiles.popitem(last=False)
+
+    def extend(self, geohash, places):
+        """將背景取得的後續分頁附加到既有圖塊，不延長有效時間"""
+        with self._lock:
+            entry = self._tiles.get(geohash)
+            if entry is not None:
+                self._tiles[geohash] = (entry[0], entry[1] + list(places))
+
+    def stats(self):
+        with self._lock:
+            return {"tiles": len(self._tiles), "hits": self.hits, "misses": self.misses}
+
+
+class NearbySearchCache:
+    """
+    以圖塊快取回答附近餐廳查詢。
+    :param fetch_places: fetch_places(lat, lng, radius, on_page) -> (第一頁 results, Future)，
+                         後續分頁在背景取得後呼叫 on_page(results)
+    :param on_fetch: 可選，每次從 API 取得圖塊資料（含後續分頁）後呼叫 on_fetch(places)
+    """
+
+    def __init__(
+        self, fetch_places, max_tiles=2000, ttl_seconds=1800, on_fetch=None
+    ):
+        self.fetch_places = fetch_places
+        self.on_fetch = on_fetch
+        self.tiles = TileCache(max_tiles=max_tiles, ttl_seconds=ttl_seconds)
+
+    def _fetch_tile(self, plan, on_more=None):
+        key, center_lat, center_lng, fetch_radius = plan
+        first_page_cached = threading.Event()
+
+        def append_page(places):
+            first_page_cached.wait()
+            self.tiles.extend(key, places)
+            if self.on_fetch:
+                self.on_fetch(places)
+            if on_more:
+                on_more(places)
+
+        places, pending = self.fetch_places(
+            center_lat, center_lng, fetch_radius, on_page=append_page
+        )
+        self.tiles.put(key, places)
+        first_page_cached.set()
+        if self.on_fetch:
+            self.on_fetch(places)
+        return places, pending
+
+    def _fetch_direct(self, lat, lng, radius, on_more=None):
+        """不經過快取，以查詢座標與半徑呼叫 API"""
+
+        def on_page(places):
+            if self.on_fetch:
+                self.on_fetch(places)
+            if on_more:
+                on_more(places)
+
+        places, pending = self.fetch_places(lat, lng, min(radius, PLACES_MAX_RADIUS), on_page=on_page)
+        if self.on_fetch:
+            self.on_fetch(places)
+        return places, pending
+
+    def _lookup(self, lat, lng, radius):
+        """回傳 (圖塊規劃或 None, 已快取的結果或 None)"""
+        plan = plan_tile(lat, lng, radius)
+        if plan is None:
+            logging.info(f"附近餐廳快取: 半徑 {radius} 米太大，直接查詢")
+            return None, None
+        places = self.tiles.get(plan[0])
+        if places is None:
+            logging.info(f"附近餐廳快取: 圖塊 {plan[0]} 未命中，以半徑 {plan[3]} 米查詢")
+        return plan, places
+
+    @staticmethod
+    def _in_radius(lat, lng, radius, places):
+        if not places:
+            return []
+        distances = place_distances(lat, lng, places)
+        return [place for place, distance in zip(places, distances) if distance <= radius]
+
+    def search(self, lat, lng, radius, on_more=None):
+        """
+        回傳距離 (lat, lng) 不超過 radius 米的 Places 結果（未排序），每次最多呼叫一次 API。
+        :param on_more: 可選，新查詢的圖塊在背景取得後續分頁時，以半徑內的新地點呼叫
+        :return: (places, pending)，pending 為尚未完成的背景分頁 Future 列表
+        """
+        plan, places = self._lookup(lat, lng, radius)
+
+        def forward_in_radius(places):
+            on_more(self._in_radius(lat, lng, radius, places))
+
+        forward = forward_in_radius if on_more else None
+        pending = []
+        if plan is None:
+            places, tile_pending = self._fetch_direct(lat, lng, radius, on_more=forward)
+            pending.append(tile_pending)
+        elif places is None:
+            places, tile_pending = self._fetch_tile(plan, on_more=forward)
+            pending.append(tile_pending)
+        return self._in_radius(lat, lng, radius, places), pending
+
+    async def _fetch_tile_async(self, fetch_places_async, plan, on_more=None):
+        key, center_lat, center_lng, fetch_radius = plan
+
+        # 後續分頁在同一個事件迴圈中執行，必定晚於下方的 put
+        def append_page(places):
+            self.tiles.extend(key, places)
+            if self.on_fetch:
+                self.on_fetch(places)
+            if on_more:
+                on_more(places)
+
+        places, pending = await fetch_places_async(
+            center_lat, center_lng, fetch_radius, on_page=append_page
+        )
+        self.tiles.put(key, places)
+        if self.on_fetch:
+            self.on_fetch(places)
+        return places, pending
+
+    async def _fetch_direct_async(self, fetch_places_async, lat, lng, radius, on_more=None):
+        def on_page(places):
+            if self.on_fetch:
+                self.on_fetch(places)
+            if on_more:
+                on_more(places)
+
+        places, pending = await fetch_places_async(
+            lat, lng, min(radius, PLACES_MAX_RADIUS), on_page=on_page
+        )
+        if self.on_fetch:
+            self.on_fetch(places)
+        return places, pending
+
+    async def search_async(self, lat, lng, radius, fetch_places_async, on_more=None):
+        """
+        search 的非同步版本（ASGI 模式使用）。
+        :param fetch_places_async: async fetch_places_async(lat, lng, radius, on_page)
+                                   -> (第一頁 results, awaitable)
+        :return: (places, pending)，pending 為尚未完成的背景分頁 task 列表
+        """
+        plan, places = self._lookup(lat, lng, radius)
+
+        def forward_in_radius(places):
+            on_more(self._in_radius(lat, lng, radius, places))
+
+        forward = forward_in_radius if on_more else None
+        pending = []
+        if plan is None:
+            places, tile_pending = await self._fetch_direct_async(
+                fetch_places_async, lat, lng, radius, on_more=forward
+            )
+            pending.append(tile_pending)
+        elif places is None:
+            places, tile_pending = await self._fetch_tile_async(
+                fetch_places_async, plan, on_more=forward
+            )
+            pending.append(tile_pending)
+        return self._in_radius(lat, lng, radius, places), pending
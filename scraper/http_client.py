@@ -0,0 +1,59 @@
+"""
+對外 HTTP 呼叫共用的連線池客戶端。
+
+所有對外的 HTTP 請求都透過同一個 requests.Session：保留 keep-alive 連線、
+限制每個 host 的連線數、設定預設 timeout，並對連線錯誤與 429 / 5xx 回應
+以指數退避重試。
+"""
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (連線 timeout, 讀取 timeout)，單位秒
+DEFAULT_TIMEOUT = (3.05, 10)
+
+
+class HttpClient:
+    """
+    :param pool_connections: 連線池快取的 host 數
+    :param pool_maxsize: 每個 host 最多保留的連線數
+    :param retries: 最多重試次數
+    :param backoff_factor: 重試間隔為 backoff_factor * 2 ** (重試次數 - 1) 秒
+    """
+
+    def __init__(
+        self,
+        pool_connections=10,
+        pool_maxsize=20,
+        retries=3,
+        backoff_factor=0.5,
+        timeout=DEFAULT_TIMEOUT,
+    ):
+        self.timeout = timeout
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=("GET", "POST"),
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=retry,
+            pool_block=True,
+        )
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, url, params=None, timeout=None, **kwargs):
+        return self.session.get(url, params=params, timeout=timeout or self.timeout, **kwargs)
+
+    def get_json(self, url, params=None, timeout=None):
+        response = self.get(url, params=params, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,167 @@
+"""
+背景爬蟲 / 分析工作的優先佇列。
+
+固定數量的 worker 線程依優先順序執行工作，同一個 key（餐廳名稱）同時只會有一個
+排隊中或執行中的工作。使用者點擊的工作以 HIGH_PRIORITY 送入，不受容量限制；
+預先分析等背景工作以 LOW_PRIORITY 送入，佇列已滿時拒絕（QueueFull）。
+已排隊的低優先工作再以高優先送入時會提前執行。
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+HIGH_PRIORITY = 0
+LOW_PRIORITY = 10
+# 保留最近完成工作的數量，供狀態查詢
+MAX_FINISHED = 1000
+
+
+class QueueFull(Exception):
+    pass
+
+
+@dataclass
+class Job:
+    key: str
+    func: object
+    args: tuple
+    priority: int
+    job_id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    status: str = "queued"  # queued / running / done / error
+    submitted_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    error: str | None = None
+    # 執行中工作所在的 worker 線程，供取樣剖析附加
+    thread_ident: int | None = None
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "key": self.key,
+            "priority": self.priority,
+            "status": self.status,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    """
+    :param num_workers: 同時執行的工作數（每個爬蟲工作會開一個瀏覽器）
+    :param capacity: 排隊中工作數上限，只限制低優先工作
+    """
+
+    def __init__(self, num_workers=2, capacity=16):
+        self.num_workers = num_workers
+        self.capacity = capacity
+        self._heap = []
+        self._counter = itertools.count()
+        self._active = {}  # key -> 排隊中或執行中的 Job
+        self._finished = OrderedDict()  # key -> 最近一次完成的 Job
+        self._queued = 0
+        self._running = 0
+        self._cond = threading.Condition()
+        self._threads = []
+        self._closed = False
+
+    def start(self):
+        for idx in range(self.num_workers):
+            thread = threading.Thread(
+                target=self._worker, name=f"job-worker-{idx}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def submit(self, key, func, args=(), priority=LOW_PRIORITY):
+        """
+        送入工作；相同 key 已在排隊或執行中時回傳既有的 Job（必要時提高優先順序）。
+        :raises QueueFull: 低優先工作且排隊數已達 capacity
+        """
+        with self._cond:
+            job = self._active.get(key)
+            if job is not None:
+                if job.status == "queued" and priority < job.priority:
+                    job.priority = priority
+                    heapq.heappush(self._heap, (priority, next(self._counter), job))
+                    self._cond.notify()
+                return job
+            if priority > HIGH_PRIORITY and self._queued >= self.capacity:
+                raise QueueFull(f"工作佇列已滿（{self.capacity}）")
+            job = Job(key=key, func=func, args=tuple(args), priority=priority)
+            self._active[key] = job
+            self._queued += 1
+            heapq.heappush(self._heap, (priority, next(self._counter), job))
+            self._cond.notify()
+            return job
+
+    def get(self, key):
+        """排隊中、執行中或最近完成的 Job，沒有則回傳 None"""
+        with self._cond:
+            return self._active.get(key) or self._finished.get(key)
+
+    def has_room(self):
+        with self._cond:
+            return self._queued < self.capacity
+
+    def stats(self):
+        with self._cond:
+            return {
+                "queued": self._queued,
+                "running": self._running,
+                "capacity": self.capacity,
+                "workers": self.num_workers,
+            }
+
+    def _next_job(self):
+        with self._cond:
+            while True:
+                while not self._heap and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return None
+                priority, _, job = heapq.heappop(self._heap)
+                # 提高優先順序後留下的舊項目
+                if job.status != "queued" or priority != job.priority:
+                    continue
+                job.status = "running"
+                job.started_at = time.time()
+                job.thread_ident = threading.get_ident()
+                self._queued -= 1
+                self._running += 1
+                return job
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            try:
+                job.func(*job.args)
+                job.status = "done"
+            except Exception as e:
+                logging.error(f"背景工作 {job.key} ({job.job_id}) 失敗: {e}")
+                job.status = "error"
+                job.error = str(e)
+            finally:
+                job.finished_at = time.time()
+                with self._cond:
+                    self._running -= 1
+                    self._active.pop(job.key, None)
+                    self._finished[job.key] = job
+                    self._finished.move_to_end(job.key)
+                    while len(self._finished) > MAX_FINISHED:
+                        self._finished.popitem(last=False)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
@@ -0,0 +1,429 @@
+"""
+分散式執行模式的持久化工作佇列（SQLite）。
+
+API 節點把工作寫進共用的 SQLite 資料庫，任意數量的 worker 進程（worker.py）以租約
+（lease）方式領取工作並定期續約（heartbeat）。worker 當機或被終止時租約會過期，工作
+重新排隊由其他 worker 接手，最多嘗試 max_attempts 次。爬取狀態也存在同一個資料庫，
+API 節點與所有 worker 看到的是同一份狀態，重新啟動 API 也不會遺失排隊中的工作。
+
+SQLite 需要所有進程能存取同一個本機檔案（同一台機器或支援檔案鎖的共用磁碟）；
+跨機器部署時可依 JobStore 的介面換成 Redis 等實作。
+
+DurableJobQueue 提供與 job_queue.JobQueue 相同的介面，app.py 依 JOB_STORE_PATH 選擇。
+"""
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections.abc import MutableMapping
+
+from job_queue import HIGH_PRIORITY, Job, QueueFull
+
+DEFAULT_LEASE_SECONDS = 60
+DEFAULT_MAX_ATTEMPTS = 3
+# 已完成的工作保留多久（秒），之後清除
+FINISHED_RETENTION = 7 * 24 * 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    key TEXT NOT NULL,
+    args TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires REAL,
+    submitted_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, priority, submitted_at);
+CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key, submitted_at);
+CREATE TABLE IF NOT EXISTS job_status (
+    key TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+def _to_job(row):
+    if row is None:
+        return None
+    return Job(
+        key=row["key"],
+        func=None,
+        args=tuple(json.loads(row["args"])),
+        priority=row["priority"],
+        job_id=row["job_id"],
+        status=row["status"],
+        submitted_at=row["submitted_at"],
+        started_at=row["started_at"],
+        finished_at=row["finished_at"],
+        error=row["error"],
+    )
+
+
+class JobStore:
+    """
+    :param path: SQLite 資料庫檔案
+    :param max_attempts: 租約過期（worker 失聯）後最多重試到第幾次
+    """
+
+    def __init__(self, path, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+
+    def _conn(self):
+        """每個線程各自的連線；isolation_level=None 以明確的 BEGIN IMMEDIATE 控制交易"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        return conn
+
+    def submit(self, key, args=(), priority=HIGH_PRIORITY, capacity=None):
+        """
+        與 JobQueue.submit 相同：同一個 key 已在排隊或執行中時回傳既有的工作（必要時提高優先順序）。
+        :raises QueueFull: 低優先工作且排隊數已達 capacity
+        """
+        conn = self._transaction()
+        try:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE key = ? AND status IN ('queued', 'running')", (key,)
+            ).fetchone()
+            if row is not None:
+                if row["status"] == "queued" and priority < row["priority"]:
+                    conn.execute("UPDATE jobs SET priority = ? WHERE job_id = ?", (priority, row["job_id"]))
+                    row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (row["job_id"],)).fetchone()
+                conn.execute("COMMIT")
+                return _to_job(row)
+            if priority > HIGH_PRIORITY and capacity is not None:
+                queued = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+                if queued >= capacity:
+                    raise QueueFull(f"工作佇列已滿（{capacity}）")
+            job_id = uuid.uuid4().hex[:12]
+            conn.execute(
+                "INSERT INTO jobs (job_id, key, args, priority, status, submitted_at) "
+                "VALUES (?, ?, ?, ?, 'queued', ?)",
+                (job_id, key, json.dumps(list(args), ensure_ascii=False), priority, time.time()),
+            )
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            conn.execute("COMMIT")
+            return _to_job(row)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def claim(self, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """領取優先順序最高的工作並取得租約，沒有工作時回傳 None；同時回收租約已過期的工作"""
+        conn = self._transaction()
+        try:
+            now = time.time()
+            self._reap(conn, now)
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY priority, submitted_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, lease_expires = ?, "
+                "attempts = attempts + 1, started_at = ? WHERE job_id = ?",
+                (worker, now + lease_seconds, now, row["job_id"]),
+            )
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (row["job_id"],)).fetchone()
+            conn.execute("COMMIT")
+            return _to_job(row)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _reap(self, conn, now):
+        expired = conn.execute(
+            "SELECT job_id, key, attempts, worker FROM jobs WHERE status = 'running' AND lease_expires < ?",
+            (now,),
+        ).fetchall()
+        for row in expired:
+            if row["attempts"] >= self.max_attempts:
+                error = f"worker {row['worker']} 失聯，已嘗試 {row['attempts']} 次"
+                conn.execute(
+                    "UPDATE jobs SET status = 'error', error = ?, finished_at = ?, worker = NULL, "
+                    "lease_expires = NULL WHERE job_id = ?",
+                    (error, now, row["job_id"]),
+                )
+                self._merge_status(conn, row["key"], {"status": "error", "error": error})
+                logging.error(f"工作 {row['key']} ({row['job_id']}) {error}")
+            else:
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', worker = NULL, lease_expires = NULL WHERE job_id = ?",
+                    (row["job_id"],),
+                )
+                logging.warning(f"worker {row['worker']} 的租約過期，工作 {row['key']} ({row['job_id']}) 重新排隊")
+
+    def heartbeat(self, job_id, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """延長租約；租約已被回收（例如暫停太久）時回傳 False"""
+        conn = self._conn()
+        cursor = conn.execute(
+            "UPDATE jobs SET lease_expires = ? WHERE job_id = ? AND worker = ? AND status = 'running'",
+            (time.time() + lease_seconds, job_id, worker),
+        )
+        return cursor.rowcount == 1
+
+    def finish(self, job_id, worker, error=None):
+        """工作結束；只有仍持有租約的 worker 能更新結果"""
+        conn = self._transaction()
+        try:
+            now = time.time()
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ?, worker = NULL, lease_expires = NULL "
+                "WHERE job_id = ? AND worker = ? AND status = 'running'",
+                ("error" if error else "done", error, now, job_id, worker),
+            )
+            conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'error') AND finished_at < ?",
+                (now - FINISHED_RETENTION,),
+            )
+            conn.execute("COMMIT")
+            return cursor.rowcount == 1
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get(self, key):
+        """key 最近一次的工作"""
+        row = self._conn().execute(
+            "SELECT * FROM jobs WHERE key = ? ORDER BY submitted_at DESC LIMIT 1", (key,)
+        ).fetchone()
+        return _to_job(row)
+
+    def counts(self):
+        rows = self._conn().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        counts = {row["status"]: row["n"] for row in rows}
+        workers = self._conn().execute(
+            "SELECT COUNT(DISTINCT worker) FROM jobs WHERE status = 'running' AND lease_expires >= ?",
+            (time.time(),),
+        ).fetchone()[0]
+        counts["active_workers"] = workers
+        return counts
+
+    def get_status(self, key):
+        row = self._conn().execute("SELECT data FROM job_status WHERE key = ?", (key,)).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def set_status(self, key, data):
+        self._conn().execute(
+            "INSERT INTO job_status (key, data, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+            (key, json.dumps(data, ensure_ascii=False), time.time()),
+        )
+
+    def update_status(self, key, fields):
+        """合併欄位到既有狀態，避免不同進程各自整份覆寫"""
+        conn = self._transaction()
+        try:
+            self._merge_status(conn, key, fields)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _merge_status(self, conn, key, fields):
+        row = conn.execute("SELECT data FROM job_status WHERE key = ?", (key,)).fetchone()
+        data = json.loads(row["data"]) if row else {}
+        data.update(fields)
+        conn.execute(
+            "INSERT INTO job_status (key, data, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+            (key, json.dumps(data, ensure_ascii=False), time.time()),
+        )
+
+    def delete_status(self, key):
+        return self._conn().execute("DELETE FROM job_status WHERE key = ?", (key,)).rowcount == 1
+
+    def status_keys(self):
+        return [row["key"] for row in self._conn().execute("SELECT key FROM job_status")]
+
+
+class _StatusEntry(dict):
+    """SharedStatus 取出的單一狀態，修改欄位時寫回資料庫"""
+
+    def __init__(self, store, key, data):
+        super().__init__(data)
+        self._store = store
+        self._key = key
+
+    def __setitem__(self, name, value):
+        super().__setitem__(name, value)
+        self._store.update_status(self._key, {name: value})
+
+    def update(self, fields=(), **kwargs):
+        """一次寫回多個欄位，只用一個交易"""
+        fields = dict(fields, **kwargs)
+        super().update(fields)
+        self._store.update_status(self._key, fields)
+
+
+class SharedStatus(MutableMapping):
+    """
+    存在 JobStore 的爬取狀態，用法與 app.scraping_status 的 dict 相同：
+    scraping_status[keyword] = {...} 整份寫入，scraping_status[keyword]["status"] = ... 更新單一欄位。
+    """
+
+    def __init__(self, store):
+        self._store = store
+
+    def __getitem__(self, key):
+        data = self._store.get_status(key)
+        if data is None:
+            raise KeyError(key)
+        return _StatusEntry(self._store, key, data)
+
+    def __setitem__(self, key, value):
+        self._store.set_status(key, dict(value))
+
+    def __delitem__(self, key):
+        if not self._store.delete_status(key):
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return self._store.get_status(key) is not None
+
+    def __iter__(self):
+        return iter(self._store.status_keys())
+
+    def __len__(self):
+        return len(self._store.status_keys())
+
+
+class DurableJobQueue:
+    """
+    介面與 JobQueue 相同的分散式工作佇列。submit 只記錄 key 與參數，工作一律由
+    領取到的 worker 以 run_job(*args) 執行（func 參數只為相容 JobQueue 而保留）。
+    :param run_job: 執行工作的函式
+    :param num_workers: 本進程內領取工作的線程數；API 節點可設為 0，只負責排入工作
+    :param capacity: 排隊中工作數上限，只限制低優先工作
+    :param poll_interval: 沒有工作時多久再查一次（秒）
+    """
+
+    def __init__(
+        self,
+        store,
+        run_job,
+        num_workers=2,
+        capacity=16,
+        lease_seconds=DEFAULT_LEASE_SECONDS,
+        poll_interval=1.0,
+    ):
+        self.store = store
+        self.run_job = run_job
+        self.num_workers = num_workers
+        self.capacity = capacity
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.node = f"{socket.gethostname()}-{os.getpid()}"
+        self._running = {}  # job_id -> (worker 名稱, 線程 ident)
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for idx in range(self.num_workers):
+            thread = threading.Thread(
+                target=self._worker, args=(f"{self.node}-{idx}",), name=f"job-worker-{idx}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        if self.num_workers:
+            thread = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def submit(self, key, func=None, args=(), priority=HIGH_PRIORITY):
+        return self.store.submit(key, args, priority, capacity=self.capacity)
+
+    def get(self, key):
+        job = self.store.get(key)
+        if job is not None:
+            with self._lock:
+                local = self._running.get(job.job_id)
+            # 只有在本進程執行的工作能附加取樣剖析
+            job.thread_ident = local[1] if local else None
+        return job
+
+    def has_room(self):
+        return self.store.counts().get("queued", 0) < self.capacity
+
+    def stats(self):
+        counts = self.store.counts()
+        with self._lock:
+            local_running = len(self._running)
+        return {
+            "queued": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "capacity": self.capacity,
+            "workers": self.num_workers,
+            "local_running": local_running,
+            "active_workers": counts["active_workers"],
+            "failed": counts.get("error", 0),
+        }
+
+    def _worker(self, worker):
+        while not self._closed.is_set():
+            try:
+                job = self.store.claim(worker, self.lease_seconds)
+            except sqlite3.Error as e:
+                logging.error(f"領取工作失敗: {e}")
+                job = None
+            if job is None:
+                self._closed.wait(self.poll_interval)
+                continue
+            with self._lock:
+                self._running[job.job_id] = (worker, threading.get_ident())
+            error = None
+            try:
+                self.run_job(*job.args)
+            except Exception as e:
+                logging.error(f"背景工作 {job.key} ({job.job_id}) 失敗: {e}")
+                error = str(e) or type(e).__name__
+            finally:
+                with self._lock:
+                    self._running.pop(job.job_id, None)
+                if not self.store.finish(job.job_id, worker, error):
+                    logging.warning(f"工作 {job.key} ({job.job_id}) 的租約已被回收，結果未寫入")
+
+    def _heartbeat(self):
+        interval = self.lease_seconds / 3
+        while not self._closed.wait(interval):
+            with self._lock:
+                running = list(self._running.items())
+            for job_id, (worker, _) in running:
+                try:
+                    if not self.store.heartbeat(job_id, worker, self.lease_seconds):
+                        logging.warning(f"工作 {job_id} 的租約已被回收，可能已由其他 worker 重新執行")
+                except sqlite3.Error as e:
+                    logging.error(f"續約工作 {job_id} 失敗: {e}")
+
+    def close(self):
+        """停止領取新工作；執行中的工作會繼續到結束"""
+        self._closed.set()
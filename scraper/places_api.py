@@ -0,0 +1,150 @@
+"""
+Google Places Nearby Search 客戶端。
+
+第一頁結果立即回傳；若有 next_page_token，後續頁面在背景線程中抓取，
+每取得一頁就呼叫 on_page(results)，讓呼叫端把結果附加到快取、索引或串流回應。
+AsyncPlacesClient 是 ASGI 模式使用的 httpx 非同步版本，後續頁面以 asyncio task 抓取。
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+DEFAULT_BASE_URL = "https://maps.googleapis.com/maps/api/place"
+# Places API 最多回傳 3 頁（60 筆）
+MAX_PAGES = 3
+# next_page_token 發出後要等一小段時間才能使用
+PAGE_TOKEN_DELAY = 2.0
+PAGE_TOKEN_RETRIES = 3
+
+
+class PlacesApiError(Exception):
+    pass
+
+
+class PlacesClient:
+    def __init__(
+        self,
+        http,
+        api_key,
+        base_url=DEFAULT_BASE_URL,
+        page_token_delay=PAGE_TOKEN_DELAY,
+        max_background_fetches=4,
+    ):
+        self.http = http
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.page_token_delay = page_token_delay
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_background_fetches, thread_name_prefix="places-pages"
+        )
+
+    def _request(self, params):
+        data = self.http.get_json(
+            f"{self.base_url}/nearbysearch/json", params={**params, "key": self.api_key}
+        )
+        status = data.get("status")
+        # 圖塊可能落在沒有餐廳的區域，ZERO_RESULTS 也是正常結果
+        if status not in ("OK", "ZERO_RESULTS"):
+            raise PlacesApiError(f"Google Places API error: {status}")
+        return data
+
+    def nearby_search(self, lat, lng, radius, place_type="restaurant", on_page=None):
+        """
+        搜尋附近地點。
+        :param on_page: 可選，背景取得後續每一頁時呼叫 on_page(results)
+        :return: (第一頁 results, Future)，Future 在所有後續頁面處理完後完成
+        """
+        data = self._request(
+            {"location": f"{lat},{lng}", "radius": radius, "type": place_type}
+        )
+        token = data.get("next_page_token")
+        if not token or on_page is None:
+            done = Future()
+            done.set_result(0)
+            return data.get("results", []), done
+        return data.get("results", []), self._executor.submit(
+            self._fetch_next_pages, token, on_page
+        )
+
+    def _fetch_next_pages(self, token, on_page):
+        """依序抓取後續頁面，回傳取得的頁數"""
+        pages = 0
+        while token and pages < MAX_PAGES - 1:
+            data = None
+            for attempt in range(PAGE_TOKEN_RETRIES):
+                time.sleep(self.page_token_delay * (attempt + 1))
+                try:
+                    data = self._request({"pagetoken": token})
+                    break
+                except Exception as e:
+                    # token 尚未生效時會回傳 INVALID_REQUEST，稍等後重試
+                    logging.info(f"Places 分頁尚未就緒，重試中: {e}")
+            if data is None:
+                logging.error("Places 分頁抓取失敗，放棄剩餘頁面")
+                break
+            pages += 1
+            on_page(data.get("results", []))
+            token = data.get("next_page_token")
+        return pages
+
+
+class AsyncPlacesClient:
+    """
+    :param http: httpx.AsyncClient
+    """
+
+    def __init__(self, http, api_key, base_url=DEFAULT_BASE_URL, page_token_delay=PAGE_TOKEN_DELAY):
+        self.http = http
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.page_token_delay = page_token_delay
+        # 保留背景 task 的參考，避免尚未完成就被回收
+        self._tasks = set()
+
+    async def _request(self, params):
+        response = await self.http.get(
+            f"{self.base_url}/nearbysearch/json", params={**params, "key": self.api_key}
+        )
+        response.raise_for_status()
+        data = response.json()
+        status = data.get("status")
+        if status not in ("OK", "ZERO_RESULTS"):
+            raise PlacesApiError(f"Google Places API error: {status}")
+        return data
+
+    async def nearby_search(self, lat, lng, radius, place_type="restaurant", on_page=None):
+        """
+        與 PlacesClient.nearby_search 相同，回傳 (第一頁 results, asyncio.Task)。
+        """
+        data = await self._request(
+            {"location": f"{lat},{lng}", "radius": radius, "type": place_type}
+        )
+        token = data.get("next_page_token")
+        if not token or on_page is None:
+            done = asyncio.get_running_loop().create_future()
+            done.set_result(0)
+            return data.get("results", []), done
+        task = asyncio.create_task(self._fetch_next_pages(token, on_page))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return data.get("results", []), task
+
+    async def _fetch_next_pages(self, token, on_page):
+        pages = 0
+        while token and pages < MAX_PAGES - 1:
+            data = None
+            for attempt in range(PAGE_TOKEN_RETRIES):
+                await asyncio.sleep(self.page_token_delay * (attempt + 1))
+                try:
+                    data = await self._request({"pagetoken": token})
+                    break
+                except Exception as e:
+                    logging.info(f"Places 分頁尚未就緒，重試中: {e}")
+            if data is None:
+                logging.error("Places 分頁抓取失敗，放棄剩餘頁面")
+                break
+            pages += 1
+            on_page(data.get("results", []))
+            token = data.get("next_page_token")
+        return pages
@@ -0,0 +1,185 @@
+"""
+附近餐廳的預先爬取與分析。
+
+/api/nearby-restaurants 回傳結果後，把最近的前 N 間餐廳交給 Prefetcher，
+由背景線程逐一檢查是否已有新鮮的分析結果（should_scrape），需要時以低優先
+送進工作佇列。整體受每段時間的預算與佇列容量限制，使用者點擊的工作永遠優先。
+
+使用者點擊時以 record_click 記錄結果是否已由預先分析準備好，用來計算命中率。
+"""
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+
+from job_queue import LOW_PRIORITY, QueueFull
+
+# 記住已預先分析過的餐廳數量，用於命中率計算
+MAX_TRACKED = 2000
+CLICK_COUNTERS = {
+    "hit": "hits",
+    "in_flight": "in_flight",
+    "already_fresh": "already_fresh",
+    "miss": "misses",
+}
+
+
+class Prefetcher:
+    """
+    :param job_queue: JobQueue
+    :param needs_scrape: needs_scrape(name) -> bool，通常是 should_scrape
+    :param run_job: run_job(name)，實際的爬取與分析工作
+    :param top_n: 每次搜尋最多預先分析的餐廳數
+    :param budget: budget_window 秒內最多送出的預先分析工作數
+    :param on_submit: 可選，送出工作時呼叫 on_submit(name)，例如初始化狀態
+    :param on_reject: 可選，on_submit 之後佇列已滿、工作沒有送出時呼叫 on_reject(name)，撤銷 on_submit 的狀態
+    """
+
+    def __init__(
+        self,
+        job_queue,
+        needs_scrape,
+        run_job,
+        top_n=5,
+        budget=20,
+        budget_window=3600,
+        on_submit=None,
+        on_reject=None,
+    ):
+        self.job_queue = job_queue
+        self.needs_scrape = needs_scrape
+        self.run_job = run_job
+        self.top_n = top_n
+        self.budget = budget
+        self.budget_window = budget_window
+        self.on_submit = on_submit
+        self.on_reject = on_reject
+        self._candidates = queue.Queue(maxsize=top_n * 10)
+        self._submitted = deque()  # 預算視窗內的送出時間
+        self._prefetched = OrderedDict()  # name -> queued / running / done / error
+        self._lock = threading.Lock()
+        self._counts = {
+            "offered": 0,
+            "submitted": 0,
+            "skipped_fresh": 0,
+            "skipped_budget": 0,
+            "skipped_queue_full": 0,
+            "clicks": 0,
+            "hits": 0,
+            "in_flight": 0,
+            "already_fresh": 0,
+            "misses": 0,
+        }
+        self._thread = threading.Thread(target=self._run, name="prefetcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def offer(self, names):
+        """交付一次搜尋結果的餐廳名稱（已依距離排序），不會阻塞請求"""
+        for name in names[: self.top_n]:
+            try:
+                self._candidates.put_nowait(name)
+            except queue.Full:
+                break
+            with self._lock:
+                self._counts["offered"] += 1
+
+    def _take_budget(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._submitted and self._submitted[0] < now - self.budget_window:
+                self._submitted.popleft()
+            if len(self._submitted) >= self.budget:
+                return False
+            self._submitted.append(now)
+            return True
+
+    def _count(self, key):
+        with self._lock:
+            self._counts[key] += 1
+
+    def _set_state(self, name, state):
+        with self._lock:
+            self._prefetched[name] = state
+            self._prefetched.move_to_end(name)
+            while len(self._prefetched) > MAX_TRACKED:
+                self._prefetched.popitem(last=False)
+
+    def _job(self, name):
+        self._set_state(name, "running")
+        try:
+            self.run_job(name)
+            self._set_state(name, "done")
+        except Exception:
+            self._set_state(name, "error")
+            raise
+
+    def _run(self):
+        while True:
+            name = self._candidates.get()
+            job = self.job_queue.get(name)
+            if job is not None and job.status in ("queued", "running"):
+                continue
+            if not self.job_queue.has_room():
+                self._count("skipped_queue_full")
+                continue
+            try:
+                if not self.needs_scrape(name):
+                    self._count("skipped_fresh")
+                    continue
+            except Exception as e:
+                logging.error(f"預先分析檢查 {name} 時發生錯誤: {e}")
+                continue
+            if not self._take_budget():
+                self._count("skipped_budget")
+                continue
+            # 狀態要在送出前設定，避免工作已開始執行後又被覆寫成 queued
+            self._set_state(name, "queued")
+            if self.on_submit:
+                self.on_submit(name)
+            try:
+                self.job_queue.submit(name, self._job, (name,), priority=LOW_PRIORITY)
+            except QueueFull:
+                with self._lock:
+                    self._prefetched.pop(name, None)
+                    # 沒有送出的工作不佔用預算
+                    self._submitted.pop()
+                if self.on_reject:
+                    self.on_reject(name)
+                self._count("skipped_queue_full")
+                continue
+            self._count("submitted")
+            logging.info(f"預先分析排入佇列: {name}")
+
+    def record_click(self, name, fresh):
+        """
+        記錄使用者點擊餐廳時的結果。
+        :param fresh: 點擊當下是否已有新鮮的分析結果（should_scrape 為 False）
+        :return: hit / in_flight / already_fresh / miss
+        """
+        with self._lock:
+            state = self._prefetched.get(name)
+            if fresh:
+                # 分散式模式下工作在其他進程執行，狀態停在 queued；已有新鮮結果即代表工作已完成
+                outcome = "hit" if state in ("queued", "running", "done") else "already_fresh"
+            elif state in ("queued", "running"):
+                outcome = "in_flight"
+            else:
+                outcome = "miss"
+            self._counts["clicks"] += 1
+            self._counts[CLICK_COUNTERS[outcome]] += 1
+            return outcome
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counts)
+            within_budget = len(self._submitted)
+        clicks = stats["clicks"]
+        stats["hit_rate"] = stats["hits"] / clicks if clicks else 0.0
+        stats["ready_rate"] = (stats["hits"] + stats["already_fresh"]) / clicks if clicks else 0.0
+        stats["budget_used"] = within_budget
+        stats["budget"] = self.budget
+        return stats
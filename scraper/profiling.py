@@ -0,0 +1,268 @@
+"""
+爬蟲 / 分析工作的按需效能剖析。
+
+管理者可以為某間餐廳的下一次工作設定剖析（arm），或對執行中的工作附加取樣剖析（attach）：
+
+- cprofile：啟用 cProfile，只能在工作開始前設定；Python 3.12 起 cProfile 是整個進程共用，
+  同時只能有一個，且會記錄所有線程。已有 cprofile 剖析在執行時改用 sample
+- sample：另一個線程每隔 interval_ms 讀取工作線程的呼叫堆疊，可附加到執行中的工作，
+  輸出 collapsed stack 格式（可用 speedscope / flamegraph.pl 開啟）
+- torch=True 時，analyze_reviews_with_qa_lora 中每次 QA 呼叫都以 torch.profiler 記錄並輸出
+  Chrome trace；QA 在 worker 進程執行（QA_WORKERS > 0）時本進程看不到推論，需設 QA_WORKERS=0
+
+結果存放在 <directory>/<job_id>/ 下，由管理 API 列出與下載。沒有任何剖析設定時，
+run() 與 qa_trace() 只檢查兩個空 dict 就直接執行，一般流程沒有額外成本。
+"""
+import contextlib
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import shutil
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from dataclasses import asdict, dataclass, field
+
+PROFILE_MODES = ("cprofile", "sample")
+# 保留最近幾次剖析結果，較舊的目錄會被刪除
+MAX_PROFILES = 50
+DEFAULT_INTERVAL_MS = 5
+
+_NOOP = contextlib.nullcontext()
+
+
+@dataclass
+class ProfileRequest:
+    mode: str = "cprofile"
+    torch: bool = False
+    interval_ms: float = DEFAULT_INTERVAL_MS
+
+
+@dataclass
+class ProfileSession:
+    job_id: str
+    key: str
+    mode: str
+    torch: bool
+    directory: str
+    status: str = "running"  # running / done
+    started_at: float = field(default_factory=time.time)
+    finished_at: float | None = None
+    samples: int = 0
+    artifacts: list = field(default_factory=list)
+    notes: list = field(default_factory=list)
+
+    def to_dict(self):
+        data = asdict(self)
+        data.pop("directory")
+        return data
+
+
+class _Sampler(threading.Thread):
+    """定期讀取目標線程的堆疊並累計次數"""
+
+    def __init__(self, thread_ident, interval_ms):
+        super().__init__(name=f"profiler-{thread_ident}", daemon=True)
+        self.thread_ident = thread_ident
+        self.interval = interval_ms / 1000
+        self.stacks = Counter()
+        self.samples = 0
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_ident)
+            if frame is None:
+                return
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class JobProfiler:
+    """
+    :param directory: 剖析結果的根目錄
+    """
+
+    def __init__(self, directory):
+        self.directory = os.path.abspath(directory)
+        self._armed = {}  # key -> ProfileRequest
+        self._sessions = {}  # 工作線程 ident -> (ProfileSession, cProfile / _Sampler)
+        self._running = {}  # 工作線程 ident -> 執行中的 job_id
+        self._history = OrderedDict()  # job_id -> ProfileSession
+        self._lock = threading.Lock()
+
+    def arm(self, key, request):
+        """下一次執行 key 的工作時開始剖析"""
+        with self._lock:
+            self._armed[key] = request
+
+    def attach(self, job_id, key, thread_ident, request):
+        """
+        對執行中的工作附加取樣剖析，工作結束時自動停止。
+        :return: ProfileSession；工作已不在該線程執行時回傳 None
+        """
+        if request.mode != "sample":
+            raise ValueError("執行中的工作只能附加 sample 剖析")
+        # 檢查與登記在同一個鎖內，工作在這之間結束時不會留下對著已重複使用的線程 ident 的取樣器
+        with self._lock:
+            if self._running.get(thread_ident) != job_id:
+                return None
+            if thread_ident in self._sessions:
+                return self._sessions[thread_ident][0]
+            return self._start(job_id, key, request, thread_ident)
+
+    def run(self, job_id, key, func, *args):
+        """在工作線程中執行 func；有設定剖析時包上對應的剖析器"""
+        thread_ident = threading.get_ident()
+        with self._lock:
+            self._running[thread_ident] = job_id
+            request = self._armed.pop(key, None) if self._armed else None
+            if request is not None:
+                try:
+                    self._start(job_id, key, request, thread_ident)
+                except Exception as e:
+                    # 剖析失敗不能影響使用者的工作
+                    logging.error(f"工作 {job_id} 開始剖析失敗: {e}")
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                del self._running[thread_ident]
+                entry = self._sessions.pop(thread_ident, None)
+            if entry is not None:
+                try:
+                    self._finish(*entry)
+                except Exception as e:
+                    logging.error(f"工作 {job_id} 剖析結果輸出失敗: {e}")
+
+    def qa_trace(self):
+        """包住一次 QA 呼叫；目前工作有開啟 torch 剖析時以 torch.profiler 記錄"""
+        if not self._sessions:
+            return _NOOP
+        entry = self._sessions.get(threading.get_ident())
+        if entry is None or not entry[0].torch:
+            return _NOOP
+        return self._torch_trace(entry[0])
+
+    def sessions(self):
+        with self._lock:
+            return [session.to_dict() for session in reversed(self._history.values())]
+
+    def armed(self):
+        with self._lock:
+            return {key: asdict(request) for key, request in self._armed.items()}
+
+    def artifact_path(self, job_id, name):
+        """回傳剖析結果檔案的路徑，不存在（或不是該工作的檔案）時回傳 None"""
+        with self._lock:
+            session = self._history.get(job_id)
+        if session is None or name not in session.artifacts:
+            return None
+        return os.path.join(session.directory, name)
+
+    def _start(self, job_id, key, request, thread_ident):
+        """開始剖析並登記到 thread_ident，呼叫端需持有 self._lock"""
+        session = ProfileSession(
+            job_id=job_id,
+            key=key,
+            mode=request.mode,
+            torch=request.torch,
+            directory=os.path.join(self.directory, job_id),
+        )
+        os.makedirs(session.directory, exist_ok=True)
+        if request.mode == "cprofile" and self._cprofile_active():
+            session.mode = "sample"
+            session.notes.append("已有其他工作在執行 cprofile 剖析，改用 sample")
+        if session.mode == "cprofile":
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError as e:
+                # 其他剖析工具（例如 debugger）已啟用
+                session.mode = "sample"
+                session.notes.append(f"無法啟用 cProfile（{e}），改用 sample")
+            else:
+                if sys.version_info >= (3, 12):
+                    session.notes.append("cProfile 為整個進程共用，結果包含其他線程的工作")
+        if session.mode == "sample":
+            profiler = _Sampler(thread_ident, request.interval_ms)
+            profiler.start()
+        self._sessions[thread_ident] = (session, profiler)
+        self._history[job_id] = session
+        while len(self._history) > MAX_PROFILES:
+            _, old = self._history.popitem(last=False)
+            shutil.rmtree(old.directory, ignore_errors=True)
+        logging.info(f"開始剖析工作 {job_id} ({key})，模式 {session.mode}，torch={request.torch}")
+        return session
+
+    def _cprofile_active(self):
+        return any(isinstance(profiler, cProfile.Profile) for _, profiler in self._sessions.values())
+
+    def _finish(self, session, profiler):
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+            profiler.dump_stats(os.path.join(session.directory, "cprofile.prof"))
+            session.artifacts.append("cprofile.prof")
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(60)
+            self._write(session, "cprofile.txt", output.getvalue())
+        else:
+            profiler.stop()
+            session.samples = profiler.samples
+            self._write(
+                session,
+                "samples.collapsed",
+                "".join(f"{stack} {count}\n" for stack, count in profiler.stacks.most_common()),
+            )
+        session.finished_at = time.time()
+        session.status = "done"
+        self._write(session, "meta.json", json.dumps(session.to_dict(), ensure_ascii=False, indent=2))
+        logging.info(
+            f"工作 {session.job_id} 剖析完成，耗時 {session.finished_at - session.started_at:.1f} 秒，"
+            f"結果: {', '.join(session.artifacts)}"
+        )
+
+    def _write(self, session, name, content):
+        with open(os.path.join(session.directory, name), "w", encoding="utf-8") as f:
+            f.write(content)
+        if name not in session.artifacts:
+            session.artifacts.append(name)
+
+    @contextlib.contextmanager
+    def _torch_trace(self, session):
+        try:
+            from torch.profiler import ProfilerActivity, profile
+            import torch
+        except ImportError:
+            if "torch 未安裝，略過 QA trace" not in session.notes:
+                session.notes.append("torch 未安裝，略過 QA trace")
+            yield
+            return
+        activities = [ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(ProfilerActivity.CUDA)
+        with profile(activities=activities, record_shapes=True) as prof:
+            yield
+        index = sum(name.startswith("qa_trace_") for name in session.artifacts)
+        name = f"qa_trace_{index}.json"
+        prof.export_chrome_trace(os.path.join(session.directory, name))
+        session.artifacts.append(name)
+        with open(os.path.join(session.directory, "qa_trace.txt"), "a", encoding="utf-8") as f:
+            f.write(f"# {name}\n")
+            f.write(prof.key_averages().table(sort_by="self_cpu_time_total", row_limit=20))
+            f.write("\n\n")
+        if "qa_trace.txt" not in session.artifacts:
+            session.artifacts.append("qa_trace.txt")
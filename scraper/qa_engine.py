@@ -0,0 +1,315 @@
+"""
+抽取式 QA 推論引擎。
+
+自行處理 tokenization、offset mapping 與答案區間解碼，計算方式與
+transformers 的 question-answering pipeline 相同（doc_stride、
+max_answer_len=15、align_to_words），模型本身則交給 runner 執行
+（PyTorch 或 ONNX Runtime）。
+
+每則評論只 tokenize 一次，切好的視窗由所有問題共用；視窗大小、重疊長度與
+每則評論最多的視窗數都可設定，並回傳每則評論的 token 數與視窗數。
+"""
+import numpy as np
+
+# ONNX 匯出時使用的輸入與輸出名稱
+ONNX_INPUT_NAMES = ["input_ids", "attention_mask", "token_type_ids"]
+ONNX_OUTPUT_NAMES = ["start_logits", "end_logits"]
+
+
+class TorchRunner:
+    """以 PyTorch 執行 QA 模型"""
+
+    def __init__(self, model):
+        self.model = model
+
+    def __call__(self, input_ids, attention_mask, token_type_ids):
+        import torch
+
+        with torch.inference_mode():
+            outputs = self.model(
+                input_ids=torch.from_numpy(input_ids),
+                attention_mask=torch.from_numpy(attention_mask),
+                token_type_ids=torch.from_numpy(token_type_ids),
+            )
+        return outputs.start_logits.numpy(), outputs.end_logits.numpy()
+
+
+class OnnxRunner:
+    """以 ONNX Runtime 執行匯出的 QA 模型"""
+
+    def __init__(self, onnx_path, num_threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(
+            onnx_path, options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def __call__(self, input_ids, attention_mask, token_type_ids):
+        feeds = {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "token_type_ids": token_type_ids,
+        }
+        feeds = {name: value for name, value in feeds.items() if name in self.input_names}
+        start_logits, end_logits = self.session.run(ONNX_OUTPUT_NAMES, feeds)
+        return start_logits, end_logits
+
+
+def select_span(start, end, p_mask, max_answer_len):
+    """
+    從單一 feature 的 logits 選出分數最高的答案區間，與 pipeline 的
+    select_starts_ends / decode_spans (top_k=1) 相同。
+    :return: (start_token, end_token, score)，沒有合法區間時回傳 None
+    """
+    desired = p_mask == 0
+    start = np.where(desired, start, -10000.0)
+    end = np.where(desired, end, -10000.0)
+
+    start = np.exp(start - start.max())
+    start = start / start.sum()
+    end = np.exp(end - end.max())
+    end = end / end.sum()
+    # CLS 不能當作答案
+    start[0] = end[0] = 0.0
+
+    outer = np.outer(start, end)
+    candidates = np.tril(np.triu(outer), max_answer_len - 1)
+    s, e = np.unravel_index(np.argmax(candidates), candidates.shape)
+    # pipeline 以 undesired_tokens.nonzero() 判斷，index 0 也會被視為合法
+    allowed = set(np.nonzero(desired)[0].tolist()) | {0}
+    if s not in allowed or e not in allowed:
+        return None
+    return int(s), int(e), float(candidates[s, e])
+
+
+class EncodedContext:
+    """一則評論 tokenize 後的結果與切好的視窗"""
+
+    def __init__(self, text, ids, offsets, word_ids, windows, total_windows):
+        self.text = text
+        self.ids = ids
+        self.offsets = offsets
+        self.word_ids = word_ids
+        # [(start_token, end_token), ...]，以評論 token 的 index 表示
+        self.windows = windows
+        self.total_windows = total_windows
+
+        # 詞 -> 字元區間，用於把答案對齊到完整的詞
+        self.word_spans = {}
+        for (char_start, char_end), word in zip(offsets, word_ids):
+            if word is None:
+                continue
+            span = self.word_spans.get(word)
+            self.word_spans[word] = (
+                (char_start, char_end) if span is None else (span[0], char_end)
+            )
+
+    def char_span(self, token_start, token_end):
+        """將評論 token 區間轉成字元區間，答案落在詞中間時擴展到整個詞"""
+        start_word = self.word_ids[token_start]
+        end_word = self.word_ids[token_end]
+        if start_word is not None and end_word is not None:
+            return self.word_spans[start_word][0], self.word_spans[end_word][1]
+        return self.offsets[token_start][0], self.offsets[token_end][1]
+
+    @property
+    def stats(self):
+        return {
+            "tokens": len(self.ids),
+            "windows": len(self.windows),
+            "truncated": len(self.windows) < self.total_windows,
+        }
+
+
+class QAEngine:
+    """
+    QA 推論引擎，模型需為 BERT 架構的輸入格式：[CLS] 問題 [SEP] 評論 [SEP]。
+    :param max_seq_len: 每個視窗（含問題與特殊 token）的最大長度
+    :param doc_stride: 相鄰視窗重疊的 token 數
+    :param max_windows: 每則評論最多推論的視窗數，超過的部分會被捨棄
+    """
+
+    def __init__(
+        self,
+        tokenizer,
+        runner,
+        max_seq_len=384,
+        doc_stride=128,
+        max_windows=4,
+        max_answer_len=15,
+        batch_size=8,
+    ):
+        self.tokenizer = tokenizer
+        self.runner = runner
+        self.max_seq_len = max_seq_len
+        self.doc_stride = doc_stride
+        self.max_windows = max_windows
+        self.max_answer_len = max_answer_len
+        self.batch_size = batch_size
+        self._question_ids = {}
+
+    def question_ids(self, question):
+        ids = self._question_ids.get(question)
+        if ids is None:
+            ids = self.tokenizer(question, add_special_tokens=False)["input_ids"]
+            self._question_ids[question] = ids
+        return ids
+
+    def encode_context(self, context, question_len):
+        """tokenize 評論並切成視窗，視窗大小依最長的問題決定，讓所有問題共用"""
+        encoded = self.tokenizer(
+            context, add_special_tokens=False, return_offsets_mapping=True
+        )
+        ids = encoded["input_ids"]
+        window_len = self.max_seq_len - question_len - 3
+        if window_len <= self.doc_stride:
+            raise ValueError(
+                f"max_seq_len={self.max_seq_len} 扣掉問題後無法容納 doc_stride={self.doc_stride}"
+            )
+
+        step = window_len - self.doc_stride
+        windows = [(0, min(window_len, len(ids)))]
+        while windows[-1][1] < len(ids):
+            start = windows[-1][0] + step
+            windows.append((start, min(start + window_len, len(ids))))
+
+        return EncodedContext(
+            context,
+            ids,
+            encoded["offset_mapping"],
+            encoded.encodings[0].word_ids,
+            windows[: self.max_windows],
+            len(windows),
+        )
+
+    def answer_reviews(self, items, batch_size=None):
+        """
+        回答多則評論的問題。
+        :param items: [(questions, context), ...]
+        :return: [(answers, stats), ...]，answers 與 questions 對應，
+                 stats 包含 tokens、windows、truncated
+        """
+        features = []  # (item_idx, question_idx, encoded, window, question_ids)
+        encoded_items = []
+        for item_idx, (questions, context) in enumerate(items):
+            question_ids = [self.question_ids(q) for q in questions]
+            question_len = max((len(ids) for ids in question_ids), default=0)
+            encoded = self.encode_context(context, question_len)
+            encoded_items.append(encoded)
+            for question_idx, ids in enumerate(question_ids):
+                for window in encoded.windows:
+                    features.append((item_idx, question_idx, encoded, window, ids))
+
+        logits = self._run_features(features, batch_size or self.batch_size)
+
+        candidates = [[{} for _ in questions] for questions, _ in items]
+        for (item_idx, question_idx, encoded, window, ids), (start, end) in zip(
+            features, logits
+        ):
+            self._collect_answer(
+                candidates[item_idx][question_idx], encoded, window, len(ids), start, end
+            )
+
+        results = []
+        for item_candidates, encoded in zip(candidates, encoded_items):
+            answers = [
+                max(c.values(), key=lambda a: a["score"]) if c else None
+                for c in item_candidates
+            ]
+            results.append((answers, encoded.stats))
+        return results
+
+    def __call__(self, question, context, batch_size=None):
+        """與 QA pipeline 相同的呼叫方式"""
+        single = isinstance(question, str)
+        questions = [question] if single else list(question)
+        if isinstance(context, str):
+            contexts = [context] * len(questions)
+        else:
+            contexts = list(context)
+
+        results = self.answer_reviews(
+            [((q,), c) for q, c in zip(questions, contexts)], batch_size
+        )
+        answers = [answers[0] for answers, _ in results]
+        return answers[0] if single else answers
+
+    def _run_features(self, features, batch_size):
+        """組出 [CLS] 問題 [SEP] 視窗 [SEP] 並依 batch_size 補齊長度後送進 runner"""
+        cls_id = self.tokenizer.cls_token_id
+        sep_id = self.tokenizer.sep_token_id
+        pad_id = self.tokenizer.pad_token_id or 0
+
+        logits = []
+        for i in range(0, len(features), batch_size):
+            batch = features[i : i + batch_size]
+            rows = []
+            for _, _, encoded, (w_start, w_end), question_ids in batch:
+                context_ids = encoded.ids[w_start:w_end]
+                rows.append(
+                    (
+                        [cls_id, *question_ids, sep_id, *context_ids, sep_id],
+                        len(question_ids) + 2,
+                    )
+                )
+            width = max(len(row) for row, _ in rows)
+
+            ids = np.full((len(rows), width), pad_id, dtype=np.int64)
+            types = np.zeros((len(rows), width), dtype=np.int64)
+            mask = np.zeros((len(rows), width), dtype=np.int64)
+            for r, (row, context_start) in enumerate(rows):
+                ids[r, : len(row)] = row
+                types[r, context_start : len(row)] = 1
+                mask[r, : len(row)] = 1
+
+            start, end = self.runner(ids, mask, types)
+            for r, (row, _) in enumerate(rows):
+                logits.append(
+                    (
+                        np.asarray(start[r, : len(row)], dtype=np.float32),
+                        np.asarray(end[r, : len(row)], dtype=np.float32),
+                    )
+                )
+        return logits
+
+    def _collect_answer(self, candidates, encoded, window, question_len, start, end):
+        """解碼單一視窗的答案；同一段文字在不同視窗出現時與 pipeline 相同取分數最高的視窗"""
+        w_start, w_end = window
+        context_start = question_len + 2
+        context_end = context_start + (w_end - w_start)
+
+        # p_mask: 非評論的 token 為 1，CLS 例外
+        p_mask = np.ones(len(start), dtype=np.int64)
+        p_mask[0] = 0
+        p_mask[context_start:context_end] = 0
+
+        span = select_span(start, end, p_mask, self.max_answer_len)
+        if span is None:
+            return
+        s, e, score = span
+
+        if context_start <= s < context_end and context_start <= e < context_end:
+            start_index, end_index = encoded.char_span(
+                s - context_start + w_start, e - context_start + w_start
+            )
+        else:
+            # 落在 CLS 上，與 pipeline 相同回傳空字串
+            start_index = end_index = 0
+
+        text = encoded.text[start_index:end_index]
+        if text in candidates:
+            if score > candidates[text]["score"]:
+                candidates[text].update(score=score, start=start_index, end=end_index)
+        else:
+            candidates[text] = {
+                "score": score,
+                "start": start_index,
+                "end": end_index,
+                "answer": text,
+            }
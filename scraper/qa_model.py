@@ -0,0 +1,114 @@
+import logging
+import os
+
+from peft import PeftConfig, PeftModel
+from transformers import AutoModelForQuestionAnswering, AutoTokenizer, pipeline
+
+# 設定QA模型路徑（請確認模型文件在此路徑下）
+DEFAULT_MODEL_PATH = r"scraper/lora_qa_model_new/lora_qa_model_new"
+# qa_onnx_export.py 匯出的 ONNX 模型與 tokenizer 目錄
+DEFAULT_ONNX_PATH = r"scraper/lora_qa_model_new/onnx"
+ONNX_MODEL_FILE = "model.onnx"
+
+# 可選的推論後端
+QA_BACKENDS = ("torch", "onnx")
+
+
+def load_lora_model(model_path=DEFAULT_MODEL_PATH):
+    """載入 base model 與 LoRA 權重，回傳 (model, tokenizer)"""
+    # 使用PEFT從LoRA模型中取config
+    logging.info("Loading PEFT config...")
+    peft_config = PeftConfig.from_pretrained(model_path)
+
+    logging.info("Loading base model and tokenizer...")
+    tokenizer = AutoTokenizer.from_pretrained(peft_config.base_model_name_or_path)
+    base_model = AutoModelForQuestionAnswering.from_pretrained(
+        peft_config.base_model_name_or_path
+    )
+
+    logging.info("Loading LoRA weights...")
+    model = PeftModel.from_pretrained(base_model, model_path)
+    model.eval()
+    return model, tokenizer
+
+
+def load_qa_pipeline(model_path=DEFAULT_MODEL_PATH):
+    """回傳 transformers 的 QA pipeline，作為 QAEngine 答案一致性的比對基準"""
+    model, tokenizer = load_lora_model(model_path)
+    logging.info("Initializing QA pipeline...")
+    return pipeline("question-answering", model=model, tokenizer=tokenizer)
+
+
+def load_torch_engine(model_path=DEFAULT_MODEL_PATH, **engine_options):
+    """以 PyTorch 執行 LoRA 模型的 QAEngine"""
+    from qa_engine import QAEngine, TorchRunner
+
+    model, tokenizer = load_lora_model(model_path)
+    return QAEngine(tokenizer, TorchRunner(model), **engine_options)
+
+
+def load_onnx_engine(onnx_path=DEFAULT_ONNX_PATH, num_threads=None, **engine_options):
+    """以 ONNX Runtime 執行匯出模型的 QAEngine"""
+    from qa_engine import OnnxRunner, QAEngine
+
+    model_file = os.path.join(onnx_path, ONNX_MODEL_FILE)
+    if not os.path.exists(model_file):
+        raise FileNotFoundError(
+            f"找不到 ONNX 模型 {model_file}，請先執行 python scraper/qa_onnx_export.py"
+        )
+
+    logging.info(f"Loading ONNX QA model from {model_file}...")
+    tokenizer = AutoTokenizer.from_pretrained(onnx_path)
+    return QAEngine(
+        tokenizer, OnnxRunner(model_file, num_threads=num_threads), **engine_options
+    )
+
+
+def load_qa_backend(
+    backend="torch",
+    model_path=DEFAULT_MODEL_PATH,
+    onnx_path=DEFAULT_ONNX_PATH,
+    num_threads=None,
+    **engine_options,
+):
+    """
+    依 backend 名稱載入 QA 推論引擎。
+    :param engine_options: 傳給 QAEngine 的參數，例如 max_seq_len、doc_stride、max_windows
+    """
+    if backend == "torch":
+        return load_torch_engine(model_path, **engine_options)
+    if backend == "onnx":
+        return load_onnx_engine(onnx_path, num_threads=num_threads, **engine_options)
+    raise ValueError(f"未知的 QA 後端: {backend}，可選: {', '.join(QA_BACKENDS)}")
+
+
+def answer_batch(qa_backend, items, batch_size=8):
+    """
+    批次回答多則評論的問題。
+    :param items: [(questions, context), ...]，每則評論可帶不同數量的問題
+    :return: [(answers, stats), ...]，answers 為該評論各問題的答案 dict，
+             stats 為該評論的 token 數與視窗數（QA pipeline 沒有此資訊時為 None）
+    """
+    if hasattr(qa_backend, "answer_reviews"):
+        return qa_backend.answer_reviews(items, batch_size=batch_size)
+
+    questions = []
+    contexts = []
+    for item_questions, context in items:
+        questions.extend(item_questions)
+        contexts.extend([context] * len(item_questions))
+
+    if not questions:
+        return [([], None) for _ in items]
+
+    answers = qa_backend(question=questions, context=contexts, batch_size=batch_size)
+    # pipeline 只有一個輸入時會直接回傳 dict
+    if isinstance(answers, dict):
+        answers = [answers]
+
+    results = []
+    offset = 0
+    for item_questions, _ in items:
+        results.append((answers[offset : offset + len(item_questions)], None))
+        offset += len(item_questions)
+    return results
@@ -0,0 +1,59 @@
+"""
+將 LoRA QA 模型合併後匯出成 ONNX，供 QA_BACKEND=onnx 使用。
+
+用法（在專案根目錄執行）:
+    python scraper/qa_onnx_export.py
+    python scraper/qa_onnx_export.py --model-path scraper/lora_qa_model_new/lora_qa_model_new --output scraper/lora_qa_model_new/onnx
+"""
+import argparse
+import logging
+import os
+
+import torch
+
+from qa_engine import ONNX_INPUT_NAMES, ONNX_OUTPUT_NAMES
+from qa_model import DEFAULT_MODEL_PATH, DEFAULT_ONNX_PATH, ONNX_MODEL_FILE, load_lora_model
+
+
+def export_onnx(model_path=DEFAULT_MODEL_PATH, output_dir=DEFAULT_ONNX_PATH, opset=14):
+    """合併 LoRA 權重並匯出 ONNX 模型與 tokenizer，回傳 ONNX 檔案路徑"""
+    model, tokenizer = load_lora_model(model_path)
+
+    logging.info("Merging LoRA weights into base model...")
+    model = model.merge_and_unload()
+    model.eval()
+    # 匯出時回傳 tuple，輸出順序為 start_logits, end_logits
+    model.config.return_dict = False
+
+    os.makedirs(output_dir, exist_ok=True)
+    onnx_path = os.path.join(output_dir, ONNX_MODEL_FILE)
+
+    sample = tokenizer("這家餐廳好吃嗎?", "牛肉麵很好吃，但服務有點慢。", return_tensors="pt")
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in ONNX_INPUT_NAMES}
+    dynamic_axes.update({name: {0: "batch", 1: "sequence"} for name in ONNX_OUTPUT_NAMES})
+
+    logging.info(f"Exporting ONNX model to {onnx_path}...")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in ONNX_INPUT_NAMES),
+            onnx_path,
+            input_names=ONNX_INPUT_NAMES,
+            output_names=ONNX_OUTPUT_NAMES,
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+        )
+    tokenizer.save_pretrained(output_dir)
+    logging.info("ONNX export completed.")
+    return onnx_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the LoRA QA model to ONNX")
+    parser.add_argument("--model-path", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--output", default=DEFAULT_ONNX_PATH)
+    parser.add_argument("--opset", type=int, default=14)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    export_onnx(args.model_path, args.output, args.opset)
@@ -0,0 +1,161 @@
+"""
+QA 前置篩選：在送進 QA 模型前，先用長度、詞庫命中與評分判斷每則評論的
+每個問題是否值得推論。像「好吃」或只有表情符號的評論，模型只會回傳
+無意義的片段或「無優點」，直接略過可以省下大量推論時間。
+"""
+import re
+from dataclasses import dataclass, field
+
+# 問題順序與 analyze_reviews_with_qa_lora 相同：優點、缺點、推薦
+QUESTION_KEYS = ("positive", "negative", "recommendation")
+
+# 去掉表情符號與標點後少於此字數的評論不做 QA
+MIN_CONTENT_CHARS = 6
+# 超過此字數的評論內容通常夠豐富，三個問題都跑
+LONG_REVIEW_CHARS = 80
+
+PRAISE_WORDS = (
+    "好吃", "美味", "好喝", "推薦", "推", "讚", "棒", "不錯", "喜歡", "滿意", "新鮮",
+    "親切", "熱情", "乾淨", "舒適", "舒服", "划算", "cp", "CP", "份量", "大份", "香",
+    "嫩", "脆", "濃", "Q彈", "用心", "快速", "氣氛", "環境", "服務好", "貼心", "值得",
+)
+COMPLAINT_WORDS = (
+    "難吃", "不好", "不佳", "差", "慢", "久", "貴", "髒", "臭", "冷掉", "太鹹", "太甜",
+    "太油", "油膩", "失望", "可惜", "普通", "雷", "態度", "敷衍", "不推", "再也", "不會再",
+    "吵", "擠", "排隊", "等", "少", "小份", "沒有", "但", "不過", "只是", "缺點", "改進",
+)
+DISH_WORDS = (
+    "麵", "飯", "粥", "湯", "鍋", "肉", "牛", "豬", "雞", "鴨", "羊", "魚", "蝦", "蟹",
+    "貝", "蛋", "菜", "餅", "包", "餃", "丼", "排", "串", "燒", "炸", "烤", "滷", "醬",
+    "披薩", "義大利", "壽司", "拉麵", "咖哩", "漢堡", "沙拉", "甜點", "蛋糕", "布丁",
+    "冰", "咖啡", "茶", "酒", "飲料", "套餐", "招牌", "必點", "點了", "推薦", "口味",
+)
+
+_CONTENT_CHAR = re.compile(r"[0-9A-Za-z㐀-鿿]")
+_RATING_NUMBER = re.compile(r"(\d+(?:\.\d+)?)")
+
+
+def parse_rating(label):
+    """將「5 顆星」之類的 aria-label 轉成數字，無法解析時回傳 None"""
+    if isinstance(label, (int, float)):
+        return float(label)
+    if not label:
+        return None
+    match = _RATING_NUMBER.search(str(label))
+    return float(match.group(1)) if match else None
+
+
+def content_length(text):
+    """計算評論中中英數字的字數，不含標點、空白與表情符號"""
+    return len(_CONTENT_CHAR.findall(text))
+
+
+def _hits(text, words):
+    return any(word in text for word in words)
+
+
+def plan_questions(review):
+    """
+    判斷一則評論的三個問題各自是否需要送進 QA 模型。
+    :return: 與 QUESTION_KEYS 對應的 tuple[bool, bool, bool]
+    """
+    text = review.get("評論", "") or ""
+    length = content_length(text)
+    if length < MIN_CONTENT_CHARS:
+        return (False, False, False)
+    if length >= LONG_REVIEW_CHARS:
+        return (True, True, True)
+
+    rating = parse_rating(review.get("評分"))
+    praise = _hits(text, PRAISE_WORDS)
+    complaint = _hits(text, COMPLAINT_WORDS)
+    dish = _hits(text, DISH_WORDS)
+
+    run_positive = praise or (rating is not None and rating >= 4)
+    run_negative = complaint or (rating is not None and rating <= 3)
+    run_recommendation = dish
+    # 沒有評分也沒有任何詞庫命中時，不確定內容就全部交給模型判斷
+    if rating is None and not (praise or complaint or dish):
+        return (True, True, True)
+    return (run_positive, run_negative, run_recommendation)
+
+
+@dataclass
+class PrefilterStats:
+    """記錄前置篩選省下的 QA 推論次數"""
+
+    reviews: int = 0
+    pairs: int = 0
+    skipped_pairs: int = 0
+    skipped_by_question: dict = field(
+        default_factory=lambda: {key: 0 for key in QUESTION_KEYS}
+    )
+
+    def record(self, plan):
+        self.reviews += 1
+        self.pairs += len(plan)
+        for key, run in zip(QUESTION_KEYS, plan):
+            if not run:
+                self.skipped_pairs += 1
+                self.skipped_by_question[key] += 1
+
+    @property
+    def saved_ratio(self):
+        return self.skipped_pairs / self.pairs if self.pairs else 0.0
+
+    def to_dict(self):
+        return {
+            "reviews": self.reviews,
+            "pairs": self.pairs,
+            "skipped_pairs": self.skipped_pairs,
+            "skipped_by_question": dict(self.skipped_by_question),
+            "saved_ratio": round(self.saved_ratio, 4),
+        }
+
+
+def select_questions(questions, plan):
+    """依 plan 挑出需要推論的問題"""
+    return tuple(q for q, run in zip(questions, plan) if run)
+
+
+def expand_answers(plan, answers):
+    """將只含推論問題的答案展開回三個位置，被略過的問題為 None"""
+    answers = iter(answers)
+    return tuple(next(answers) if run else None for run in plan)
+
+
+def evaluate_prefilter(reviews, qa_client, questions, sentinels=("無優點", "無缺點", "無推薦")):
+    """
+    在保留資料集上比較「全部推論」與「前置篩選」的結果。
+    :return: dict，包含省下的推論比例與被略過但原本有有效答案的數量
+    """
+    stats = PrefilterStats()
+    contexts = []
+    plans = []
+    for review in reviews:
+        if not review.get("評論"):
+            continue
+        plan = plan_questions(review)
+        stats.record(plan)
+        contexts.append(review["評論"])
+        plans.append(plan)
+
+    full_answers = qa_client.answer([(questions, context) for context in contexts])
+
+    changed = {key: 0 for key in QUESTION_KEYS}
+    changed_examples = []
+    for context, plan, (answers, _) in zip(contexts, plans, full_answers):
+        for key, run, answer, sentinel in zip(QUESTION_KEYS, plan, answers, sentinels):
+            # 被略過的問題若原本有有效答案，就算是結果改變
+            if not run and answer and answer["answer"] and answer["answer"] != sentinel:
+                changed[key] += 1
+                changed_examples.append((key, context, answer["answer"]))
+
+    report = stats.to_dict()
+    report["changed_answers"] = sum(changed.values())
+    report["changed_by_question"] = changed
+    report["changed_ratio"] = round(
+        report["changed_answers"] / stats.pairs if stats.pairs else 0.0, 4
+    )
+    report["changed_examples"] = changed_examples[:20]
+    return report
@@ -0,0 +1,312 @@
+"""
+QA 推論 worker pool。
+
+QA 模型原本在 Flask 進程內、由爬蟲線程直接呼叫，GIL 與 torch 的 intra-op
+線程會和 Selenium / Flask 線程互相搶 CPU。這裡改成 N 個獨立進程各自持有模型，
+每個進程綁定一部分 CPU 核心並設定對應的 torch / ONNX Runtime 線程數，透過本機的
+multiprocessing queue 接收批次請求。
+"""
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from qa_model import DEFAULT_MODEL_PATH, DEFAULT_ONNX_PATH, answer_batch, load_qa_backend
+
+# 每個請求最多包含幾則評論，超過會切成多個請求分給不同 worker
+DEFAULT_BATCH_SIZE = 8
+# answer() 預設最多等待的秒數，避免 worker 異常時爬蟲工作永遠卡住
+DEFAULT_TIMEOUT = 300
+# 每個 worker 意外結束（OOM、segfault）後最多重新啟動的次數
+MAX_RESTARTS = 3
+
+
+def available_cores():
+    """回傳目前進程可使用的 CPU 核心編號"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def partition_cores(cores, num_workers):
+    """將核心平均分給每個 worker，除不盡的核心分給前面的 worker；核心數不足時多個 worker 共用"""
+    if num_workers <= len(cores):
+        size, extra = divmod(len(cores), num_workers)
+        groups = []
+        start = 0
+        for i in range(num_workers):
+            end = start + size + (1 if i < extra else 0)
+            groups.append(cores[start:end])
+            start = end
+        return groups
+    return [[cores[i % len(cores)]] for i in range(num_workers)]
+
+
+def _worker_main(
+    worker_idx,
+    cores,
+    torch_threads,
+    backend,
+    model_path,
+    onnx_path,
+    engine_options,
+    request_queue,
+    response_queue,
+):
+    """worker 進程入口：綁定核心、載入模型，之後持續處理請求直到收到 None"""
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+
+    import torch
+
+    torch.set_num_threads(torch_threads)
+    torch.set_num_interop_threads(1)
+
+    try:
+        qa_backend = load_qa_backend(
+            backend, model_path, onnx_path, num_threads=torch_threads, **engine_options
+        )
+    except Exception as e:
+        response_queue.put(("failed", worker_idx, str(e)))
+        return
+    response_queue.put(("ready", worker_idx, None))
+
+    with torch.inference_mode():
+        while True:
+            message = request_queue.get()
+            if message is None:
+                break
+            request_id, items = message
+            # 讓 dispatcher 知道請求在哪個 worker，worker 意外結束時才能讓對應的請求失敗
+            response_queue.put(("started", request_id, worker_idx))
+            try:
+                results = answer_batch(qa_backend, items)
+                response_queue.put(("result", request_id, results))
+            except Exception as e:
+                response_queue.put(("error", request_id, str(e)))
+
+
+class LocalQAClient:
+    """在本進程內直接呼叫 QA 後端，介面與 QAWorkerPool 相同"""
+
+    def __init__(self, qa_backend):
+        self.qa_backend = qa_backend
+
+    def answer(self, items, timeout=None):
+        return answer_batch(self.qa_backend, items)
+
+    def close(self):
+        pass
+
+
+class QAWorkerPool:
+    """
+    多進程 QA 推論服務。
+    :param num_workers: worker 進程數
+    :param backend: 推論後端，torch 或 onnx
+    :param torch_threads: 每個 worker 的 torch 線程數，預設為分配到的核心數
+    :param batch_size: 每個請求最多包含的評論數
+    :param engine_options: 傳給 QAEngine 的參數，例如 max_seq_len、doc_stride、max_windows
+    """
+
+    def __init__(
+        self,
+        num_workers,
+        backend="torch",
+        model_path=DEFAULT_MODEL_PATH,
+        onnx_path=DEFAULT_ONNX_PATH,
+        torch_threads=None,
+        batch_size=DEFAULT_BATCH_SIZE,
+        engine_options=None,
+    ):
+        self.num_workers = num_workers
+        self.backend = backend
+        self.model_path = model_path
+        self.onnx_path = onnx_path
+        self.torch_threads = torch_threads
+        self.batch_size = batch_size
+        self.engine_options = engine_options or {}
+
+        # 使用 spawn，避免 fork 時複製到 Flask / Selenium 的線程狀態
+        self._ctx = mp.get_context("spawn")
+        self._request_queue = self._ctx.Queue()
+        self._response_queue = self._ctx.Queue()
+        self._processes = []
+        self._core_groups = []
+        self._restarts = []
+        # worker index -> 正在處理的 request_id
+        self._in_flight = {}
+        # 已達重新啟動上限、不再使用的 worker index
+        self._dead = set()
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._request_ids = itertools.count()
+        self._dispatcher = None
+        self._closed = False
+
+    def start(self, timeout=600):
+        """啟動所有 worker，並等待模型載入完成"""
+        self._core_groups = partition_cores(available_cores(), self.num_workers)
+        self._restarts = [0] * self.num_workers
+        for worker_idx in range(self.num_workers):
+            self._processes.append(self._spawn(worker_idx))
+
+        for _ in range(self.num_workers):
+            kind, worker_idx, error = self._response_queue.get(timeout=timeout)
+            if kind == "failed":
+                self.close()
+                raise RuntimeError(f"QA worker {worker_idx} 載入模型失敗: {error}")
+        logging.info(f"{self.num_workers} 個 QA worker 已就緒")
+
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+        return self
+
+    def _spawn(self, worker_idx):
+        cores = self._core_groups[worker_idx]
+        torch_threads = self.torch_threads or len(cores)
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(
+                worker_idx,
+                cores,
+                torch_threads,
+                self.backend,
+                self.model_path,
+                self.onnx_path,
+                self.engine_options,
+                self._request_queue,
+                self._response_queue,
+            ),
+            daemon=True,
+        )
+        process.start()
+        logging.info(
+            f"QA worker {worker_idx} 啟動，核心: {cores}，torch 線程數: {torch_threads}"
+        )
+        return process
+
+    def _dispatch(self):
+        """將 worker 回傳的結果交給對應的 Future，並檢查 worker 是否意外結束"""
+        while not self._closed:
+            try:
+                kind, request_id, payload = self._response_queue.get(timeout=1)
+            except queue.Empty:
+                self._check_workers()
+                continue
+            except (EOFError, OSError):
+                break
+            if kind == "started":
+                self._in_flight[payload] = request_id
+                continue
+            if kind in ("ready", "failed"):
+                # 重新啟動的 worker；此時 request_id 為 worker index
+                if kind == "failed":
+                    logging.error(f"QA worker {request_id} 重新啟動後載入模型失敗: {payload}")
+                continue
+            for worker_idx, in_flight in list(self._in_flight.items()):
+                if in_flight == request_id:
+                    del self._in_flight[worker_idx]
+            self._resolve(request_id, kind, payload)
+            self._check_workers()
+
+    def _resolve(self, request_id, kind, payload):
+        with self._pending_lock:
+            future = self._pending.pop(request_id, None)
+        if future is None:
+            return
+        if kind == "result":
+            future.set_result(payload)
+        else:
+            future.set_exception(RuntimeError(f"QA worker 發生錯誤: {payload}"))
+
+    def _check_workers(self):
+        """意外結束的 worker：處理中的請求直接失敗（不重送，避免同一批資料再弄垮其他 worker），再重新啟動"""
+        if self._closed:
+            return
+        for worker_idx, process in enumerate(self._processes):
+            if worker_idx in self._dead or process.is_alive():
+                continue
+            request_id = self._in_flight.pop(worker_idx, None)
+            if request_id is not None:
+                self._resolve(
+                    request_id, "error", f"worker {worker_idx} 意外結束（exit code {process.exitcode}）"
+                )
+            if self._restarts[worker_idx] >= MAX_RESTARTS:
+                logging.error(f"QA worker {worker_idx} 意外結束（exit code {process.exitcode}），已達重新啟動上限")
+                self._dead.add(worker_idx)
+                continue
+            self._restarts[worker_idx] += 1
+            logging.error(
+                f"QA worker {worker_idx} 意外結束（exit code {process.exitcode}），"
+                f"第 {self._restarts[worker_idx]} 次重新啟動"
+            )
+            self._processes[worker_idx] = self._spawn(worker_idx)
+        if len(self._dead) == len(self._processes):
+            self._fail_pending("所有 QA worker 都已結束")
+
+    def _fail_pending(self, message):
+        with self._pending_lock:
+            futures = list(self._pending.values())
+            self._pending.clear()
+        for future in futures:
+            future.set_exception(RuntimeError(message))
+
+    def submit(self, items):
+        """送出一個批次請求，回傳 Future"""
+        if self._closed:
+            raise RuntimeError("QA worker pool 已關閉")
+        if self._processes and len(self._dead) == len(self._processes):
+            raise RuntimeError("所有 QA worker 都已結束")
+        future = Future()
+        request_id = next(self._request_ids)
+        with self._pending_lock:
+            self._pending[request_id] = future
+        self._request_queue.put((request_id, list(items)))
+        return future
+
+    def answer(self, items, timeout=DEFAULT_TIMEOUT):
+        """
+        回答多則評論的問題，依 batch_size 切成多個請求平行處理。
+        :param items: [(questions, context), ...]
+        :param timeout: 整批最多等待的秒數，None 表示不限
+        :return: 與 items 對應的 [(answers, stats), ...]
+        """
+        items = list(items)
+        futures = [
+            self.submit(items[i : i + self.batch_size])
+            for i in range(0, len(items), self.batch_size)
+        ]
+        deadline = None if timeout is None else time.monotonic() + timeout
+        results = []
+        try:
+            for future in futures:
+                remaining = None if deadline is None else max(0, deadline - time.monotonic())
+                results.extend(future.result(timeout=remaining))
+        except Exception:
+            # 逾時或失敗時不再等待其餘請求的結果
+            with self._pending_lock:
+                for request_id, future in list(self._pending.items()):
+                    if future in futures:
+                        del self._pending[request_id]
+            raise
+        return results
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._processes:
+            self._request_queue.put(None)
+        for process in self._processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        with self._pending_lock:
+            for future in self._pending.values():
+                future.set_exception(RuntimeError("QA worker pool 已關閉"))
+            self._pending.clear()
@@ -0,0 +1,196 @@
+"""
+Google Maps 爬蟲的自適應速率控制。
+
+同時開啟的瀏覽器數與開啟新瀏覽器的間隔不再固定，而是依 Google 的回應調整（AIMD）：
+
+- 每個瀏覽器工作結束時回報結果：成功、頁面就緒太慢、逾時或錯誤
+- 成功且頁面在 latency_target 秒內就緒：上限每累計「目前上限」次健康的工作加 1，
+  啟動間隔減半（不低於 min_interval）
+- 逾時、錯誤或頁面就緒太慢（通常是 Google 開始限速或顯示驗證頁）：上限乘以 decrease_factor，
+  啟動間隔加倍（不超過 max_interval）；cooldown 秒內只降一次，
+  避免同一波限速讓所有同時執行的工作重複降低上限
+
+上限與最近的調整紀錄由 stats() 提供給工作狀態與 /metrics。每個進程各有一個控制器，
+分散式模式下每個 worker 進程各自調整。
+"""
+import contextlib
+import logging
+import threading
+import time
+from collections import deque
+
+# 保留最近幾次上限調整的紀錄
+MAX_DECISIONS = 20
+OUTCOMES = ("success", "slow", "timeout", "error")
+
+
+class BrowserSession:
+    """一個瀏覽器名額，工作以 page_ready() 回報頁面就緒耗時"""
+
+    def __init__(self, key, waited):
+        self.key = key
+        self.waited = waited
+        self.page_ready_seconds = None
+        self._started = time.monotonic()
+
+    def page_ready(self, seconds=None):
+        """頁面可操作時呼叫；未指定秒數時以取得名額後經過的時間計算"""
+        if seconds is None:
+            seconds = time.monotonic() - self._started
+        self.page_ready_seconds = seconds
+
+
+class RateGovernor:
+    """
+    :param max_limit: 同時開啟的瀏覽器數上限
+    :param min_limit: 退避時最少保留的瀏覽器數
+    :param initial_limit: 起始上限，預設為 min(2, max_limit)
+    :param min_interval: 健康時相鄰兩次開啟瀏覽器的最短間隔（秒）
+    :param max_interval: 退避時的最長間隔（秒）
+    :param latency_target: 頁面就緒超過此秒數視為 Google 變慢
+    :param decrease_factor: 退避時上限乘上的比例
+    :param cooldown: 兩次退避之間的最短秒數
+    :param timeout_errors: 視為逾時的例外類型（例如 selenium 的 TimeoutException）
+    :param on_decision: 可選，每次調整時呼叫 on_decision(action, cause)，cause 為 healthy 或工作結果
+    """
+
+    def __init__(
+        self,
+        max_limit,
+        min_limit=1,
+        initial_limit=None,
+        min_interval=1.0,
+        max_interval=30.0,
+        latency_target=8.0,
+        decrease_factor=0.5,
+        cooldown=10.0,
+        timeout_errors=(TimeoutError,),
+        on_decision=None,
+    ):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        initial = min(2, self.max_limit) if initial_limit is None else initial_limit
+        self._limit = float(max(self.min_limit, min(initial, self.max_limit)))
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self._interval = min_interval
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.timeout_errors = tuple(timeout_errors)
+        self.on_decision = on_decision
+        self._running = 0
+        self._waiting = 0
+        self._last_start = 0.0
+        self._last_decrease = 0.0
+        self._outcomes = dict.fromkeys(OUTCOMES, 0)
+        self._decisions = deque(maxlen=MAX_DECISIONS)
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    @contextlib.contextmanager
+    def session(self, key, on_wait=None):
+        """
+        取得一個瀏覽器名額，離開時依結果調整上限。
+        :param on_wait: 可選，需要排隊時先呼叫 on_wait(stats())，供更新工作狀態
+        """
+        session = self.acquire(key, on_wait)
+        try:
+            yield session
+        except self.timeout_errors:
+            self.release(session, "timeout")
+            raise
+        except Exception:
+            self.release(session, "error")
+            raise
+        else:
+            slow = session.page_ready_seconds is not None and session.page_ready_seconds > self.latency_target
+            self.release(session, "slow" if slow else "success")
+
+    def acquire(self, key, on_wait=None):
+        start = time.monotonic()
+        with self._cond:
+            self._waiting += 1
+            try:
+                notified = False
+                while True:
+                    now = time.monotonic()
+                    if self._running < self.limit:
+                        delay = self._last_start + self._interval - now
+                        if delay <= 0:
+                            break
+                    else:
+                        delay = None
+                    if on_wait and not notified:
+                        notified = True
+                        on_wait(self._stats())
+                    self._cond.wait(delay)
+                self._running += 1
+                self._last_start = now
+            finally:
+                self._waiting -= 1
+        return BrowserSession(key, time.monotonic() - start)
+
+    def release(self, session, outcome):
+        with self._cond:
+            self._running -= 1
+            self._outcomes[outcome] += 1
+            if outcome == "success":
+                self._increase()
+            else:
+                self._decrease(session, outcome)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return self._stats()
+
+    def outcome_counts(self):
+        with self._cond:
+            return dict(self._outcomes)
+
+    def _increase(self):
+        before = self.limit
+        self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+        self._interval = max(self.min_interval, self._interval / 2)
+        if self.limit != before:
+            self._record("increase", "healthy", f"{before} 個瀏覽器的工作皆健康")
+
+    def _decrease(self, session, outcome):
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self._limit = max(self.min_limit, self._limit * self.decrease_factor)
+        self._interval = min(self.max_interval, max(self.min_interval, self._interval * 2, 1.0))
+        reason = outcome
+        if outcome == "slow":
+            reason = f"slow ({session.page_ready_seconds:.1f}s > {self.latency_target:g}s)"
+        self._record("decrease", outcome, f"{session.key}: {reason}")
+
+    def _record(self, action, cause, reason):
+        decision = {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "action": action,
+            "reason": reason,
+            "limit": self.limit,
+            "start_interval": round(self._interval, 2),
+        }
+        self._decisions.append(decision)
+        logging.info(f"瀏覽器上限 {action} -> {self.limit}，啟動間隔 {self._interval:.1f} 秒（{reason}）")
+        if self.on_decision:
+            self.on_decision(action, cause)
+
+    def _stats(self):
+        return {
+            "limit": self.limit,
+            "max_limit": self.max_limit,
+            "running": self._running,
+            "waiting": self._waiting,
+            "start_interval": round(self._interval, 2),
+            "outcomes": dict(self._outcomes),
+            "decisions": list(self._decisions),
+        }
@@ -0,0 +1,90 @@
+"""
+每間餐廳評分的累計統計。
+
+匯入評論時把「5 顆星」之類的評分字串轉成數字，併入分析文件上的「評分統計」：
+評分數、平均、1~5 星分布與最近匯入幾則的平均。結果頁讀取 /api/reviews/<keyword>_analysis
+就能取得平均與評論數，不需要下載全部評論自行計算。
+"""
+import re
+from datetime import datetime
+
+from qa_prefilter import parse_rating
+
+# 近期平均採計最近匯入的幾則評分
+RECENT_WINDOW = 50
+STARS = ("1", "2", "3", "4", "5")
+_RELATIVE_TIME = re.compile(r"(\d+|一|兩)\s*(分鐘|小時|天|週|個月|年)前")
+_UNIT_DAYS = {"分鐘": 1 / 1440, "小時": 1 / 24, "天": 1, "週": 7, "個月": 30, "年": 365}
+
+
+def review_age_days(text, now=None):
+    """
+    評論時間換算成距今的天數：Google 的「3 個月前」、「1 週前」或 2024-01-31 格式，無法解析時回傳 None。
+    """
+    if not text:
+        return None
+    match = _RELATIVE_TIME.search(text)
+    if match:
+        amount = {"一": 1, "兩": 2}.get(match.group(1)) or int(match.group(1))
+        return amount * _UNIT_DAYS[match.group(2)]
+    try:
+        date = datetime.strptime(text.strip(), "%Y-%m-%d")
+    except ValueError:
+        return None
+    return max(0.0, ((now or datetime.now()) - date).total_seconds() / 86400)
+
+
+def empty_stats():
+    return {
+        "count": 0,
+        "sum": 0.0,
+        "mean": None,
+        "histogram": dict.fromkeys(STARS, 0),
+        "unrated": 0,
+        "recent": [],
+        "recent_mean": None,
+    }
+
+
+def merge_ratings(stats, labels, times=None, recent_window=RECENT_WINDOW):
+    """
+    將一批評分併入累計統計，回傳新的 dict，不修改傳入的 stats。
+    近期平均取這批評分中最新的放在先前的近期評分前面：有 times 時依評論時間由新到舊排序
+    （爬蟲預設依關聯性排序，不是時間順序），無法解析的時間排在最後；沒有 times 時沿用 labels 的順序。
+    :param stats: 先前的統計，None 表示還沒有
+    :param labels: 新匯入評論的「評分」欄位
+    :param times: 可選，與 labels 對應的評論時間（「3 個月前」或 2024-01-31）
+    """
+    base = empty_stats()
+    if stats:
+        base.update(stats)
+        base["histogram"] = {**empty_stats()["histogram"], **stats.get("histogram", {})}
+    labels = list(labels)
+    if times is not None:
+        ages = [review_age_days(text) for text in times]
+        order = sorted(range(len(labels)), key=lambda i: (ages[i] is None, ages[i] or 0.0, i))
+        labels = [labels[i] for i in order]
+    ratings = []
+    for label in labels:
+        rating = parse_rating(label)
+        if rating is None:
+            base["unrated"] += 1
+            continue
+        ratings.append(rating)
+        star = str(min(5, max(1, int(rating + 0.5))))
+        base["histogram"][star] += 1
+    base["count"] += len(ratings)
+    base["sum"] += sum(ratings)
+    base["mean"] = round(base["sum"] / base["count"], 3) if base["count"] else None
+    base["recent"] = (ratings + list(base["recent"]))[:recent_window]
+    base["recent_mean"] = round(sum(base["recent"]) / len(base["recent"]), 3) if base["recent"] else None
+    return base
+
+
+def public_stats(stats):
+    """API 回傳的統計，以近期評分數取代近期評分列表"""
+    if not stats:
+        return None
+    data = {key: value for key, value in stats.items() if key not in ("sum", "recent")}
+    data["recent_count"] = len(stats.get("recent", []))
+    return data
@@ -0,0 +1,99 @@
+"""
+Google Maps 評論區塊的 HTML 解析。
+
+爬蟲展開所有「更多」按鈕後，一次取出評論區塊的 outerHTML 在本機解析，
+不再對每則評論的每個欄位各做一次 WebDriver 往返；離線效能測試也用同一個
+解析器重播存下來的 HTML。欄位對應的 CSS class 與原本的 Selenium selector 相同。
+"""
+from html.parser import HTMLParser
+
+REVIEW_CLASSES = {"jftiEf", "fontBodyMedium"}  # div.jftiEf.fontBodyMedium
+REVIEWER_CLASS = "d4r55"  # div.d4r55
+RATING_CLASS = "kvMYJc"  # span.kvMYJc[aria-label]
+COMMENT_CLASS = "wiI7pd"  # span.wiI7pd
+TIME_CLASS = "rsqaWe"  # span.rsqaWe
+
+_VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr",
+}
+_TEXT_FIELDS = {
+    ("div", REVIEWER_CLASS): "reviewer",
+    ("span", COMMENT_CLASS): "comment",
+    ("span", TIME_CLASS): "time",
+}
+
+
+class _ReviewHTMLParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.reviews = []
+        self._depth = 0
+        self._review_depth = None
+        self._current = None
+        self._field = None  # (欄位名稱, 開始的深度)
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "br" and self._field:
+            self._text.append("\n")
+        if tag in _VOID_TAGS:
+            return
+        self._depth += 1
+        attrs = dict(attrs)
+        classes = set((attrs.get("class") or "").split())
+
+        if self._review_depth is None:
+            if tag == "div" and REVIEW_CLASSES <= classes:
+                self._review_depth = self._depth
+                self._current = {}
+            return
+
+        if tag == "span" and RATING_CLASS in classes and "rating" not in self._current:
+            self._current["rating"] = attrs.get("aria-label")
+        if self._field is None:
+            for (field_tag, field_class), name in _TEXT_FIELDS.items():
+                # 與 find_element 相同，只取每個欄位第一個符合的元素
+                if tag == field_tag and field_class in classes and name not in self._current:
+                    self._field = (name, self._depth)
+                    self._text = []
+                    break
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in _VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_data(self, data):
+        if self._field:
+            self._text.append(data)
+
+    def handle_endtag(self, tag):
+        if tag in _VOID_TAGS:
+            return
+        if self._field and self._field[1] == self._depth:
+            self._current[self._field[0]] = "".join(self._text).strip()
+            self._field = None
+        if self._review_depth == self._depth:
+            self.reviews.append(self._current)
+            self._review_depth = None
+            self._current = None
+        self._depth -= 1
+
+
+def parse_reviews_html(html):
+    """
+    解析包含多則評論的 HTML。
+    :return: [{"reviewer", "rating", "comment", "time"}, ...]，缺少的欄位為 None
+    """
+    parser = _ReviewHTMLParser()
+    parser.feed(html)
+    parser.close()
+    return [
+        {
+            "reviewer": review.get("reviewer"),
+            "rating": review.get("rating"),
+            "comment": review.get("comment"),
+            "time": review.get("time"),
+        }
+        for review in parser.reviews
+    ]
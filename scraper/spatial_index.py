@@ -0,0 +1,148 @@
+"""
+餐廳座標的向量化距離計算與本機空間索引。
+
+haversine_many 以 NumPy 一次計算一個點到多個地點的距離；RestaurantIndex
+以固定大小的經緯度網格索引所有已取得的餐廳，半徑查詢與 k 近鄰查詢只需要
+檢查附近幾個網格，不必呼叫 Places API。
+"""
+import threading
+from math import cos, radians
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371e3
+# 網格大小約 1.1 公里
+DEFAULT_CELL_DEGREES = 0.01
+
+
+def haversine_many(lat, lng, lats, lngs):
+    """(lat, lng) 到 lats/lngs 陣列中每個點的距離（米），回傳 numpy 陣列"""
+    phi1 = np.radians(lat)
+    phi2 = np.radians(np.asarray(lats, dtype=np.float64))
+    delta_phi = phi2 - phi1
+    delta_lambda = np.radians(np.asarray(lngs, dtype=np.float64) - lng)
+    a = np.sin(delta_phi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(delta_lambda / 2) ** 2
+    return EARTH_RADIUS_M * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def place_distances(lat, lng, places):
+    """Places API 結果到 (lat, lng) 的距離陣列"""
+    lats = np.fromiter(
+        (p["geometry"]["location"]["lat"] for p in places), dtype=np.float64, count=len(places)
+    )
+    lngs = np.fromiter(
+        (p["geometry"]["location"]["lng"] for p in places), dtype=np.float64, count=len(places)
+    )
+    return haversine_many(lat, lng, lats, lngs)
+
+
+def sort_by_distance(lat, lng, places):
+    """依距離由近到遠排序，回傳 [(place, distance_m), ...]"""
+    if not places:
+        return []
+    distances = place_distances(lat, lng, places)
+    return [(places[i], float(distances[i])) for i in np.argsort(distances, kind="stable")]
+
+
+class RestaurantIndex:
+    """
+    以經緯度網格索引的餐廳集合，以 place_id 去重。
+    :param cell_degrees: 網格邊長（度）
+    """
+
+    def __init__(self, cell_degrees=DEFAULT_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self._lock = threading.Lock()
+        self._places = []
+        self._positions = {}  # place_id -> index
+        self._lats = []
+        self._lngs = []
+        self._cells = {}  # (row, col) -> [index, ...]
+        self._lat_array = np.empty(0)
+        self._lng_array = np.empty(0)
+        self._cell_arrays = {}
+        self._dirty = False
+
+    def __len__(self):
+        return len(self._places)
+
+    def _cell(self, lat, lng):
+        return int(np.floor(lat / self.cell_degrees)), int(np.floor(lng / self.cell_degrees))
+
+    def add(self, places):
+        """加入或更新 Places API 格式的地點"""
+        with self._lock:
+            for place in places:
+                location = place["geometry"]["location"]
+                position = self._positions.get(place["place_id"])
+                if position is not None:
+                    # 已知的地點只更新資料，座標不變
+                    self._places[position] = place
+                    continue
+                position = len(self._places)
+                self._positions[place["place_id"]] = position
+                self._places.append(place)
+                self._lats.append(location["lat"])
+                self._lngs.append(location["lng"])
+                self._cells.setdefault(self._cell(location["lat"], location["lng"]), []).append(
+                    position
+                )
+                self._dirty = True
+
+    def _snapshot(self):
+        """查詢用的 numpy 陣列，只在有新地點時重建"""
+        with self._lock:
+            if self._dirty:
+                self._lat_array = np.array(self._lats, dtype=np.float64)
+                self._lng_array = np.array(self._lngs, dtype=np.float64)
+                self._cell_arrays = {
+                    cell: np.array(indices, dtype=np.int64) for cell, indices in self._cells.items()
+                }
+                self._dirty = False
+            return self._places, self._lat_array, self._lng_array, self._cell_arrays
+
+    def _candidates(self, cell_arrays, lat, lng, radius):
+        """涵蓋半徑範圍的網格內所有地點 index"""
+        delta_lat = radius / 111_000
+        delta_lng = radius / (111_000 * max(cos(radians(lat)), 1e-6))
+        row_min, col_min = self._cell(lat - delta_lat, lng - delta_lng)
+        row_max, col_max = self._cell(lat + delta_lat, lng + delta_lng)
+        chunks = [
+            cell_arrays[(row, col)]
+            for row in range(row_min, row_max + 1)
+            for col in range(col_min, col_max + 1)
+            if (row, col) in cell_arrays
+        ]
+        if not chunks:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(chunks)
+
+    def radius_query(self, lat, lng, radius, limit=None):
+        """
+        半徑內的地點，依距離由近到遠排序。
+        :return: [(place, distance_m), ...]
+        """
+        places, lats, lngs, cell_arrays = self._snapshot()
+        candidates = self._candidates(cell_arrays, lat, lng, radius)
+        if len(candidates) == 0:
+            return []
+        distances = haversine_many(lat, lng, lats[candidates], lngs[candidates])
+        inside = distances <= radius
+        candidates = candidates[inside]
+        distances = distances[inside]
+        order = np.argsort(distances, kind="stable")
+        if limit is not None:
+            order = order[:limit]
+        return [(places[candidates[i]], float(distances[i])) for i in order]
+
+    def nearest(self, lat, lng, k, max_radius=50_000):
+        """
+        最近的 k 個地點，由一個網格（不超過 max_radius）開始逐步擴大搜尋範圍。
+        :return: [(place, distance_m), ...]，距離皆不超過 max_radius
+        """
+        radius = min(self.cell_degrees * 111_000, max_radius)
+        while True:
+            results = self.radius_query(lat, lng, radius, limit=k)
+            if len(results) >= k or radius >= max_radius or len(results) == len(self):
+                return results
+            radius = min(radius * 2, max_radius)
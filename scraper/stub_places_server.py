@@ -0,0 +1,183 @@
+"""
+本機測試用的 Places Nearby Search 假伺服器。
+
+以查詢座標為種子產生固定的假餐廳，每頁 20 筆、最多 3 頁，並模擬
+next_page_token 需要等一段時間才生效、回應延遲與隨機 5xx 錯誤。
+將 PLACES_API_BASE_URL 設為 http://127.0.0.1:<port> 即可讓後端改打這個伺服器。
+
+用法:
+    python scraper/stub_places_server.py --port 8765 --latency-ms 80 --total 60
+"""
+import argparse
+import json
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PAGE_SIZE = 20
+
+
+def synthetic_results(lat, lng, radius, total):
+    """以 (lat, lng, radius) 為種子，在半徑內產生 total 個固定的假地點"""
+    rng = random.Random(f"{lat:.6f},{lng:.6f},{radius}")
+    results = []
+    for i in range(total):
+        delta_lat = rng.uniform(-1, 1) * radius / 111_000 * 0.7
+        delta_lng = rng.uniform(-1, 1) * radius / 111_000 * 0.7
+        place_lat = round(lat + delta_lat, 6)
+        place_lng = round(lng + delta_lng, 6)
+        results.append({
+            "place_id": f"stub-{place_lat:.6f}-{place_lng:.6f}",
+            "name": f"測試餐廳 {i}",
+            "vicinity": f"測試路 {i} 號",
+            "geometry": {"location": {"lat": place_lat, "lng": place_lng}},
+        })
+    return results
+
+
+class StubPlaces:
+    """
+    :param total: 每次搜尋的地點總數（最多 60）
+    :param latency_ms: 每個請求的延遲
+    :param failure_rate: 回傳 HTTP 503 的機率
+    :param token_delay: next_page_token 發出後多少秒才生效
+    :param fail_first: 前幾個請求固定回傳 HTTP 503（測試重試用）
+    :param stall_first: 前幾個請求（在 fail_first 之後）延遲 stall_seconds 秒才回應，模擬逾時
+    """
+
+    def __init__(
+        self,
+        total=60,
+        latency_ms=0,
+        failure_rate=0.0,
+        token_delay=0.0,
+        seed=0,
+        fail_first=0,
+        stall_first=0,
+        stall_seconds=1.0,
+    ):
+        self.total = min(total, PAGE_SIZE * 3)
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self.token_delay = token_delay
+        self.fail_first = fail_first
+        self.stall_first = stall_first
+        self.stall_seconds = stall_seconds
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._pages = {}  # token -> (生效時間, results, 下一頁 token)
+        self.requests = 0
+
+    def _paginate(self, results):
+        """切成每頁 20 筆，回傳第一頁與 token"""
+        pages = [results[i:i + PAGE_SIZE] for i in range(0, len(results), PAGE_SIZE)] or [[]]
+        token = None
+        with self._lock:
+            for page_no in range(len(pages) - 1, 0, -1):
+                next_token = f"token-{len(self._pages)}-{page_no}"
+                self._pages[next_token] = (time.monotonic() + self.token_delay, pages[page_no], token)
+                token = next_token
+        return pages[0], token
+
+    def handle(self, params):
+        """回傳 (HTTP 狀態碼, JSON 內容)"""
+        with self._lock:
+            self.requests += 1
+            fail = self.requests <= self.fail_first or self._rng.random() < self.failure_rate
+            stall = self.fail_first < self.requests <= self.fail_first + self.stall_first
+        if stall:
+            time.sleep(self.stall_seconds)
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        if fail:
+            return 503, {"status": "UNKNOWN_ERROR"}
+
+        token = params.get("pagetoken")
+        if token:
+            with self._lock:
+                entry = self._pages.get(token)
+            if entry is None or entry[0] > time.monotonic():
+                return 200, {"status": "INVALID_REQUEST", "results": []}
+            _, results, next_token = entry
+        else:
+            try:
+                lat, lng = (float(x) for x in params["location"].split(","))
+                radius = int(float(params.get("radius", 1500)))
+            except (KeyError, ValueError):
+                return 200, {"status": "INVALID_REQUEST", "results": []}
+            results, next_token = self._paginate(
+                synthetic_results(lat, lng, radius, self.total)
+            )
+
+        body = {"status": "OK" if results else "ZERO_RESULTS", "results": results}
+        if next_token:
+            body["next_page_token"] = next_token
+        return 200, body
+
+
+def make_server(stub, host="127.0.0.1", port=0):
+    """建立 HTTP/1.1（keep-alive）伺服器，port=0 時自動選擇可用埠"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            # keep-alive 連線下避免標頭與內容分開送出時被 delayed ACK 拖慢
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if not url.path.endswith("/nearbysearch/json"):
+                self.send_error(404)
+                return
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+            status, body = stub.handle(params)
+            payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_thread(stub, host="127.0.0.1", port=0):
+    """在背景線程啟動伺服器，回傳 (server, base_url)"""
+    server = make_server(stub, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub Places Nearby Search server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--total", type=int, default=60)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--token-delay", type=float, default=2.0)
+    args = parser.parse_args()
+
+    stub = StubPlaces(
+        total=args.total,
+        latency_ms=args.latency_ms,
+        failure_rate=args.failure_rate,
+        token_delay=args.token_delay,
+    )
+    server = make_server(stub, args.host, args.port)
+    print(f"Stub Places API: http://{args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
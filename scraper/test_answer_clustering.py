@@ -0,0 +1,30 @@
+from answer_clustering import cluster_phrases, final_char
+
+
+def texts(clusters):
+    return [cluster["text"] for cluster in clusters]
+
+
+def test_near_duplicates_merge():
+    clusters = cluster_phrases(["服務很好", "服務很好！", "服務很好喔", "服務很好", "店員的服務很好", "店員服務很好"])
+    assert texts(clusters) == ["服務很好", "店員服務很好"]
+    assert [cluster["count"] for cluster in clusters] == [4, 2]
+
+
+def test_distinct_dishes_stay_apart():
+    dishes = ["紅燒牛肉麵", "紅燒牛肉飯", "紅燒牛肉湯", "紅燒牛肉餃", "牛肉麵", "牛肉湯麵"]
+    clusters = cluster_phrases(dishes + ["紅燒牛肉麵喔", "推紅燒牛肉麵"])
+    assert texts(clusters) == dishes
+    assert clusters[0]["count"] == 3
+
+
+def test_no_transitive_chaining():
+    # 「紅燒牛肉麵」加入代表「招牌紅燒牛肉麵」的群；「紅燒牛肉湯麵」只與「紅燒牛肉麵」相似，不會被串進來
+    clusters = cluster_phrases(["招牌紅燒牛肉麵", "招牌紅燒牛肉麵", "紅燒牛肉麵", "紅燒牛肉湯麵"])
+    assert texts(clusters) == ["招牌紅燒牛肉麵", "紅燒牛肉湯麵"]
+    assert [cluster["count"] for cluster in clusters] == [3, 1]
+
+
+def test_final_char_ignores_particles():
+    assert final_char("紅燒牛肉麵喔") == "麵"
+    assert final_char("喔") == "喔"
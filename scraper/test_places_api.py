@@ -0,0 +1,106 @@
+import asyncio
+
+import httpx
+import pytest
+import requests
+
+from http_client import HttpClient
+from places_api import AsyncPlacesClient, PlacesApiError, PlacesClient
+from stub_places_server import StubPlaces, start_in_thread
+
+
+@pytest.fixture
+def stub_server():
+    servers = []
+
+    def start(**options):
+        stub = StubPlaces(**options)
+        server, base_url = start_in_thread(stub)
+        servers.append(server)
+        return stub, base_url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def place_ids(results):
+    return {place["place_id"] for place in results}
+
+
+def test_nearby_search_collects_all_pages(stub_server):
+    stub, base_url = stub_server(total=60)
+    client = PlacesClient(HttpClient(), "key", base_url=base_url, page_token_delay=0.01)
+    pages = []
+    first, done = client.nearby_search(25.04, 121.56, 1500, on_page=pages.append)
+    assert done.result(timeout=5) == 2
+    assert [len(page) for page in pages] == [20, 20]
+    assert len(place_ids(first) | place_ids(pages[0]) | place_ids(pages[1])) == 60
+    assert stub.requests == 3
+
+
+def test_nearby_search_waits_for_page_token(stub_server):
+    # token 0.1 秒後才生效：第一次（0.05 秒後）回傳 INVALID_REQUEST，第二次（再等 0.1 秒）成功
+    stub, base_url = stub_server(total=40, token_delay=0.1)
+    client = PlacesClient(HttpClient(), "key", base_url=base_url, page_token_delay=0.05)
+    pages = []
+    first, done = client.nearby_search(25.04, 121.56, 1500, on_page=pages.append)
+    assert done.result(timeout=5) == 1
+    assert len(first) == 20 and [len(page) for page in pages] == [20]
+    assert stub.requests == 3
+
+
+def test_nearby_search_without_on_page_skips_next_pages(stub_server):
+    stub, base_url = stub_server(total=60)
+    client = PlacesClient(HttpClient(), "key", base_url=base_url, page_token_delay=0.01)
+    first, done = client.nearby_search(25.04, 121.56, 1500)
+    assert len(first) == 20 and done.result() == 0
+    assert stub.requests == 1
+
+
+def test_http_client_retries_5xx(stub_server):
+    stub, base_url = stub_server(total=5, fail_first=2)
+    http = HttpClient(retries=3, backoff_factor=0.01)
+    results, _ = PlacesClient(http, "key", base_url=base_url).nearby_search(25.04, 121.56, 1500)
+    assert len(results) == 5
+    assert stub.requests == 3
+
+
+def test_http_client_gives_up_after_retries(stub_server):
+    stub, base_url = stub_server(total=5, fail_first=10)
+    http = HttpClient(retries=2, backoff_factor=0.01)
+    with pytest.raises(requests.exceptions.RetryError):
+        http.get_json(f"{base_url}/nearbysearch/json", params={"location": "25.04,121.56"})
+    assert stub.requests == 3
+
+
+def test_http_client_retries_timeouts(stub_server):
+    stub, base_url = stub_server(total=5, stall_first=1, stall_seconds=0.5)
+    http = HttpClient(retries=2, backoff_factor=0.01, timeout=(1, 0.2))
+    data = http.get_json(f"{base_url}/nearbysearch/json", params={"location": "25.04,121.56"})
+    assert len(data["results"]) == 5
+    assert stub.requests == 2
+
+
+def test_places_error_status_is_raised(stub_server):
+    _, base_url = stub_server()
+    client = PlacesClient(HttpClient(), "key", base_url=base_url)
+    with pytest.raises(PlacesApiError):
+        # 沒有 location 參數時假伺服器回傳 INVALID_REQUEST
+        client._request({"radius": 1500})
+
+
+def test_async_nearby_search_collects_all_pages(stub_server):
+    stub, base_url = stub_server(total=60, token_delay=0.02)
+
+    async def search():
+        async with httpx.AsyncClient() as http:
+            client = AsyncPlacesClient(http, "key", base_url=base_url, page_token_delay=0.01)
+            pages = []
+            first, task = await client.nearby_search(25.04, 121.56, 1500, on_page=pages.append)
+            return first, await asyncio.wait_for(task, 5), pages
+
+    first, fetched, pages = asyncio.run(search())
+    assert fetched == 2
+    assert len(place_ids(first) | place_ids(pages[0]) | place_ids(pages[1])) == 60
@@ -0,0 +1,27 @@
+from datetime import datetime
+
+from rating_stats import merge_ratings, review_age_days
+
+
+def test_review_age_days():
+    assert review_age_days("3 個月前") == 90
+    assert review_age_days("一週前") == 7
+    assert review_age_days("2024-01-31", now=datetime(2024, 2, 10)) == 10
+    assert review_age_days("很久以前") is None
+    assert review_age_days(None) is None
+
+
+def test_recent_window_uses_newest_reviews():
+    labels = ["1 顆星", "5 顆星", "4 顆星", "2 顆星"]
+    times = ["2 年前", "3 天前", None, "1 個月前"]
+    stats = merge_ratings(None, labels, times, recent_window=2)
+    assert stats["recent"] == [5.0, 2.0]
+    assert stats["count"] == 4
+    assert stats["histogram"] == {"1": 1, "2": 1, "3": 0, "4": 1, "5": 1}
+
+
+def test_new_batch_goes_before_previous_recent():
+    stats = merge_ratings(None, ["3 顆星"], ["1 年前"])
+    stats = merge_ratings(stats, ["5 顆星", "4 顆星"], ["2 個月前", "1 天前"], recent_window=2)
+    assert stats["recent"] == [4.0, 5.0]
+    assert stats["mean"] == 4.0
@@ -0,0 +1,58 @@
+"""
+分散式執行模式的 worker 進程。
+
+從 JOB_STORE_PATH 指定的共用工作佇列領取爬蟲 / 分析工作並執行，可在多台機器或同一台機器
+啟動多個。API 節點以相同的 JOB_STORE_PATH 啟動（可設 SCRAPE_WORKERS=0 只負責排入工作）。
+
+收到 SIGTERM / SIGINT 時停止領取新工作，等執行中的工作完成（最多 --drain-timeout 秒）後結束；
+來不及完成的工作租約過期後會由其他 worker 重新執行。
+
+用法（於專案根目錄）:
+    JOB_STORE_PATH=results/jobs.db SCRAPE_WORKERS=0 python scraper/app.py
+    JOB_STORE_PATH=results/jobs.db python scraper/worker.py --workers 2
+"""
+import argparse
+import logging
+import os
+import signal
+import threading
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distributed scrape / analysis worker")
+    parser.add_argument("--job-store", default=os.getenv("JOB_STORE_PATH"), help="共用的 SQLite 工作佇列")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("SCRAPE_WORKERS", "2")))
+    parser.add_argument("--drain-timeout", type=float, default=300, help="結束前等待執行中工作的秒數")
+    args = parser.parse_args()
+    if not args.job_store:
+        parser.error("需要 --job-store 或 JOB_STORE_PATH")
+    if args.workers < 1:
+        parser.error("--workers 至少為 1")
+
+    # 必須在匯入 app 之前設定；worker 不處理 API 請求，也不需要預先分析
+    os.environ["JOB_STORE_PATH"] = args.job_store
+    os.environ["SCRAPE_WORKERS"] = str(args.workers)
+    os.environ["PREFETCH"] = "0"
+    import app
+
+    app.init_qa_client()
+    app.job_queue.start()
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    logging.info(f"Worker {app.job_queue.node} 啟動，{args.workers} 個工作線程，佇列 {args.job_store}")
+
+    while not stop.wait(1):
+        pass
+
+    logging.info("停止領取新工作，等待執行中的工作完成...")
+    app.job_queue.close()
+    deadline = time.monotonic() + args.drain_timeout
+    while app.job_queue.stats()["local_running"] and time.monotonic() < deadline:
+        time.sleep(0.5)
+    app.qa_client.close()
+
+
+if __name__ == "__main__":
+    main()